@@ -1,31 +1,46 @@
-import re
+import gc
+import os
+import time
 import logging
-from flask import Flask, request, jsonify
-from typing import Optional, Dict, Any
+import threading
+from flask import Flask, Response, request, jsonify
+from typing import Dict, Any
 
 # Mock das suas classes internas para manter a estrutura
-from bot.ai_bot import AIBot
+from bot.streaming import ParagraphStreamer
+from bot.response_parser import (
+    SIMULACAO, FECHAMENTO, ParsedResponse, formatar_reais, parse_response, parse_support_command,
+)
 from services.waha import Waha
+from services.job_queue import JobQueue
+from services.coalescer import ChatCoalescer
+from services.history_store import create_history_store
+from services.cluster import FORWARD_HEADER, create_cluster
+from services.outbound import ALERTA, OFERTA, RESPOSTA, create_outbound
+from services.metrics import metricas
 
 # --- CONFIGURAÇÕES E CONSTANTES ---
 CONFIG = {
-    # Lista de números autorizados (Suporte)
-    "NUMEROS_SUPORTE": ["215470020018431", "556282027373", "6282027373"], 
+    # Lista de números autorizados (Suporte), separados por vírgula; o primeiro recebe os alertas
+    "NUMEROS_SUPORTE": [
+        n.strip() for n in os.getenv('NUMEROS_SUPORTE', '215470020018431,556282027373,6282027373').split(',') if n.strip()
+    ],
     "PORTA": 5050,
-    "TAG_SIMULACAO": "|||SUPORTE_ALERT:",
-    "TAG_FECHAMENTO": "|||FECHAMENTO_ALERT:",
-    "GATILHO_SIMULACAO": "Vou verificar a melhor proposta",
-    "GATILHO_FECHAMENTO": "Já encaminhei para o nosso financeiro"
-}
-
-# --- REGEX OTIMIZADOS ---
-REGEX_DADOS = {
-    "CPF": re.compile(r"(?:CPF|cpf)\s*:?\s*([\d.-]+)"),
-    "TEL": re.compile(r"(?:TEL|Telefone|id)\s*:?\s*(\d+)", re.I),
-    "VALOR": re.compile(r"(?:VALOR|R\$)\s*:?\s*([\d.,]+)", re.I),
-    "AGENCIA": re.compile(r"(?:Ag|Agência)\.?\s*:?\s*([\d\-]{3,})", re.I),
-    "CONTA": re.compile(r"(?:Conta|Cc|C/C)\.?\s*:?\s*([\d\-]{4,})", re.I),
-    "BANCO": re.compile(r"Banco\s*:?\s*([A-Za-z0-9\s]+)", re.I)
+    # Modo assíncrono: webhook responde 202 e o processamento vai para a fila
+    "MODO_ASSINCRONO": os.getenv('MODO_ASSINCRONO', 'false').lower() in ('1', 'true', 'sim'),
+    "FILA_WORKERS": int(os.getenv('FILA_WORKERS', 4)),
+    "FILA_TAMANHO": int(os.getenv('FILA_TAMANHO', 100)),
+    # Agrupamento de mensagens seguidas do mesmo chat (0 desativa; requer modo assíncrono)
+    "JANELA_AGRUPAMENTO_MS": int(os.getenv('JANELA_AGRUPAMENTO_MS', 0)),
+    "AGRUPAMENTO_MAX_MS": int(os.getenv('AGRUPAMENTO_MAX_MS', 5000)),
+    # Streaming: envia cada parágrafo da IA assim que ele fica pronto
+    "MODO_STREAMING": os.getenv('MODO_STREAMING', 'false').lower() in ('1', 'true', 'sim'),
+    # Cliente WAHA asyncio (pool, retries e envios em paralelo)
+    "WAHA_ASYNC": os.getenv('WAHA_ASYNC', 'false').lower() in ('1', 'true', 'sim'),
+    # Agendador de envios: alertas na frente, limites por contato e por sessão, retries (ENVIO_*)
+    "ENVIO_AGENDADO": os.getenv('ENVIO_AGENDADO', 'false').lower() in ('1', 'true', 'sim'),
+    # Carrega o modelo de embeddings na importação (no master, com gunicorn --preload)
+    "IA_PRELOAD": os.getenv('IA_PRELOAD', 'false').lower() in ('1', 'true', 'sim'),
 }
 
 # Configuração de Log
@@ -33,36 +48,105 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger("App")
 
 app = Flask(__name__)
-waha = Waha()
-bot = AIBot()
+# Os serviços abaixo (e o AIBot) só são construídos na importação: threads, pools, event
+# loops e conexões SQLite nascem no primeiro uso, já dentro do worker. Com preload_app o
+# app é importado no master do gunicorn, e o fork não leva as threads para os workers
+# (nem se pode dividir uma conexão SQLite entre processos).
+if CONFIG["WAHA_ASYNC"]:
+    from services.waha_async import WahaAsyncBridge  # aiohttp só quando usado
+    waha = WahaAsyncBridge()
+else:
+    waha = Waha()
+# Com o agendador, envios e "digitando" entram numa fila por prioridade e saem em segundo plano
+# (os números do suporte ficam fora do limite por contato: recebem os alertas de todos os chats)
+envio = create_outbound(
+    waha, exempt=[f"{n}@{s}" for n in CONFIG["NUMEROS_SUPORTE"] for s in ('lid', 'c.us')],
+) if CONFIG["ENVIO_AGENDADO"] else None
+saida = envio or waha
+historico = create_history_store()
+# Vários nós atrás de um balanceador: dono por chat (hash) ou lease por chat, e deduplicação de webhooks
+cluster = create_cluster()
+
+# --- IA (CARREGAMENTO SOB DEMANDA) ---
+# bot.ai_bot puxa LangChain/Chroma e o modelo de embeddings puxa torch: nada disso
+# roda na importação do app, então o /health sobe antes da IA ficar pronta.
+_bot = None
+_bot_lock = threading.Lock()
+# Rotas de estatística não montam a IA: num worker frio respondem só isto
+IA_CARREGANDO = {'status': 'loading'}
+
+def obter_bot():
+    """AIBot do processo, criado no primeiro uso."""
+    global _bot
+    if _bot is None:
+        with _bot_lock:
+            if _bot is None:
+                from bot.ai_bot import AIBot
+                inicio = time.perf_counter()
+                _bot = AIBot()
+                logger.info(f"🤖 IA pronta em {time.perf_counter() - inicio:.1f}s (pid {os.getpid()})")
+    return _bot
+
+def aquecer_bot():
+    """Cria o AIBot em segundo plano (chamado pelo gunicorn.conf.py em cada worker)."""
+    threading.Thread(target=obter_bot, name='aquecer-ia', daemon=True).start()
+
+if CONFIG["IA_PRELOAD"]:
+    # No master (preload_app): os workers herdam os pesos do modelo por copy-on-write.
+    # O gc.freeze evita que o coletor dos workers suje as páginas compartilhadas.
+    from bot.ai_bot import carregar_embeddings
+    carregar_embeddings()
+    gc.freeze()
 
 # --- UTILITÁRIOS ---
 
-def extrair_valor(regex_key: str, texto: str) -> Optional[str]:
-    """Retorna o valor extraído ou None se falhar."""
-    match = REGEX_DADOS[regex_key].search(texto)
-    return match.group(1).strip() if match else None
+def enviar_mensagem(chat_id: str, texto: str, prioridade: int = RESPOSTA):
+    """Envia pelo WAHA (ou entrega ao agendador) e registra a mensagem no histórico local."""
+    # O tempo de cada chamada ao WAHA (etapa waha_envio) é medido no próprio cliente
+    if envio is not None:
+        envio.send_message(chat_id, texto, prioridade)
+    else:
+        waha.send_message(chat_id, texto)
+    metricas.inc('bot_waha_envios_total')
+    if historico is not None:
+        historico.append(chat_id, texto, from_me=True)
 
-def limpar_tags(texto: str) -> str:
-    """Remove tags de controle da IA para que o cliente não as veja."""
-    return re.sub(r'\|\|\|.*?(\|\|\||$)', '', texto).strip()
+def enviar_mensagens(mensagens: list):
+    """Envia (chat_id, texto, prioridade) independentes de uma vez (em paralelo com o cliente async)."""
+    if envio is not None:
+        envio.send_messages(mensagens)
+    else:
+        waha.send_messages([(chat_id, texto) for chat_id, texto, _ in mensagens])
+    metricas.inc('bot_waha_envios_total', len(mensagens))
+    if historico is not None:
+        for chat_id, texto, _ in mensagens:
+            historico.append(chat_id, texto, from_me=True)
+
+def obter_historico(chat_id: str) -> list:
+    """Lê o histórico local; o WAHA só é consultado para preencher um chat frio."""
+    with metricas.timer(etapa='historico'):
+        return _obter_historico(chat_id)
+
+def _obter_historico(chat_id: str) -> list:
+    if historico is not None:
+        history = historico.get(chat_id)
+        if history is not None:
+            return history
+
+    history = waha.get_history_messages(chat_id, limit=10)
+    # Lista vazia indica falha no WAHA (a mensagem recebida sempre aparece): não aquece
+    if historico is not None and history:
+        historico.seed(chat_id, history)
+    return history
 
 # --- LÓGICA DE NEGÓCIO ---
 
 def processar_comando_suporte(chat_id: str, body: str, sender_id: str) -> bool:
     """Processa comandos que o suporte envia para ofertar valores ao cliente."""
-    cpf = extrair_valor("CPF", body)
-    tel = extrair_valor("TEL", body)
-    valor = extrair_valor("VALOR", body)
-
-    # Fallback: tenta separar por vírgula se o regex falhar
-    if not all([cpf, tel, valor]):
-        partes = [p.strip() for p in body.split(',')]
-        if len(partes) >= 3:
-            cpf, tel, valor = partes[0], partes[1], partes[2]
-
-    if cpf and tel and valor:
-        tel_limpo = re.sub(r'\D', '', tel)
+    comando = parse_support_command(body)
+
+    if comando.complete:
+        tel_limpo = comando.telefone
         
         # Verifica se é LID (ID longo) ou número comum
         if len(tel_limpo) > 14:
@@ -71,6 +155,7 @@ def processar_comando_suporte(chat_id: str, body: str, sender_id: str) -> bool:
              suffix = "@c.us"
              
         cliente_chat_id = f"{tel_limpo}{suffix}"
+        valor = formatar_reais(comando.valor)
         
         logger.info(f"🎯 Oferta detectada de {sender_id} para: {cliente_chat_id}")
 
@@ -81,36 +166,45 @@ def processar_comando_suporte(chat_id: str, body: str, sender_id: str) -> bool:
             f"Podemos seguir com a contratação?"
         )
 
-        waha.send_message(cliente_chat_id, msg_oferta)
-        waha.send_message(chat_id, f"✅ Oferta de R$ {valor} enviada para {tel_limpo}!")
+        confirmacao = f"✅ Oferta de R$ {valor} enviada para {tel_limpo}!"
+        if 'cpf' in comando.errors:
+            # O CPF não entra na oferta: avisa, mas não bloqueia o envio
+            confirmacao += f"\n⚠️ CPF {comando.cpf} com dígitos verificadores inválidos, confira o cadastro."
+
+        enviar_mensagens([
+            (cliente_chat_id, msg_oferta, OFERTA),
+            (chat_id, confirmacao, OFERTA),
+        ])
         return True
     
-    waha.send_message(chat_id, "⚠️ Dados incompletos. Envie: CPF, Telefone, Valor")
+    enviar_mensagem(chat_id, "⚠️ Dados incompletos. Envie: CPF, Telefone, Valor")
     return False
 
-def tratar_fluxo_ia(chat_id: str, response: str, sender_id: str):
-    """Encaminha a resposta da IA e dispara alertas para o suporte."""
+def tratar_fluxo_ia(chat_id: str, response: ParsedResponse, sender_id: str, enviar_cliente: bool = True):
+    """Encaminha a resposta da IA (já extraída pelo parse_response) e dispara alertas para o suporte.
+
+    No modo streaming o cliente já recebeu os parágrafos: enviar_cliente=False
+    dispara apenas os alertas, sempre sobre o texto completo.
+    """
     # Envia alerta para o primeiro número da lista de suporte configurada
     id_suporte = f"{CONFIG['NUMEROS_SUPORTE'][0]}@lid" # Ou @c.us dependendo do seu suporte
-    msg_limpa = limpar_tags(response)
+
+    msg_limpa = response.text
+    msg_suporte = None
 
     # 1. Fluxo de Simulação
-    if CONFIG['TAG_SIMULACAO'] in response or CONFIG['GATILHO_SIMULACAO'] in response:
-        tag_match = re.search(f"{re.escape(CONFIG['TAG_SIMULACAO'])}(.*?)(?:\|\|\||$)", response)
-        dados = tag_match.group(1).strip() if tag_match else "Consultar histórico."
-        
-        waha.send_message(chat_id, msg_limpa)
-        waha.send_message(id_suporte, f"🚨 *SIMULAÇÃO*\n📝 Dados: {dados}\n📱 Cliente: {sender_id}")
+    if response.kind == SIMULACAO:
+        dados = response.tag_data or "Consultar histórico."
+        msg_suporte = f"🚨 *SIMULAÇÃO*\n📝 Dados: {dados}\n📱 Cliente: {sender_id}"
+        if 'cpf' in response.errors:
+            msg_suporte += f"\n⚠️ CPF {response.fields['cpf']} com dígitos verificadores inválidos"
 
     # 2. Fluxo de Fechamento (AGORA COM DADOS BANCÁRIOS COMPLETOS)
-    elif CONFIG['TAG_FECHAMENTO'] in response or CONFIG['GATILHO_FECHAMENTO'] in response:
-        # Extrai os dados da resposta da IA
-        banco = extrair_valor("BANCO", response) or "Não detectado"
-        agencia = extrair_valor("AGENCIA", response) or "---"
-        conta = extrair_valor("CONTA", response) or "---"
+    elif response.kind == FECHAMENTO:
+        banco = response.fields.get('banco') or "Não detectado"
+        agencia = response.fields.get('agencia') or "---"
+        conta = response.fields.get('conta') or "---"
 
-        waha.send_message(chat_id, msg_limpa)
-        
         # Monta mensagem detalhada para o suporte
         msg_suporte = (
             f"💰 *FECHAMENTO DETECTADO*\n\n"
@@ -120,52 +214,219 @@ def tratar_fluxo_ia(chat_id: str, response: str, sender_id: str):
             f"📱 *Cliente:* {sender_id}\n\n"
             f"✅ *Ação:* Proceder com o pagamento."
         )
-        waha.send_message(id_suporte, msg_suporte)
+
+    # Alertas: cliente e suporte em paralelo (no agendador, o alerta sai na frente da fila)
+    if msg_suporte:
+        mensagens = [(id_suporte, msg_suporte, ALERTA)]
+        if enviar_cliente:
+            mensagens.insert(0, (chat_id, msg_limpa, RESPOSTA))
+        enviar_mensagens(mensagens)
 
     # 3. Resposta Normal
-    else:
-        waha.send_message(chat_id, msg_limpa)
+    elif enviar_cliente:
+        enviar_mensagem(chat_id, msg_limpa)
+
+def processar_cliente(chat_id: str, body: str, sender_id: str):
+    """Fluxo completo do cliente: digitando, histórico, IA e envio."""
+    logger.info(f"💬 Mensagem de Cliente: {sender_id}")
+    # Modo lease: um turno por chat de cada vez, entre todos os nós (nos outros modos não faz nada)
+    with cluster.lease(chat_id) as exclusivo:
+        if not exclusivo:
+            metricas.inc('bot_cluster_total', evento='lease_estourado')
+        saida.start_typing(chat_id)
+        try:
+            history = obter_historico(chat_id)
+            if CONFIG["MODO_STREAMING"]:
+                responder_em_streaming(chat_id, history, body, sender_id)
+            else:
+                ai_response = obter_bot().invoke(history, body)
+                with metricas.timer(etapa='tags'):
+                    resposta = parse_response(ai_response)
+                tratar_fluxo_ia(chat_id, resposta, sender_id)
+        finally:
+            saida.stop_typing(chat_id)
+
+def responder_em_streaming(chat_id: str, history: list, body: str, sender_id: str):
+    """Envia cada parágrafo completo assim que a IA termina de gerá-lo."""
+    inicio = time.perf_counter()
+    primeira = None
+    streamer = ParagraphStreamer()
+
+    def enviar(paragrafos):
+        nonlocal primeira
+        for paragrafo in paragrafos:
+            enviar_mensagem(chat_id, paragrafo)
+            if primeira is None:
+                primeira = time.perf_counter() - inicio
+                metricas.observe('bot_etapa_segundos', primeira, etapa='primeira_mensagem')
+
+    for chunk in obter_bot().stream(history, body):
+        enviar(streamer.feed(chunk))
+    with metricas.timer(etapa='tags'):
+        restante = streamer.finish()
+    enviar(restante)
+
+    total = time.perf_counter() - inicio
+    if primeira is not None:
+        logger.info(f"⏱️ Primeira mensagem em {primeira * 1000:.0f} ms | resposta completa em {total * 1000:.0f} ms ({sender_id})")
+
+    # Alertas de suporte sempre sobre o texto completo (extraído durante o streaming)
+    tratar_fluxo_ia(chat_id, streamer.response, sender_id, enviar_cliente=False)
+
+def processar_job(job: Dict[str, Any]):
+    """Executado pelos workers da fila no modo assíncrono."""
+    metricas.observe('bot_fila_espera_segundos', time.monotonic() - job['enqueued_at'])
+    metricas.set('bot_fila_profundidade', fila.depth())
+    try:
+        if job['origin'] == 'support':
+            processar_comando_suporte(job['chat_id'], job['body'], job['sender_id'])
+        else:
+            processar_cliente(job['chat_id'], job['body'], job['sender_id'])
+    finally:
+        # Libera a faixa do chat para o próximo grupo de mensagens
+        if job.get('coalesced'):
+            agrupador.done(job['chat_id'])
+
+fila = JobQueue(processar_job, workers=CONFIG["FILA_WORKERS"], max_size=CONFIG["FILA_TAMANHO"])
+agrupador = ChatCoalescer(
+    fila.submit,
+    window=CONFIG["JANELA_AGRUPAMENTO_MS"] / 1000,
+    max_wait=CONFIG["AGRUPAMENTO_MAX_MS"] / 1000,
+) if CONFIG["JANELA_AGRUPAMENTO_MS"] > 0 else None
+
+def receber_mensagem(chat_id: str, body: str, message_id: str = None):
+    """Mensagem que este nó vai atender: deduplica, registra e processa (ou enfileira). Devolve (json, status)."""
+    sender_id = chat_id.split('@')[0]
+    logger.info(f"📩 Webhook: {sender_id} | ChatID: {chat_id}")
+    origin = 'support' if sender_id in CONFIG["NUMEROS_SUPORTE"] else 'client'
+
+    # Reentrega do WAHA (mesmo id): já foi (ou está sendo) respondida
+    if not cluster.first_delivery(message_id):
+        logger.info(f"🔁 Webhook repetido ignorado: {message_id}")
+        metricas.inc('bot_webhook_total', origem=origin, status='duplicado')
+        return {'status': 'duplicate'}, 200
+    metricas.inc('bot_webhook_total', origem=origin, status='recebido')
+
+    # O id só fica marcado se a mensagem foi aceita: na recusa (503) ou erro (500) o WAHA reentrega
+    try:
+        resultado, status = atender_mensagem(chat_id, body, sender_id, origin)
+    except Exception:
+        cluster.forget(message_id)
+        raise
+    if status == 503:
+        cluster.forget(message_id)
+    return resultado, status
+
+def atender_mensagem(chat_id: str, body: str, sender_id: str, origin: str):
+    """Registra e processa (ou enfileira) uma mensagem já deduplicada. Devolve (json, status)."""
+    # Mantém o histórico local em dia (ignorado se o chat ainda estiver frio)
+    if historico is not None and origin == 'client':
+        historico.append(chat_id, body, from_me=False)
+
+    # Modo assíncrono: só valida, enfileira e confirma
+    if CONFIG["MODO_ASSINCRONO"]:
+        job = {'origin': origin, 'chat_id': chat_id, 'body': body, 'sender_id': sender_id}
+        # Mensagens de cliente passam pela faixa ordenada do chat
+        if agrupador and origin == 'client':
+            agrupador.add(job)
+            return {'status': 'queued', 'origin': origin}, 202
+        if not fila.submit(job):
+            logger.warning(f"⚠️ Fila cheia, recusando webhook de {sender_id}")
+            metricas.inc('bot_webhook_total', origem=origin, status='recusado')
+            return {'status': 'busy'}, 503
+        metricas.set('bot_fila_profundidade', fila.depth())
+        return {'status': 'queued', 'origin': origin}, 202
+
+    # Rota Suporte
+    if origin == 'support':
+        if processar_comando_suporte(chat_id, body, sender_id):
+            return {'status': 'ok', 'origin': 'support'}, 200
+        return {'status': 'support_command_failed'}, 200
+
+    # Rota Cliente
+    processar_cliente(chat_id, body, sender_id)
+    return {'status': 'ok'}, 200
 
 # --- ROTAS ---
 
 @app.route('/chatbot/webhook/', methods=['POST'])
 def webhook():
     try:
-        data = request.get_json(silent=True)
-        if not data or 'payload' not in data:
-            return jsonify({'status': 'error'}), 400
+        with metricas.timer(etapa='parse'):
+            data = request.get_json(silent=True)
+            valido = bool(data) and 'payload' in data
+            if valido:
+                payload = data['payload']
+                chat_id = payload.get('from')
+                body = payload.get('body', '').strip()
+                message_id = payload.get('id')
 
-        payload = data['payload']
-        chat_id = payload.get('from')
-        body = payload.get('body', '').strip()
+        if not valido:
+            metricas.inc('bot_webhook_total', origem='desconhecida', status='erro')
+            return jsonify({'status': 'error'}), 400
         
         if not chat_id or not body or '@g.us' in chat_id:
+            metricas.inc('bot_webhook_total', origem='ignorada', status='ignorado')
             return jsonify({'status': 'ignored'}), 200
 
-        sender_id = chat_id.split('@')[0]
-        logger.info(f"📩 Webhook: {sender_id} | ChatID: {chat_id}")
+        # Modo hash: só o nó dono do chat processa; os outros repassam em segundo plano
+        if cluster.mode == 'hash' and FORWARD_HEADER not in request.headers:
+            dono = cluster.forward(chat_id, request.path, data, lambda: receber_mensagem(chat_id, body, message_id))
+            if dono is not None:
+                logger.info(f"↪️ Webhook de {chat_id} repassado ao nó {dono}")
+                metricas.inc('bot_cluster_total', evento='encaminhado')
+                return jsonify({'status': 'forwarded', 'node': dono}), 202
 
-        # Rota Suporte
-        if sender_id in CONFIG["NUMEROS_SUPORTE"]:
-            if processar_comando_suporte(chat_id, body, sender_id):
-                return jsonify({'status': 'ok', 'origin': 'support'}), 200
-            return jsonify({'status': 'support_command_failed'}), 200
-
-        # Rota Cliente
-        logger.info(f"💬 Mensagem de Cliente: {sender_id}")
-        waha.start_typing(chat_id)
-        try:
-            history = waha.get_history_messages(chat_id, limit=10)
-            ai_response = bot.invoke(history, body)
-            tratar_fluxo_ia(chat_id, ai_response, sender_id)
-        finally:
-            waha.stop_typing(chat_id)
-
-        return jsonify({'status': 'ok'}), 200
+        resultado, status = receber_mensagem(chat_id, body, message_id)
+        return jsonify(resultado), status
 
     except Exception as e:
         logger.error(f"❌ Erro Webhook: {e}", exc_info=True)
         return jsonify({'status': 'error'}), 500
 
+@app.route('/health', methods=['GET'])
+def health():
+    """Liveness: não depende da IA, que pode ainda estar carregando neste worker."""
+    return jsonify({'status': 'ok', 'ia': 'pronta' if _bot is not None else 'carregando', 'pid': os.getpid()}), 200
+
+@app.route('/chatbot/fila/', methods=['GET'])
+def fila_stats():
+    """Profundidade e tempos de espera da fila (para dimensionar FILA_WORKERS)."""
+    stats = fila.stats()
+    if agrupador:
+        stats['coalescer'] = agrupador.stats()
+    return jsonify(stats), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato Prometheus, somadas entre os workers do gunicorn."""
+    return Response(metricas.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/chatbot/cache/', methods=['GET'])
+def cache_stats():
+    """Acertos/erros do cache semântico de respostas."""
+    if _bot is None:
+        return jsonify(IA_CARREGANDO), 200
+    return jsonify(_bot.cache_stats()), 200
+
+@app.route('/chatbot/cluster/', methods=['GET'])
+def cluster_stats():
+    """Nó, modo, repasses, duplicados descartados e esperas de lease (deste worker)."""
+    return jsonify(cluster.stats()), 200
+
+@app.route('/chatbot/envio/', methods=['GET'])
+def envio_stats():
+    """Agendador de envios: pendentes, enviados, falhas, retries e atraso por faixa (deste worker)."""
+    if envio is None:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **envio.stats()}), 200
+
+@app.route('/chatbot/llm/', methods=['GET'])
+def llm_stats():
+    """Backends do roteador de LLM: rota, latência, erros, hedges e disjuntores (deste worker)."""
+    if _bot is None:
+        return jsonify(IA_CARREGANDO), 200
+    return jsonify(_bot.llm_stats()), 200
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=CONFIG["PORTA"])
\ No newline at end of file
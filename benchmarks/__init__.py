@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# Os benchmarks rodam partes do app no próprio processo (agendador, clientes do WAHA,
+# roteador, AIBot): as métricas delas vão para um diretório temporário, nunca para o
+# METRICS_DIR lido pelo /metrics do app em execução
+os.environ['METRICS_DIR'] = os.path.join(tempfile.gettempdir(), f'bot_metrics_bench_{os.getpid()}')
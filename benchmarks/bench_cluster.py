@@ -0,0 +1,230 @@
+"""
+Vários nós da API atrás de um balanceador (services/cluster.py), offline.
+
+Sobe o WAHA falso e N nós (cada um um gunicorn com o LLM e os embeddings
+falsos e a fila do modo assíncrono), e simula clientes enviando cada mensagem a um nó sorteado,
+como um balanceador sem afinidade. Uma parte das mensagens é reentregue pelo
+"WAHA" a outro nó sorteado (mesmo id), como nas reentregas de webhook.
+
+Compara, para 1..N nós:
+  - off: nós independentes (dedupe só dentro de cada processo)
+  - hash: dono por chat (hash consistente), os outros nós repassam
+  - lease: qualquer nó processa, com lease por chat e dedupe num SQLite comum
+
+Relatório: vazão (turnos/s) e eficiência em relação a 1 nó, latência ponta a
+ponta p50/p95, respostas duplicadas recebidas pelos clientes, mensagens sem
+resposta e webhooks repassados entre nós.
+
+--verificar-503 confere que um webhook recusado com a fila cheia (503) não
+fica marcado como visto: a reentrega do WAHA tem de ser processada. Sai com
+código 1 se a reentrega for descartada como duplicada ou ficar sem resposta.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_cluster --nos 1,2,3 --modos off,hash,lease
+    python -m benchmarks.bench_cluster --nos 1,4 --modos hash --chats 40 --reentrega 0.3
+    python -m benchmarks.bench_cluster --verificar-503
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_waha import FakeWaha
+from benchmarks.load_test import RAIZ, ROTEIRO_CLIENTE, WEBHOOK, iniciar_app, payload, percentil, porta_livre
+
+
+def iniciar_nos(quantidade, modo, fake, args):
+    """Sobe os nós em paralelo (cada um carrega a própria IA) e devolve [(processo, url)]."""
+    portas = [porta_livre() for _ in range(quantidade)]
+    nomes = [f'no{i + 1}' for i in range(quantidade)]
+    comum = {
+        'MODO_ASSINCRONO': '1',
+        'FILA_WORKERS': str(args.fila_workers),
+        'CLUSTER_MODO': modo,
+        'CLUSTER_NOS': ','.join(f'{nome}=http://127.0.0.1:{porta}' for nome, porta in zip(nomes, portas)),
+    }
+    if modo == 'lease':
+        comum.update(CLUSTER_STORE='sqlite', CLUSTER_SQLITE_PATH=os.path.join(tempfile.mkdtemp(prefix='bot_cluster_'), 'leases.sqlite3'))
+
+    def iniciar(i):
+        return iniciar_app(args.workers, fake.url, args, porta=portas[i], env_extra={**comum, 'CLUSTER_NO': nomes[i]})
+
+    with ThreadPoolExecutor(quantidade) as pool:
+        return list(pool.map(iniciar, range(quantidade)))
+
+
+def simular_cliente(indice, urls, fake, args, resultado):
+    chat_id = f'5562{indice:08d}@c.us'
+    http = requests.Session()
+    aleatorio = random.Random(indice)
+    for body in ROTEIRO_CLIENTE[:args.mensagens]:
+        dados = payload(chat_id, body)
+        t0 = time.time()
+        fake.registrar_recebida(chat_id, body)
+        try:
+            http.post(aleatorio.choice(urls) + WEBHOOK, json=dados, timeout=args.timeout)
+            if aleatorio.random() < args.reentrega:
+                # Reentrega do mesmo webhook, um pouco depois e para outro nó qualquer
+                time.sleep(aleatorio.uniform(0.01, 0.2))
+                http.post(aleatorio.choice(urls) + WEBHOOK, json=dados, timeout=args.timeout)
+                with resultado['lock']:
+                    resultado['reentregas'] += 1
+        except requests.RequestException:
+            with resultado['lock']:
+                resultado['erros_http'] += 1
+            continue
+
+        envio = fake.aguardar_envio(chat_id, t0, timeout=args.timeout)
+        if envio is not None:
+            with resultado['lock']:
+                resultado['e2e'].append(envio['fim'] - t0)
+        time.sleep(aleatorio.uniform(0, args.pensar_ms / 1000))
+
+
+def rodar(quantidade, modo, fake, args):
+    fake.resetar()
+    nos = iniciar_nos(quantidade, modo, fake, args)
+    urls = [url for _, url in nos]
+    resultado = {'lock': threading.Lock(), 'e2e': [], 'reentregas': 0, 'erros_http': 0}
+    try:
+        inicio = time.time()
+        with ThreadPoolExecutor(args.chats) as pool:
+            for i in range(args.chats):
+                pool.submit(simular_cliente, i, urls, fake, args, resultado)
+        duracao = time.time() - inicio
+        # Respostas atrasadas (duplicadas) ainda podem chegar
+        time.sleep(args.llm_ms / 1000 * 3)
+        repassados = 0
+        for url in urls:
+            try:
+                repassados += requests.get(url + '/chatbot/cluster/', timeout=5).json()['forwarded']
+            except (requests.RequestException, ValueError, KeyError):
+                pass
+    finally:
+        for processo, _ in nos:
+            processo.terminate()
+        for processo, _ in nos:
+            processo.wait(timeout=30)
+
+    # Cada mensagem do cliente gera exatamente um envio para o chat dele
+    duplicadas = sem_resposta = 0
+    for i in range(args.chats):
+        envios = len(fake.envios[f'5562{i:08d}@c.us'])
+        duplicadas += max(0, envios - args.mensagens)
+        sem_resposta += max(0, args.mensagens - envios)
+
+    e2e = resultado['e2e']
+    return {
+        'nos': quantidade,
+        'modo': modo,
+        'turnos': len(e2e),
+        'duracao_s': round(duracao, 2),
+        'vazao_turnos_s': round(len(e2e) / duracao, 2) if duracao else 0,
+        'e2e_ms': {'p50': round(percentil(e2e, .5) * 1000, 1), 'p95': round(percentil(e2e, .95) * 1000, 1)},
+        'reentregas': resultado['reentregas'],
+        'duplicadas': duplicadas,
+        'sem_resposta': sem_resposta,
+        'repassados': repassados,
+        'erros_http': resultado['erros_http'],
+    }
+
+
+def verificar_reentrega_apos_503(fake, args):
+    """Fila de 1 job com 1 worker: enche até um 503 e reentrega o mesmo webhook depois que a fila esvazia."""
+    fake.resetar()
+    processo, url = iniciar_app(1, fake.url, args, env_extra={
+        'MODO_ASSINCRONO': '1', 'FILA_WORKERS': '1', 'FILA_TAMANHO': '1', 'CLUSTER_MODO': 'off',
+    })
+    try:
+        recusado = None
+        for i in range(10):
+            chat_id = f'5564{i:08d}@c.us'
+            dados = payload(chat_id, ROTEIRO_CLIENTE[0])
+            fake.registrar_recebida(chat_id, ROTEIRO_CLIENTE[0])
+            if requests.post(url + WEBHOOK, json=dados, timeout=args.timeout).status_code == 503:
+                recusado = (chat_id, dados)
+                break
+        if recusado is None:
+            print("❌ A fila não recusou nenhum webhook (aumente --llm-ms)")
+            return False
+
+        chat_id, dados = recusado
+        limite = time.time() + args.timeout
+        while requests.get(url + '/chatbot/fila/', timeout=5).json()['depth'] > 0 and time.time() < limite:
+            time.sleep(0.05)
+        t0 = time.time()
+        resposta = requests.post(url + WEBHOOK, json=dados, timeout=args.timeout).json()
+        envio = fake.aguardar_envio(chat_id, t0, timeout=args.timeout)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+    ok = resposta.get('status') == 'queued' and envio is not None
+    print(f"{'✅' if ok else '❌'} Reentrega após 503: {resposta.get('status')} | "
+          f"{'respondida' if envio is not None else 'sem resposta'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nos', default='1,2,3', help='Quantidades de nós a comparar')
+    parser.add_argument('--modos', default='off,hash,lease')
+    parser.add_argument('--workers', type=int, default=1, help='Workers do gunicorn por nó')
+    parser.add_argument('--fila-workers', type=int, default=2, help='Turnos simultâneos por worker (FILA_WORKERS)')
+    parser.add_argument('--chats', type=int, default=30)
+    parser.add_argument('--mensagens', type=int, default=4, help='Mensagens por cliente')
+    parser.add_argument('--reentrega', type=float, default=0.2, help='Fração das mensagens reentregues a outro nó')
+    parser.add_argument('--llm-ms', type=float, default=400)
+    parser.add_argument('--llm-sigma', type=float, default=0.2)
+    parser.add_argument('--embeddings', default='fake', choices=['fake', 'torch', 'onnx'],
+                        help='Backend de embeddings dos nós (fake = determinístico, sem modelo)')
+    parser.add_argument('--embeddings-ms', type=float, default=5, help='CPU por consulta dos embeddings falsos')
+    parser.add_argument('--waha-ms', type=float, default=20)
+    parser.add_argument('--pensar-ms', type=float, default=300)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--env', action='append', default=[], help='CHAVE=valor repassado a todos os nós')
+    parser.add_argument('--json', action='store_true')
+    parser.add_argument('--verificar-503', action='store_true', help='Só confere a reentrega de um webhook recusado')
+    args = parser.parse_args()
+
+    fake = FakeWaha(latencia_ms=args.waha_ms)
+    fake.iniciar_em_thread()
+
+    if args.verificar_503:
+        sys.exit(0 if verificar_reentrega_apos_503(fake, args) else 1)
+
+    resultados = []
+    for modo in args.modos.split(','):
+        for quantidade in map(int, args.nos.split(',')):
+            resultados.append(rodar(quantidade, modo, fake, args))
+            if not args.json:
+                d = resultados[-1]
+                print(f"🖧 {modo} x{quantidade}: {d['vazao_turnos_s']} turnos/s | duplicadas {d['duplicadas']}")
+
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        return
+
+    print(f"\n{args.chats} chats x {args.mensagens} mensagens | LLM falso ~{args.llm_ms:.0f} ms | "
+          f"{args.workers} worker(s) x {args.fila_workers} na fila por nó | reentrega {args.reentrega:.0%}\n")
+    print(f"{'modo':<7}{'nós':>4}{'vazão/s':>10}{'eficiência':>12}{'e2e p50':>10}{'e2e p95':>10}"
+          f"{'reentregas':>12}{'duplicadas':>12}{'sem resp.':>11}{'repassados':>12}")
+    base = {}
+    for d in resultados:
+        base.setdefault(d['modo'], d['vazao_turnos_s'] / d['nos'])
+        eficiencia = d['vazao_turnos_s'] / (base[d['modo']] * d['nos']) if base[d['modo']] else 0
+        print(f"{d['modo']:<7}{d['nos']:>4}{d['vazao_turnos_s']:>10}{eficiencia:>12.0%}{d['e2e_ms']['p50']:>10}"
+              f"{d['e2e_ms']['p95']:>10}{d['reentregas']:>12}{d['duplicadas']:>12}{d['sem_resposta']:>11}"
+              f"{d['repassados']:>12}")
+
+
+if __name__ == '__main__':
+    main()
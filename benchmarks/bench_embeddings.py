@@ -0,0 +1,175 @@
+"""
+Compara o backend ONNX int8 (bot/onnx_embeddings.py) com o HuggingFaceEmbeddings (torch).
+
+Paridade sobre os fragmentos da base (Chroma em uso):
+  - cosseno entre o vetor torch e o ONNX de cada fragmento (média / mínimo)
+  - top-k das perguntas: sobreposição e ordem idêntica, com a base toda em ONNX
+    e com só a consulta em ONNX (base ainda gerada pelo torch, antes de reingerir)
+Desempenho:
+  - latência de uma consulta (p50/p95) e embedding da base inteira
+  - tempo de carga e pico de memória de cada backend (processo separado)
+  - tamanho em disco do modelo e das bibliotecas (o que entra na imagem)
+
+Uso (na raiz do projeto, com o modelo exportado):
+    python -m bot.onnx_embeddings --destino ./modelo_onnx --manter-fp32
+    python -m benchmarks.bench_embeddings --onnx ./modelo_onnx
+"""
+import os
+import json
+import time
+import argparse
+import resource
+import importlib.util
+import multiprocessing
+
+import numpy as np
+
+from benchmarks.bench_retrieval import PERGUNTAS, percentis
+from bot.kb_store import store_atual
+from bot.onnx_embeddings import MODEL_FILE, MODEL_FP32_FILE, ONNX_MODELO_PATH, OnnxEmbeddings
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+MODEL_NAME = 'all-MiniLM-L6-v2'
+
+
+def criar(backend, args):
+    if backend == 'torch':
+        from langchain_huggingface import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=args.referencia)
+    arquivo = MODEL_FP32_FILE if backend == 'onnx-fp32' else MODEL_FILE
+    return OnnxEmbeddings(args.onnx, threads=args.threads, model_file=arquivo)
+
+
+def _medir_carga(backend, args):
+    """Roda num processo novo: import + carga do modelo + uma consulta, e o pico de RSS."""
+    inicio = time.perf_counter()
+    modelo = criar(backend, args)
+    modelo.embed_query('aquecimento')
+    return {
+        'carga_s': round(time.perf_counter() - inicio, 2),
+        'pico_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def tamanho_mb(caminho):
+    if os.path.isfile(caminho):
+        return os.path.getsize(caminho) / 1e6
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        total += sum(os.path.getsize(os.path.join(raiz, a)) for a in arquivos if not os.path.islink(os.path.join(raiz, a)))
+    return total / 1e6
+
+
+def tamanho_pacotes(nomes):
+    total = 0.0
+    for nome in nomes:
+        spec = importlib.util.find_spec(nome)
+        if spec and spec.submodule_search_locations:
+            total += tamanho_mb(list(spec.submodule_search_locations)[0])
+    return round(total, 1)
+
+
+def normalizar(vetores):
+    matriz = np.asarray(vetores, dtype=np.float32)
+    return matriz / np.linalg.norm(matriz, axis=1, keepdims=True)
+
+
+def top_k(consultas, base, k):
+    # Mesma ordem da distância L2 do Chroma (vetores normalizados)
+    distancias = (consultas ** 2).sum(1)[:, None] - 2 * consultas @ base.T + (base ** 2).sum(1)[None, :]
+    return np.argsort(distancias, axis=1)[:, :k]
+
+
+def concordancia(referencia, candidato):
+    sobreposicao = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(referencia, candidato)])
+    identicos = int(sum(list(a) == list(b) for a, b in zip(referencia, candidato)))
+    return round(float(sobreposicao), 3), identicos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--onnx', default=ONNX_MODELO_PATH, help='Pasta do modelo exportado')
+    parser.add_argument('--referencia', default=MODEL_NAME, help='Modelo torch de referência')
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=1, help='Threads da sessão ONNX')
+    parser.add_argument('--repeticoes', type=int, default=200)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    from langchain_chroma import Chroma
+    textos = Chroma(persist_directory=store_atual(args.chroma))._collection.get(include=['documents'])['documents']
+
+    backends = ['torch', 'onnx-int8']
+    if os.path.exists(os.path.join(args.onnx, MODEL_FP32_FILE)):
+        backends.insert(1, 'onnx-fp32')
+
+    resultado = {'fragmentos': len(textos), 'perguntas': len(PERGUNTAS), 'k': args.k, 'backends': {}}
+
+    # Carga e memória isoladas: cada backend num processo limpo
+    contexto = multiprocessing.get_context('spawn')
+    for backend in backends:
+        with contexto.Pool(1) as pool:
+            resultado['backends'][backend] = pool.apply(_medir_carga, (backend, args))
+
+    modelos = {backend: criar(backend, args) for backend in backends}
+    vetores_docs, vetores_perguntas = {}, {}
+    for backend, modelo in modelos.items():
+        modelo.embed_query('aquecimento')
+        inicio = time.perf_counter()
+        vetores_docs[backend] = normalizar(modelo.embed_documents(textos))
+        resultado['backends'][backend]['base_inteira_s'] = round(time.perf_counter() - inicio, 3)
+        vetores_perguntas[backend] = normalizar([modelo.embed_query(p) for p in PERGUNTAS])
+
+        amostras = []
+        for i in range(args.repeticoes):
+            inicio = time.perf_counter()
+            modelo.embed_query(PERGUNTAS[i % len(PERGUNTAS)])
+            amostras.append(time.perf_counter() - inicio)
+        stats = percentis(amostras)
+        resultado['backends'][backend]['consulta_p50_ms'] = round(stats['p50'], 2)
+        resultado['backends'][backend]['consulta_p95_ms'] = round(stats['p95'], 2)
+
+    # Paridade contra o torch
+    referencia_top = top_k(vetores_perguntas['torch'], vetores_docs['torch'], args.k)
+    for backend in backends[1:]:
+        cossenos = (vetores_docs['torch'] * vetores_docs[backend]).sum(1)
+        dados = resultado['backends'][backend]
+        dados['cosseno_medio'] = round(float(cossenos.mean()), 5)
+        dados['cosseno_min'] = round(float(cossenos.min()), 5)
+        dados['topk_sobreposicao'], dados['topk_identico'] = concordancia(
+            referencia_top, top_k(vetores_perguntas[backend], vetores_docs[backend], args.k))
+        # Consulta no ONNX contra a base ainda gerada pelo torch
+        dados['topk_sobreposicao_base_torch'], dados['topk_identico_base_torch'] = concordancia(
+            referencia_top, top_k(vetores_perguntas[backend], vetores_docs['torch'], args.k))
+
+    # O que entra na imagem
+    resultado['backends']['torch']['disco_mb'] = tamanho_pacotes(
+        ['torch', 'sentence_transformers', 'transformers', 'tokenizers', 'safetensors', 'scipy', 'sklearn'])
+    for backend in backends[1:]:
+        arquivo = MODEL_FP32_FILE if backend == 'onnx-fp32' else MODEL_FILE
+        resultado['backends'][backend]['modelo_mb'] = round(tamanho_mb(os.path.join(args.onnx, arquivo)), 1)
+        resultado['backends'][backend]['disco_mb'] = round(
+            tamanho_pacotes(['onnxruntime', 'tokenizers']) + resultado['backends'][backend]['modelo_mb'], 1)
+
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+        return
+
+    print(f"📚 {len(textos)} fragmentos | {len(PERGUNTAS)} perguntas | k={args.k} | ONNX com {args.threads} thread(s)\n")
+    print(f"{'backend':<11}{'consulta p50':>13}{'p95':>9}{'base inteira':>14}{'carga':>8}{'pico RSS':>10}{'disco':>10}")
+    for backend, d in resultado['backends'].items():
+        print(f"{backend:<11}{d['consulta_p50_ms']:>10.2f} ms{d['consulta_p95_ms']:>6.2f} ms"
+              f"{d['base_inteira_s']:>12.2f} s{d['carga_s']:>6.1f} s{d['pico_rss_mb']:>7.0f} MB{d['disco_mb']:>7.0f} MB")
+
+    print(f"\n{'backend':<11}{'cosseno médio':>15}{'mínimo':>9}{'top-k (base própria)':>24}{'top-k (base torch)':>22}")
+    for backend in backends[1:]:
+        d = resultado['backends'][backend]
+        print(f"{backend:<11}{d['cosseno_medio']:>15.4f}{d['cosseno_min']:>9.4f}"
+              f"{d['topk_sobreposicao']:>12.0%} ({d['topk_identico']:>2}/{len(PERGUNTAS)} igual)"
+              f"{d['topk_sobreposicao_base_torch']:>10.0%} ({d['topk_identico_base_torch']:>2}/{len(PERGUNTAS)} igual)")
+    print("\n'disco' do torch soma as bibliotecas (o modelo vem do cache do HuggingFace); do ONNX, onnxruntime + tokenizers + modelo.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Agendador de envios (services/outbound.py) contra envios diretos ao WAHA.
+
+Sobe o WAHA falso com a sessão atendendo poucas chamadas ao mesmo tempo e
+simula uma rajada: muitos chats respondidos ao mesmo tempo (digitando,
+parágrafos em streaming, parar de digitar), parte deles com alerta ao
+suporte, um lote de ofertas do suporte e um chat recebendo uma sequência
+longa de mensagens. Tudo começa no mesmo instante, por várias threads (como
+os workers da fila).
+
+  - direto: cada thread chama o cliente Waha na hora, como hoje
+  - agendado: as threads só enfileiram no OutboundScheduler
+
+Relatório: atraso dos alertas ao suporte (do pedido até o WAHA aceitar)
+p50/p95, pico de envios a um mesmo contato e à sessão em qualquer janela de
+1 s, chamadas de "digitando", mensagens perdidas e retries. Sai com código 1
+se o p95 dos alertas agendados ficar acima do envio direto (o agendador
+reserva capacidade para eles).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_envio
+    python -m benchmarks.bench_envio --chats 80 --concorrencia 2 --erro 0.1
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_waha import FakeWaha
+from benchmarks.load_test import percentil
+from services.waha import Waha
+from services.outbound import ALERTA, OFERTA, RESPOSTA, OutboundScheduler
+
+SUPORTE = '215470020018431@lid'
+
+
+class ClienteMedido:
+    """Repassa ao Waha e anota cada chamada (início, fim, sucesso)."""
+
+    def __init__(self, waha):
+        self.waha = waha
+        self.lock = threading.Lock()
+        self.chamadas = []
+        self.aceitas = {}
+
+    def _medir(self, tipo, chat_id, chamada, texto=None):
+        inicio = time.monotonic()
+        ok = chamada()
+        with self.lock:
+            self.chamadas.append((tipo, chat_id, inicio, ok))
+            if ok and texto is not None:
+                self.aceitas.setdefault(texto, time.monotonic())
+        return ok
+
+    def send_message(self, chat_id, texto):
+        return self._medir('texto', chat_id, lambda: self.waha.send_message(chat_id, texto), texto)
+
+    def start_typing(self, chat_id):
+        return self._medir('digitando', chat_id, lambda: self.waha.start_typing(chat_id))
+
+    def stop_typing(self, chat_id):
+        return self._medir('digitando', chat_id, lambda: self.waha.stop_typing(chat_id))
+
+
+def pico_por_segundo(instantes):
+    """Maior número de chamadas em qualquer janela de 1 s."""
+    instantes = sorted(instantes)
+    return max((i - bisect_left(instantes, t - 1) + 1 for i, t in enumerate(instantes)), default=0)
+
+
+def rodar(modo, fake, args):
+    fake.resetar()
+    cliente = ClienteMedido(Waha())
+    agendador = OutboundScheduler(
+        cliente,
+        recipient_rate=args.contato_por_s, recipient_burst=args.contato_rajada,
+        session_rate=args.sessao_por_s, session_burst=args.sessao_rajada,
+        threads=args.envio_threads, reserved=args.reservadas, backoff=args.backoff, exempt=[SUPORTE],
+    ) if modo == 'agendado' else None
+    pedidos = {}
+    esperadas = []
+
+    def enviar(chat_id, texto, prioridade):
+        esperadas.append(texto)
+        if prioridade == ALERTA:
+            pedidos[texto] = time.monotonic()
+        if agendador:
+            agendador.send_message(chat_id, texto, prioridade)
+        else:
+            cliente.send_message(chat_id, texto)
+
+    def digitando(chat_id, ligado):
+        alvo = agendador or cliente
+        (alvo.start_typing if ligado else alvo.stop_typing)(chat_id)
+
+    def turno(i):
+        aleatorio = random.Random(i)
+        chat_id = f'5562{i:08d}@c.us'
+        digitando(chat_id, True)
+        time.sleep(aleatorio.lognormvariate(0, 0.3) * args.llm_ms / 1000)
+        for p in range(args.paragrafos):
+            enviar(chat_id, f'chat {i} parágrafo {p}', RESPOSTA)
+        if aleatorio.random() < args.alertas:
+            enviar(SUPORTE, f'🚨 SIMULAÇÃO do chat {i}', ALERTA)
+        digitando(chat_id, False)
+
+    def ofertas():
+        for i in range(args.ofertas):
+            enviar(f'5563{i:08d}@c.us', f'oferta {i}', OFERTA)
+            enviar(SUPORTE, f'✅ oferta {i} enviada', OFERTA)
+
+    def massa():
+        for i in range(args.massa):
+            enviar('556299999999@c.us', f'mensagem em massa {i}', RESPOSTA)
+
+    inicio = time.monotonic()
+    with ThreadPoolExecutor(args.threads) as pool:
+        pool.submit(ofertas)
+        pool.submit(massa)
+        for i in range(args.chats):
+            pool.submit(turno, i)
+    if agendador:
+        while agendador.pending():
+            time.sleep(0.05)
+    duracao = time.monotonic() - inicio
+
+    por_contato = defaultdict(list)
+    for tipo, chat_id, t, _ in cliente.chamadas:
+        if tipo == 'texto':
+            por_contato[chat_id].append(t)
+    por_contato.pop(SUPORTE, None)  # o suporte recebe de todos os chats: vale o limite da sessão
+    atrasos = [cliente.aceitas[t] - pedido for t, pedido in pedidos.items() if t in cliente.aceitas]
+    stats = agendador.stats() if agendador else {}
+    return {
+        'modo': modo,
+        'duracao_s': round(duracao, 2),
+        'alerta_ms': {'p50': round(percentil(atrasos, .5) * 1000, 1), 'p95': round(percentil(atrasos, .95) * 1000, 1)},
+        'pico_contato_s': max(map(pico_por_segundo, por_contato.values()), default=0),
+        'pico_sessao_s': pico_por_segundo([t for _, _, t, _ in cliente.chamadas]),
+        'digitando': sum(1 for tipo, *_ in cliente.chamadas if tipo == 'digitando'),
+        'perdidas': sum(1 for t in esperadas if t not in cliente.aceitas),
+        'erros_503': sum(1 for e in fake.eventos if e['status'] == 503),
+        'retries': stats.get('retried', 0),
+        'digitando_descartados': stats.get('typing_dropped', 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=60)
+    parser.add_argument('--paragrafos', type=int, default=3, help='Parágrafos por resposta (streaming)')
+    parser.add_argument('--alertas', type=float, default=0.3, help='Fração dos turnos com alerta ao suporte')
+    parser.add_argument('--ofertas', type=int, default=10)
+    parser.add_argument('--massa', type=int, default=20, help='Mensagens seguidas para um único contato')
+    parser.add_argument('--threads', type=int, default=16, help='Threads gerando envios (workers da fila)')
+    parser.add_argument('--llm-ms', type=float, default=300)
+    parser.add_argument('--latencia-ms', type=float, default=40)
+    parser.add_argument('--erro', type=float, default=0.05)
+    parser.add_argument('--concorrencia', type=int, default=4, help='Chamadas que a sessão do WAHA atende ao mesmo tempo')
+    parser.add_argument('--contato-por-s', type=float, default=1)
+    parser.add_argument('--contato-rajada', type=float, default=3)
+    parser.add_argument('--sessao-por-s', type=float, default=20)
+    parser.add_argument('--sessao-rajada', type=float, default=40)
+    parser.add_argument('--envio-threads', type=int, default=4, help='Envios simultâneos do agendador (ENVIO_THREADS)')
+    parser.add_argument('--reservadas', type=int, default=1, help='Threads só para alertas (ENVIO_THREADS_ALERTA)')
+    parser.add_argument('--backoff', type=float, default=0.5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    fake = FakeWaha(latencia_ms=args.latencia_ms, erro=args.erro, concorrencia=args.concorrencia)
+    os.environ['WAHA_API_URL'] = fake.iniciar_em_thread()
+
+    resultados = [rodar(modo, fake, args) for modo in ('direto', 'agendado')]
+    direto, agendado = resultados
+    alertas_ok = agendado['alerta_ms']['p95'] <= direto['alerta_ms']['p95']
+    if args.json:
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        sys.exit(0 if alertas_ok else 1)
+
+    print(f"{args.chats} chats x {args.paragrafos} parágrafos | alertas {args.alertas:.0%} | {args.ofertas} ofertas | "
+          f"massa {args.massa} | WAHA ~{args.latencia_ms:.0f} ms, {args.concorrencia} por vez, erro {args.erro:.0%}\n")
+    print(f"{'modo':<10}{'duração s':>10}{'alerta p50':>12}{'alerta p95':>12}{'pico/contato':>14}{'pico/sessão':>13}"
+          f"{'digitando':>11}{'perdidas':>10}{'503':>6}{'retries':>9}")
+    for d in resultados:
+        print(f"{d['modo']:<10}{d['duracao_s']:>10}{d['alerta_ms']['p50']:>12}{d['alerta_ms']['p95']:>12}"
+              f"{d['pico_contato_s']:>14}{d['pico_sessao_s']:>13}{d['digitando']:>11}{d['perdidas']:>10}"
+              f"{d['erros_503']:>6}{d['retries']:>9}")
+    if not alertas_ok:
+        print(f"\n❌ Alertas agendados mais lentos que os diretos (p95 {agendado['alerta_ms']['p95']} ms "
+              f"> {direto['alerta_ms']['p95']} ms)")
+        sys.exit(1)
+    print("\n✅ Alertas agendados no p95 do envio direto ou abaixo")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+Extrator de tags e campos (bot/response_parser.py) contra as funções antigas do app.
+
+Microbenchmark: tempo por resposta das funções de antes (substring de cada
+tag/gatilho + re.search montado na hora + limpar_tags + um REGEX_DADOS por
+campo) e do parser em uma passada, com o texto inteiro e em trechos de
+streaming, separado por tipo de resposta; e o mesmo para os comandos do
+suporte. Nas respostas com alerta e nos comandos o parser faz mais que as
+funções antigas (converte o valor, valida o CPF, lê todos os campos).
+
+Fuzz (propriedades, com seed): respostas e comandos gerados aleatoriamente
+(tags, gatilhos, CPFs válidos e inválidos, dados bancários, ruído, valores
+em vários formatos), verificando que:
+  - o resultado não depende de como a resposta é picada em trechos
+  - nenhuma tag ou conteúdo de tag chega ao texto do cliente
+  - texto limpo, tipo de alerta, dados da tag e campos batem com o que foi
+    gerado (as divergências das funções antigas são só informativas)
+  - a validação do CPF bate com uma implementação de referência
+  - valores formatados voltam ao mesmo Decimal
+Sai com código 1 se alguma propriedade falhar (mostra exemplos).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_parser --fuzz 20000 --seed 1
+    python -m benchmarks.bench_parser --fuzz 0 --repeticoes 20000
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from decimal import Decimal
+
+from bot.fake_llm import RESPOSTA_PADRAO, RESPOSTA_SIMULACAO, RESPOSTA_FECHAMENTO
+from bot.response_parser import (
+    FECHAMENTO, SIMULACAO, ResponseParser, cpf_valido, formatar_reais, ler_valor, parse_response,
+    parse_support_command,
+)
+
+# --- COMO ERA NO app.py (referência) ---
+
+LEGADO_TAG_SIMULACAO = "|||SUPORTE_ALERT:"
+LEGADO_TAG_FECHAMENTO = "|||FECHAMENTO_ALERT:"
+LEGADO_GATILHO_SIMULACAO = "Vou verificar a melhor proposta"
+LEGADO_GATILHO_FECHAMENTO = "Já encaminhei para o nosso financeiro"
+LEGADO_REGEX_DADOS = {
+    "CPF": re.compile(r"(?:CPF|cpf)\s*:?\s*([\d.-]+)"),
+    "TEL": re.compile(r"(?:TEL|Telefone|id)\s*:?\s*(\d+)", re.I),
+    "VALOR": re.compile(r"(?:VALOR|R\$)\s*:?\s*([\d.,]+)", re.I),
+    "AGENCIA": re.compile(r"(?:Ag|Agência)\.?\s*:?\s*([\d\-]{3,})", re.I),
+    "CONTA": re.compile(r"(?:Conta|Cc|C/C)\.?\s*:?\s*([\d\-]{4,})", re.I),
+    "BANCO": re.compile(r"Banco\s*:?\s*([A-Za-z0-9\s]+)", re.I)
+}
+
+
+def legado_extrair_valor(regex_key, texto):
+    match = LEGADO_REGEX_DADOS[regex_key].search(texto)
+    return match.group(1).strip() if match else None
+
+
+def legado_limpar_tags(texto):
+    return re.sub(r'\|\|\|.*?(\|\|\||$)', '', texto).strip()
+
+
+def legado_resposta(response):
+    """O que o tratar_fluxo_ia extraía de uma resposta."""
+    resultado = {'text': legado_limpar_tags(response), 'kind': None}
+    if LEGADO_TAG_SIMULACAO in response or LEGADO_GATILHO_SIMULACAO in response:
+        tag_match = re.search(f"{re.escape(LEGADO_TAG_SIMULACAO)}(.*?)(?:\\|\\|\\||$)", response)
+        resultado['kind'] = SIMULACAO
+        resultado['dados'] = tag_match.group(1).strip() if tag_match else "Consultar histórico."
+    elif LEGADO_TAG_FECHAMENTO in response or LEGADO_GATILHO_FECHAMENTO in response:
+        resultado['kind'] = FECHAMENTO
+        resultado['banco'] = legado_extrair_valor("BANCO", response) or "Não detectado"
+        resultado['agencia'] = legado_extrair_valor("AGENCIA", response) or "---"
+        resultado['conta'] = legado_extrair_valor("CONTA", response) or "---"
+    return resultado
+
+
+def legado_comando(body):
+    cpf = legado_extrair_valor("CPF", body)
+    tel = legado_extrair_valor("TEL", body)
+    valor = legado_extrair_valor("VALOR", body)
+    if not all([cpf, tel, valor]):
+        partes = [p.strip() for p in body.split(',')]
+        if len(partes) >= 3:
+            cpf, tel, valor = partes[0], partes[1], partes[2]
+    return cpf, tel, valor
+
+
+def confere(parsed, esperado):
+    """Campos do esperado que o resultado não tem (vazio se bateu)."""
+    obtido = {'text': parsed.text, 'kind': parsed.kind, 'tag_data': parsed.tag_data,
+              'fields': {nome: re.sub(r'\D', '', parsed.fields.get(nome, '')) if nome == 'cpf' else parsed.fields.get(nome)
+                         for nome in esperado['fields']}}
+    return {chave: (valor, obtido[chave]) for chave, valor in esperado.items() if obtido[chave] != valor}
+
+
+def confere_legado(response, esperado):
+    """O mesmo para as funções antigas, no que o tratar_fluxo_ia usava."""
+    legado = legado_resposta(response)
+    diferencas = {}
+    if legado['text'] != esperado['text']:
+        diferencas['text'] = (esperado['text'], legado['text'])
+    if legado['kind'] != esperado['kind']:
+        diferencas['kind'] = (esperado['kind'], legado['kind'])
+    if esperado['kind'] == SIMULACAO and legado.get('dados') != (esperado['tag_data'] or "Consultar histórico."):
+        diferencas['tag_data'] = (esperado['tag_data'], legado.get('dados'))
+    if esperado['kind'] == FECHAMENTO:
+        for nome in ('banco', 'agencia', 'conta'):
+            if legado.get(nome) != esperado['fields'].get(nome, "Não detectado" if nome == 'banco' else "---"):
+                diferencas[nome] = (esperado['fields'].get(nome), legado.get(nome))
+    return diferencas
+
+
+# --- GERADORES ---
+
+BANCOS = ['Nubank', 'Itau', 'Bradesco', 'Caixa', 'Banco do Brasil', 'Inter', 'C6 Bank', 'Santander']
+FRASES = [
+    "Perfeito! Agora, lá no App FGTS, entre em 'Autorizar bancos a consultarem FGTS'.",
+    "Você precisa adicionar estes 3 bancos parceiros para eu conseguir a melhor taxa.",
+    "Consegue autorizar eles agora?", "Tudo certo por aqui 😊", "Me manda um \"pronto\" aqui.",
+    "O valor cai em até 1 dia útil.", "Qualquer dúvida é só chamar!", "Pode ficar tranquilo, é seguro.",
+]
+
+
+def cpf_referencia(digitos):
+    """Implementação independente (fórmula do módulo 11) para conferir o cpf_valido."""
+    if len(digitos) != 11 or len(set(digitos)) == 1:
+        return False
+    numeros = [int(d) for d in digitos]
+    for posicao in (9, 10):
+        soma = sum(numeros[i] * (posicao + 1 - i) for i in range(posicao))
+        resto = soma % 11
+        if numeros[posicao] != (0 if resto < 2 else 11 - resto):
+            return False
+    return True
+
+
+def gerar_cpf(aleatorio, valido=True):
+    base = [aleatorio.randint(0, 9) for _ in range(9)]
+    for posicao in (9, 10):
+        soma = sum(base[i] * (posicao + 1 - i) for i in range(posicao))
+        resto = soma % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    if not valido:
+        base[10] = (base[10] + aleatorio.randint(1, 9)) % 10
+    digitos = ''.join(map(str, base))
+    if aleatorio.random() < 0.5:
+        return digitos
+    return f'{digitos[:3]}.{digitos[3:6]}.{digitos[6:9]}-{digitos[9:]}'
+
+
+def gerar_valor(aleatorio):
+    valor = Decimal(aleatorio.randint(100, 5_000_000)) / 100
+    formato = aleatorio.choice(['br', 'inteiro', 'ponto'])
+    if formato == 'br':
+        return formatar_reais(valor), valor
+    if formato == 'inteiro':
+        return str(int(valor)), Decimal(int(valor))
+    return f'{valor:.2f}', valor
+
+
+def gerar_resposta(aleatorio, bem_formada=True):
+    """
+    Resposta da IA com texto, talvez gatilho, talvez tag (de uma linha) com
+    dados; e o resultado esperado (só vale para as bem formadas).
+    """
+    partes = [aleatorio.choice(FRASES) for _ in range(aleatorio.randint(0, 3))]
+    tipo = aleatorio.choice([None, SIMULACAO, FECHAMENTO])
+    gatilho = aleatorio.random() < 0.7
+    if tipo == SIMULACAO and gatilho:
+        partes.insert(aleatorio.randint(0, len(partes)), RESPOSTA_SIMULACAO.split('\n')[0])
+    if tipo == FECHAMENTO and gatilho:
+        partes.insert(aleatorio.randint(0, len(partes)), RESPOSTA_FECHAMENTO.split('\n')[0])
+    texto = aleatorio.choice(['\n\n', '\n', ' ']).join(partes)
+    esperado = {'text': texto.strip(), 'kind': tipo if gatilho else None, 'tag_data': None, 'fields': {}}
+
+    if tipo == SIMULACAO and aleatorio.random() < 0.8:
+        cpf = gerar_cpf(aleatorio, aleatorio.random() < 0.8)
+        dados = f"Nome: Cliente {aleatorio.randint(1, 999)} | CPF: {cpf} | Nasc: 01/0{aleatorio.randint(1, 9)}/1990"
+        texto += f"\n|||SUPORTE_ALERT: {dados}" + ('|||' if aleatorio.random() < 0.7 else '')
+        esperado.update(kind=SIMULACAO, tag_data=dados, fields={'cpf': re.sub(r'\D', '', cpf)})
+    elif tipo == FECHAMENTO and aleatorio.random() < 0.8:
+        banco, agencia = aleatorio.choice(BANCOS), f'{aleatorio.randint(1, 9999):04d}'
+        conta = f'{aleatorio.randint(10000, 9999999)}-{aleatorio.randint(0, 9)}'
+        dados = f"Banco: {banco} | Ag: {agencia} | Conta: {conta}"
+        texto += f"\n|||FECHAMENTO_ALERT: {dados}" + ('|||' if aleatorio.random() < 0.7 else '')
+        esperado.update(kind=FECHAMENTO, tag_data=dados, fields={'banco': banco, 'agencia': agencia, 'conta': conta})
+
+    if not bem_formada:
+        # Ruído: pipes soltos, tags coladas, quebras de linha dentro da tag, texto depois da tag
+        ruido = aleatorio.choice([
+            '|', '||', '|||', '||||', '|||||', '|||SUPORTE_ALERT: a\nb|||',
+            '|||FECHAMENTO_ALERT: Banco: Inter|||SUPORTE_ALERT: x|||',
+            'R$ 1.500,00', 'CPF: 000.000.000-00', '\n\n', 'Agência: 12 Conta 3', 'id 1234',
+        ])
+        posicao = aleatorio.randint(0, len(texto))
+        while 0 < posicao < len(texto) and texto[posicao - 1] == texto[posicao] == '|':
+            # Não parte um '|||' ao meio (aí não é mais tag, nem para o parser antigo)
+            posicao -= 1
+        texto = texto[:posicao] + ruido + texto[posicao:]
+    return texto, esperado
+
+
+# Comandos reais do suporte que sempre entram no fuzz (valor com moeda, sem rótulos)
+COMANDOS_FIXOS = [
+    ('529.982.247-25, 62999998888, R$ 1500', '52998224725', '62999998888', Decimal('1500')),
+    ('52998224725, 62999998888, R$1.500,00', '52998224725', '62999998888', Decimal('1500')),
+    ('529.982.247-25, 62999998888, 1.500,00 reais', '52998224725', '62999998888', Decimal('1500')),
+]
+
+
+def gerar_comando(aleatorio):
+    cpf = gerar_cpf(aleatorio, aleatorio.random() < 0.8)
+    tel = f'55{aleatorio.randint(11, 99)}9{aleatorio.randint(10_000_000, 99_999_999)}'
+    texto_valor, valor = gerar_valor(aleatorio)
+    moeda = aleatorio.random()
+    if moeda < 0.2:
+        texto_valor = aleatorio.choice(['R$ ', 'R$', 'r$ ']) + texto_valor
+    elif moeda < 0.3:
+        texto_valor += aleatorio.choice([' reais', ' Reais'])
+    if aleatorio.random() < 0.6:
+        body = f"CPF: {cpf}, TEL: {tel}, VALOR: {texto_valor}"
+    else:
+        body = f"{cpf}, {tel}, {texto_valor}"
+    return body, cpf, tel, valor
+
+
+def picar(aleatorio, texto):
+    """Divide em trechos de 1 a 12 caracteres, como os tokens do streaming."""
+    trechos, i = [], 0
+    while i < len(texto):
+        passo = aleatorio.randint(1, 12)
+        trechos.append(texto[i:i + passo])
+        i += passo
+    return trechos
+
+
+# --- FUZZ ---
+
+def fuzz(total, seed):
+    aleatorio = random.Random(seed)
+    falhas, legado = {}, {}
+
+    def falhou(propriedade, exemplo):
+        lista = falhas.setdefault(propriedade, [])
+        if len(lista) < 3:
+            lista.append(exemplo)
+        lista.append(None)
+
+    for i in range(total):
+        bem_formada = aleatorio.random() < 0.6
+        resposta, esperado = gerar_resposta(aleatorio, bem_formada)
+
+        inteiro = parse_response(resposta)
+        parser = ResponseParser()
+        for trecho in picar(aleatorio, resposta):
+            parser.feed(trecho)
+        if parser.finish() != inteiro:
+            falhou('streaming == texto inteiro', resposta)
+
+        if '|||' in inteiro.text or 'SUPORTE_ALERT' in inteiro.text or 'FECHAMENTO_ALERT' in inteiro.text:
+            falhou('sem tags no texto do cliente', resposta)
+        # Dados curtos (ex.: 'x') podem aparecer por acaso no texto
+        if inteiro.tag_data and len(inteiro.tag_data) > 3 and inteiro.tag_data in inteiro.text:
+            falhou('sem dados da tag no texto do cliente', resposta)
+
+        if bem_formada:
+            diferencas = confere(inteiro, esperado)
+            if diferencas:
+                falhou('texto, alerta, dados da tag e campos corretos', {'resposta': resposta, 'diferencas': diferencas})
+            diferencas = confere_legado(resposta, esperado)
+            if diferencas:
+                # Informativo: erros das funções antigas (ex.: BANCO casando dentro de "bancos")
+                legado.setdefault(next(iter(diferencas)), []).append({'resposta': resposta, 'diferencas': diferencas})
+            if 'cpf' in inteiro.fields and ('cpf' in inteiro.errors) == cpf_referencia(re.sub(r'\D', '', inteiro.fields['cpf'])):
+                falhou('CPF da resposta validado', resposta)
+
+        body, cpf, tel, valor = COMANDOS_FIXOS[i] if i < len(COMANDOS_FIXOS) else gerar_comando(aleatorio)
+        comando = parse_support_command(body)
+        valor_antes = legado_comando(body)[2]
+        if re.sub(r'\D', '', comando.cpf or '') != re.sub(r'\D', '', cpf):
+            falhou('CPF do comando', body)
+        if comando.telefone != tel:
+            falhou('telefone do comando', body)
+        if comando.valor != valor:
+            falhou('valor do comando', {'body': body, 'esperado': str(valor), 'obtido': str(comando.valor),
+                                        'antes': valor_antes})
+        if ('cpf' in comando.errors) == cpf_referencia(re.sub(r'\D', '', cpf)):
+            falhou('CPF do comando validado', body)
+
+        digitos = ''.join(str(aleatorio.randint(0, 9)) for _ in range(11))
+        if cpf_valido(digitos) != cpf_referencia(digitos):
+            falhou('cpf_valido == referência', digitos)
+        texto_valor, esperado = gerar_valor(aleatorio)
+        if ler_valor(texto_valor) != esperado or ler_valor(formatar_reais(esperado)) != esperado:
+            falhou('valor formatado volta ao mesmo Decimal', texto_valor)
+
+    resumo = {nome: {'falhas': sum(1 for e in lista if e is None), 'exemplos': [e for e in lista if e is not None]}
+              for nome, lista in falhas.items()}
+    return resumo, {campo: {'casos': len(lista), 'exemplo': lista[0]} for campo, lista in legado.items()}
+
+
+# --- MICROBENCHMARK ---
+
+def cronometrar(funcao, entradas, repeticoes):
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        funcao(entradas[i % len(entradas)])
+    return (time.perf_counter() - inicio) / repeticoes * 1e6
+
+
+def em_trechos(trechos):
+    parser = ResponseParser()
+    for trecho in trechos:
+        parser.feed(trecho)
+    return parser.finish()
+
+
+def microbenchmark(repeticoes, seed):
+    """µs por entrada, separados por tipo de resposta (só as com alerta extraem e validam campos)."""
+    aleatorio = random.Random(seed)
+    respostas = [RESPOSTA_PADRAO, RESPOSTA_SIMULACAO.format(cpf='529.982.247-25'), RESPOSTA_FECHAMENTO]
+    respostas += [gerar_resposta(aleatorio)[0] for _ in range(300)]
+    grupos = {'sem alerta': None, 'simulação': SIMULACAO, 'fechamento': FECHAMENTO}
+    tempos = {}
+    for nome, tipo in grupos.items():
+        entradas = [r for r in respostas if parse_response(r).kind == tipo]
+        picadas = [picar(aleatorio, r) for r in entradas]
+        tempos[nome] = {
+            'antes_us': round(cronometrar(legado_resposta, entradas, repeticoes), 2),
+            'agora_us': round(cronometrar(parse_response, entradas, repeticoes), 2),
+            'streaming_us': round(cronometrar(em_trechos, picadas, repeticoes), 2),
+        }
+    comandos = [gerar_comando(aleatorio)[0] for _ in range(200)]
+    tempos['comando do suporte'] = {
+        'antes_us': round(cronometrar(legado_comando, comandos, repeticoes), 2),
+        'agora_us': round(cronometrar(parse_support_command, comandos, repeticoes), 2),
+    }
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fuzz', type=int, default=20000, help='Casos gerados (0 pula o fuzz)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--repeticoes', type=int, default=20000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    resultado = {'tempos': microbenchmark(args.repeticoes, args.seed)}
+    if args.fuzz:
+        falhas, legado = fuzz(args.fuzz, args.seed)
+        resultado['fuzz'] = {'casos': args.fuzz, 'seed': args.seed, 'falhas': falhas, 'erros_do_antigo': legado}
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False, default=str))
+    else:
+        print(f"{'':<22}{'antes':>10}{'agora':>10}{'streaming':>12}")
+        for nome, t in resultado['tempos'].items():
+            streaming = f"{t['streaming_us']:>9.1f} µs" if 'streaming_us' in t else f"{'-':>12}"
+            print(f"{nome:<22}{t['antes_us']:>7.1f} µs{t['agora_us']:>7.1f} µs{streaming}")
+        if args.fuzz:
+            falhas = resultado['fuzz']['falhas']
+            print(f"\n🎲 Fuzz: {args.fuzz} casos (seed {args.seed})")
+            if not falhas:
+                print("✅ Todas as propriedades valem")
+            for nome, dados in falhas.items():
+                print(f"❌ {nome}: {dados['falhas']} falhas")
+                for exemplo in dados['exemplos']:
+                    print(f"   {exemplo!r}")
+            for campo, dados in resultado['fuzz']['erros_do_antigo'].items():
+                print(f"ℹ️  Antigo errava '{campo}' em {dados['casos']} casos, ex.: {dados['exemplo']['diferencas']}")
+
+    if args.fuzz and resultado['fuzz']['falhas']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
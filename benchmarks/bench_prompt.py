@@ -0,0 +1,211 @@
+"""
+Economia de tokens do orçamento de prompt (bot/prompt_budget.py).
+
+Reproduz conversas gravadas turno a turno e compara o prompt de antes
+(SYSTEM_TEMPLATE + últimas 6 mensagens + pergunta + 4 documentos) com o
+montado pelo PromptBudget em cada orçamento: tokens médios/p95/máximo,
+economia, turnos acima do orçamento e custo estimado.
+
+Conversas (uma das fontes):
+  --conversas arquivo.jsonl     uma conversa por linha: {"mensagens": [{"body": "...", "fromMe": false}, ...]}
+  --historico-sqlite caminho    banco do HISTORICO_BACKEND=sqlite
+  (padrão)                      conversas do roteiro de benchmarks/load_test.py, incluindo
+                                clientes que colam textos longos
+
+O histórico de cada turno passa pelo mesmo corte do histórico local
+(MAX_BODY_CHARS por mensagem), e o benchmark confere que a pergunta aparece
+uma única vez no prompt montado (sai com código 1 se não).
+
+Os documentos vêm da base em uso, ordenados por sobreposição de palavras com a
+pergunta (no lugar do retriever, para não depender do modelo de embeddings).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_prompt --orcamentos 0,3000,2500,2200
+"""
+import os
+import re
+import sys
+import json
+import random
+import sqlite3
+import argparse
+from collections import defaultdict
+
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+from bot.fake_llm import RESPOSTA_PADRAO, RESPOSTA_SIMULACAO, RESPOSTA_FECHAMENTO
+from benchmarks.load_test import ROTEIRO_CLIENTE, percentil
+from bot.kb_store import store_atual
+from bot.prompt_budget import MESSAGE_OVERHEAD, DOC_OVERHEAD, TRUNCATION_MARK, PromptBudget, TokenCounter
+from services.history_store import MAX_BODY_CHARS
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+PALAVRA = re.compile(r'\w+')
+K = 4
+
+
+def conversas_do_roteiro(fragmentos, total=40, seed=7):
+    """Conversas sintéticas: roteiro normal e clientes que colam textos longos no meio."""
+    aleatorio = random.Random(seed)
+    conversas = []
+    for i in range(total):
+        mensagens = []
+        for passo, body in enumerate(ROTEIRO_CLIENTE):
+            if i % 3 == 0 and passo == 2:
+                # Cliente cola um texto longo (contrato, extrato, mensagem encaminhada)
+                body = "Olha o que recebi, é verdade isso?\n\n" + "\n\n".join(
+                    aleatorio.sample(fragmentos, min(len(fragmentos), aleatorio.randint(3, 8))))
+            elif i % 3 == 1 and passo == 3:
+                body = ("Então, deixa eu te explicar minha situação. " * aleatorio.randint(8, 25)).strip()
+            mensagens.append({'body': body, 'fromMe': False})
+            if passo == 4:
+                resposta = RESPOSTA_SIMULACAO.format(cpf='123.456.789-09')
+            elif passo == 6:
+                resposta = RESPOSTA_FECHAMENTO
+            else:
+                resposta = RESPOSTA_PADRAO
+            mensagens.append({'body': resposta, 'fromMe': True})
+        conversas.append(mensagens)
+    return conversas
+
+
+def conversas_do_sqlite(caminho):
+    por_chat = defaultdict(list)
+    with sqlite3.connect(caminho) as conn:
+        for chat_id, body, from_me in conn.execute('SELECT chat_id, body, from_me FROM messages ORDER BY id'):
+            por_chat[chat_id].append({'body': body, 'fromMe': bool(from_me)})
+    return list(por_chat.values())
+
+
+def conversas_do_jsonl(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return [json.loads(linha)['mensagens'] for linha in f if linha.strip()]
+
+
+def recuperar(pergunta, documentos):
+    """Top-k por sobreposição de palavras; score = 1 - Jaccard (menor = melhor, como a distância)."""
+    palavras = set(PALAVRA.findall(pergunta.lower()))
+    pontuados = []
+    for doc, termos in documentos:
+        uniao = len(palavras | termos) or 1
+        pontuados.append((doc, 1 - len(palavras & termos) / uniao))
+    return sorted(pontuados, key=lambda par: par[1])[:K]
+
+
+def prompt_antigo(counter, sistema, historico, pergunta, docs):
+    """Tokens do prompt sem orçamento, como o AIBot montava antes."""
+    total = counter.count(sistema)
+    for mensagem in historico[-6:]:
+        if mensagem.get('body'):
+            total += counter.count(mensagem['body']) + MESSAGE_OVERHEAD
+    total += counter.count(pergunta) + MESSAGE_OVERHEAD
+    total += sum(counter.count(doc.page_content) + DOC_OVERHEAD for doc, _ in docs)
+    return total
+
+
+def pergunta_repetida(mensagens, pergunta):
+    """
+    A mensagem antes da pergunta é uma cópia dela (inteira ou cortada)? Nos
+    roteiros o cliente e o bot se alternam, então ali só pode estar uma
+    resposta do bot.
+    """
+    if len(mensagens) < 2 or not isinstance(mensagens[-2], HumanMessage):
+        return False
+    anterior = mensagens[-2].content.strip()
+    return bool(anterior) and pergunta.strip().startswith(anterior.split(TRUNCATION_MARK.strip())[0].strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orcamentos', default='0,3000,2500,2200', help='Orçamentos a comparar (0 = sem limite)')
+    parser.add_argument('--conversas', help='Arquivo .jsonl com conversas gravadas')
+    parser.add_argument('--historico-sqlite', help='Banco do HISTORICO_BACKEND=sqlite')
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--tokenizer', default='', help='tokenizer.json do modelo (padrão: estimativa por caracteres)')
+    parser.add_argument('--preco-milhao', type=float, default=0.59, help='US$ por milhão de tokens de entrada')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    from langchain_chroma import Chroma
+    from bot.ai_bot import SYSTEM_TEMPLATE, CONTEXT_TEMPLATE, PROMPT_MAX_TOKENS_PERGUNTA, PROMPT_TOKENS_TURNO_ANTIGO
+
+    textos = Chroma(persist_directory=store_atual(args.chroma))._collection.get(include=['documents'])['documents']
+    documentos = [(Document(page_content=t), set(PALAVRA.findall(t.lower()))) for t in textos]
+
+    if args.conversas:
+        conversas, fonte = conversas_do_jsonl(args.conversas), args.conversas
+    elif args.historico_sqlite:
+        conversas, fonte = conversas_do_sqlite(args.historico_sqlite), args.historico_sqlite
+    else:
+        conversas, fonte = conversas_do_roteiro(textos), 'roteiro sintético'
+
+    counter = TokenCounter(args.tokenizer)
+    sistema = SYSTEM_TEMPLATE + CONTEXT_TEMPLATE.replace('{context}', '')
+
+    # Turnos: cada mensagem do cliente, com o histórico até ela (o histórico já inclui a
+    # própria pergunta, cortada em MAX_BODY_CHARS como no histórico local)
+    turnos = []
+    for mensagens in conversas:
+        guardadas = [dict(m, body=(m.get('body') or '')[:MAX_BODY_CHARS]) for m in mensagens]
+        for i, mensagem in enumerate(mensagens):
+            if not mensagem.get('fromMe') and mensagem.get('body'):
+                turnos.append((guardadas[:i + 1], mensagem['body']))
+
+    antes = []
+    recuperados = []
+    for historico, pergunta in turnos:
+        docs = recuperar(pergunta, documentos)
+        recuperados.append(docs)
+        antes.append(prompt_antigo(counter, sistema, historico, pergunta, docs))
+
+    resultado = {'fonte': fonte, 'conversas': len(conversas), 'turnos': len(turnos), 'linhas': []}
+
+    def linha(nome, totais, orcamento=0, cortes=0, descartes=0):
+        return {
+            'modo': nome,
+            'media': round(sum(totais) / len(totais), 1),
+            'p95': percentil(totais, 0.95),
+            'max': max(totais),
+            'economia': round(1 - sum(totais) / sum(antes), 4),
+            'acima_orcamento': sum(t > orcamento for t in totais) if orcamento else 0,
+            'turnos_encurtados': cortes,
+            'docs_descartados': descartes,
+            'custo_por_mil_turnos': round(sum(totais) / len(totais) * 1000 * args.preco_milhao / 1e6, 4),
+        }
+
+    resultado['linhas'].append(linha('antes', antes))
+    repetidas = 0
+    for orcamento in (int(o) for o in args.orcamentos.split(',')):
+        montador = PromptBudget(sistema, budget=orcamento, counter=counter, body_chars=MAX_BODY_CHARS,
+                                question_tokens=PROMPT_MAX_TOKENS_PERGUNTA, old_turn_tokens=PROMPT_TOKENS_TURNO_ANTIGO)
+        totais, cortes, descartes = [], 0, 0
+        for (historico, pergunta), docs in zip(turnos, recuperados):
+            montado = montador.build(historico, pergunta, docs)
+            if pergunta_repetida(montado.messages, pergunta):
+                repetidas += 1
+            uso = montado.usage
+            totais.append(uso['total'])
+            cortes += uso['turnos_cortados']
+            descartes += uso['docs_descartados']
+        nome = f'orçamento {orcamento}' if orcamento else 'sem limite'
+        resultado['linhas'].append(linha(nome, totais, orcamento, cortes, descartes))
+
+    resultado['pergunta_repetida'] = repetidas
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        sys.exit(1 if repetidas else 0)
+
+    print(f"💬 {len(conversas)} conversas, {len(turnos)} turnos ({fonte}) | sistema = {counter.count(sistema)} tokens\n")
+    print(f"{'modo':<18}{'média':>8}{'p95':>7}{'máx':>7}{'economia':>10}{'acima':>7}{'encurtados':>12}{'descartes':>11}{'US$/1k turnos':>15}")
+    for r in resultado['linhas']:
+        print(f"{r['modo']:<18}{r['media']:>8.0f}{r['p95']:>7}{r['max']:>7}{r['economia']:>10.1%}"
+              f"{r['acima_orcamento']:>7}{r['turnos_encurtados']:>12}{r['docs_descartados']:>11}{r['custo_por_mil_turnos']:>15.4f}")
+    if repetidas:
+        print(f"\n❌ {repetidas} prompts com a pergunta duplicada no histórico")
+        sys.exit(1)
+    print("\n✅ Pergunta uma única vez em todos os prompts")
+
+
+if __name__ == '__main__':
+    main()
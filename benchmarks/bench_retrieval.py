@@ -0,0 +1,88 @@
+"""
+Compara a recuperação pelo Chroma com o índice em matriz (MatrixRetriever).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_retrieval --chroma ./chroma_datav2 --repeticoes 200
+"""
+import os
+import time
+import argparse
+import tempfile
+import statistics
+
+from bot.matrix_retriever import MatrixRetriever, export_index
+
+PERGUNTAS = [
+    "Oi, boa tarde",
+    "É seguro fazer a antecipação?",
+    "Vou pagar alguma parcela por mês?",
+    "Estou negativado, consigo mesmo assim?",
+    "Em quanto tempo o dinheiro cai na conta?",
+    "Não estou achando o banco no aplicativo",
+    "Como faço para entrar no saque-aniversário?",
+    "Quais bancos preciso autorizar?",
+    "Vocês fazem empréstimo consignado?",
+    "Qual a taxa de juros?",
+]
+
+
+def percentis(amostras):
+    ordenadas = sorted(amostras)
+    return {
+        'p50': ordenadas[len(ordenadas) // 2] * 1000,
+        'p95': ordenadas[int(len(ordenadas) * 0.95)] * 1000,
+        'media': statistics.mean(ordenadas) * 1000,
+    }
+
+
+def cronometrar(func, argumentos, repeticoes):
+    amostras = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        func(argumentos[i % len(argumentos)])
+        amostras.append(time.perf_counter() - inicio)
+    return percentis(amostras)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chroma', default=os.path.join(os.getcwd(), 'chroma_datav2'))
+    parser.add_argument('--k', type=int, default=4)
+    parser.add_argument('--repeticoes', type=int, default=200)
+    args = parser.parse_args()
+
+    from langchain_chroma import Chroma
+    from bot.ai_bot import carregar_embeddings
+    EMBEDDING_MODEL = carregar_embeddings()
+
+    store = Chroma(persist_directory=args.chroma, embedding_function=EMBEDDING_MODEL)
+    with tempfile.TemporaryDirectory() as index_dir:
+        total = export_index(args.chroma, index_dir)
+        matriz = MatrixRetriever(index_dir, EMBEDDING_MODEL, k=args.k)
+        print(f"📚 {total} fragmentos | k={args.k} | {args.repeticoes} repetições\n")
+
+        # 1. Paridade do top-k (mesmo vetor de consulta nos dois lados)
+        vetores = [EMBEDDING_MODEL.embed_query(p) for p in PERGUNTAS]
+        iguais = 0
+        for pergunta, vetor in zip(PERGUNTAS, vetores):
+            chroma_top = [d.page_content for d in store.similarity_search_by_vector(vetor, k=args.k)]
+            matriz_top = [d.page_content for d, _ in matriz.search_by_vector(vetor, k=args.k)]
+            ok = chroma_top == matriz_top
+            iguais += ok
+            print(f"{'✅' if ok else '❌'} {pergunta}")
+        print(f"\nTop-k idêntico em {iguais}/{len(PERGUNTAS)} perguntas\n")
+
+        # 2. Latência só da busca (sem embedding) e de ponta a ponta
+        linhas = [
+            ('Chroma (busca)', cronometrar(lambda v: store.similarity_search_by_vector(v, k=args.k), vetores, args.repeticoes)),
+            ('Matriz (busca)', cronometrar(lambda v: matriz.search_by_vector(v, k=args.k), vetores, args.repeticoes)),
+            ('Chroma (embedding + busca)', cronometrar(lambda p: store.similarity_search(p, k=args.k), PERGUNTAS, args.repeticoes)),
+            ('Matriz (embedding + busca)', cronometrar(lambda p: matriz.invoke(p, k=args.k), PERGUNTAS, args.repeticoes)),
+        ]
+        print(f"{'Modo':<28}{'p50 ms':>10}{'p95 ms':>10}{'média ms':>10}")
+        for nome, stats in linhas:
+            print(f"{nome:<28}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['media']:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Roteador de LLM (bot/llm_router.py) contra backends falsos, sem Groq.
+
+Compara o AIBot de hoje (um único modelo 70B) com o roteador sem hedge, com
+hedge no mesmo backend (padrão) e com hedge no próximo backend da rota, no
+mesmo fluxo de turnos do roteiro de benchmarks/load_test.py (conversas em
+paralelo). Os backends são FakeChatModel com cauda lognormal; no terço do meio
+da rodada um deles entra em "queda" (todas as chamadas dão 429), para exercitar
+fallback e disjuntor.
+
+Relatório por configuração: latência p50/p95/p99 por turno, respostas de
+fallback (o cliente recebeu "o sistema está processando muitas solicitações"),
+requisições extras de hedge, turnos por rota e por backend.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_router --turnos 700 --concorrencia 8
+    python -m benchmarks.bench_router --queda rapido --sigma 0.9
+"""
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+from bot.fake_llm import FakeChatModel
+from benchmarks.load_test import ROTEIRO_CLIENTE, percentil
+from bot.llm_router import LLMRouter
+
+SISTEMA = SystemMessage(content='Você é a Luh, consultora de antecipação de FGTS.')
+
+
+def criar_modelos(args):
+    return {
+        'rapido': FakeChatModel(latencia_ms=args.rapido_ms, sigma=args.sigma, tokens_por_segundo=args.tokens_s),
+        'grande': FakeChatModel(latencia_ms=args.grande_ms, sigma=args.sigma, tokens_por_segundo=args.tokens_s / 3),
+    }
+
+
+def criar_roteador(modelos, args, hedge, destino='mesmo'):
+    return LLMRouter.create(
+        modelos,
+        routes={'rapido': ['rapido', 'grande'], 'extracao': ['grande', 'rapido']},
+        hedge=hedge,
+        hedge_target=destino,
+        hedge_initial=args.hedge_inicial_ms / 1000,
+        hedge_min=args.hedge_min_ms / 1000,
+        breaker_failures=args.disjuntor_falhas,
+        breaker_cooldown=args.disjuntor_pausa_s,
+    )
+
+
+def rodar(nome, args):
+    modelos = criar_modelos(args)
+    if nome == 'único 70B':
+        chat = modelos['grande']
+    else:
+        chat = criar_roteador(modelos, args, hedge='hedge' in nome, destino='proximo' if 'próximo' in nome else 'mesmo')
+    queda = modelos.get(args.queda)
+
+    latencias, fallbacks = [], 0
+    lock = threading.Lock()
+    feitos = [0]
+
+    def turno(i):
+        nonlocal fallbacks
+        with lock:
+            feitos[0] += 1
+            if queda is not None:
+                # Terço do meio: o backend em queda só devolve 429
+                queda.erro = 1.0 if args.turnos / 3 <= feitos[0] < 2 * args.turnos / 3 else 0.0
+        mensagens = [SISTEMA, HumanMessage(content=ROTEIRO_CLIENTE[i % len(ROTEIRO_CLIENTE)])]
+        inicio = time.perf_counter()
+        try:
+            chat.invoke(mensagens)
+            ok = True
+        except Exception:
+            ok = False
+        with lock:
+            latencias.append(time.perf_counter() - inicio)
+            fallbacks += not ok
+
+    with ThreadPoolExecutor(args.concorrencia) as pool:
+        list(pool.map(turno, range(args.turnos)))
+
+    dados = {
+        'p50_ms': round(percentil(latencias, 0.5) * 1000, 1),
+        'p95_ms': round(percentil(latencias, 0.95) * 1000, 1),
+        'p99_ms': round(percentil(latencias, 0.99) * 1000, 1),
+        'fallbacks': fallbacks,
+        'chamadas_extras': 0,
+    }
+    if isinstance(chat, LLMRouter):
+        stats = chat.stats()
+        chamadas = sum(b['calls'] for b in stats['backends'].values())
+        dados['chamadas_extras'] = round(chamadas / args.turnos - 1, 4)
+        dados['hedges'] = stats['hedges']
+        dados['hedges_vencedores'] = stats['hedge_wins']
+        dados['rotas'] = stats['routes']
+        dados['servidos'] = {nome_b: b['served'] for nome_b, b in stats['backends'].items()}
+        dados['rejeitados'] = stats['rejected']
+    return dados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turnos', type=int, default=700)
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--rapido-ms', type=float, default=150, help='Mediana até o primeiro token do modelo rápido')
+    parser.add_argument('--grande-ms', type=float, default=450, help='Mediana até o primeiro token do 70B')
+    parser.add_argument('--sigma', type=float, default=0.7, help='Cauda lognormal da latência')
+    parser.add_argument('--tokens-s', type=float, default=1200, help='Geração do modelo rápido (o 70B gera a 1/3)')
+    parser.add_argument('--queda', choices=['grande', 'rapido', 'nenhuma'], default='grande',
+                        help='Backend que devolve 429 no terço do meio da rodada')
+    parser.add_argument('--hedge-inicial-ms', type=float, default=3000)
+    parser.add_argument('--hedge-min-ms', type=float, default=300)
+    parser.add_argument('--disjuntor-falhas', type=int, default=5)
+    parser.add_argument('--disjuntor-pausa-s', type=float, default=5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    configuracoes = ('único 70B', 'roteador', 'roteador + hedge', 'hedge no próximo')
+    resultado = {nome: rodar(nome, args) for nome in configuracoes}
+
+    if args.json:
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        return
+
+    print(f"🔀 {args.turnos} turnos, {args.concorrencia} conversas em paralelo | queda: {args.queda}\n")
+    print(f"{'configuração':<18}{'p50':>9}{'p95':>10}{'p99':>10}{'fallbacks':>11}{'extras':>9}{'hedges':>14}")
+    for nome, d in resultado.items():
+        hedges = f"{d['hedges_vencedores']}/{d['hedges']}" if 'hedges' in d else '-'
+        print(f"{nome:<18}{d['p50_ms']:>6.0f} ms{d['p95_ms']:>7.0f} ms{d['p99_ms']:>7.0f} ms"
+              f"{d['fallbacks']:>11}{d['chamadas_extras']:>9.1%}{hedges:>14}")
+    for nome, d in resultado.items():
+        if 'rotas' in d:
+            print(f"\n{nome}: rotas {d['rotas']} | servidos {d['servidos']} | sem backend {d['rejeitados']}")
+
+
+if __name__ == '__main__':
+    main()
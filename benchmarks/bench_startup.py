@@ -0,0 +1,190 @@
+"""
+Cold start e memória por worker do gunicorn.
+
+Sobe o app (LLM falso) com N workers em cada modo de carregamento e mede:
+  - tempo até o /health responder (app aceitando conexões)
+  - tempo até a IA estar pronta em todos os workers
+  - reinício de um worker (SIGKILL, como após o timeout de 120 s): tempo até
+    o substituto estar com a IA pronta
+  - RSS, PSS e USS de master e workers (/proc/<pid>/smaps_rollup). O PSS
+    divide as páginas compartilhadas entre os processos: a soma é o consumo real.
+
+Modos:
+  lazy     cada worker carrega o próprio modelo depois do fork (em segundo plano)
+  preload  IA_PRELOAD=1: modelo carregado uma vez no master e herdado por copy-on-write
+
+Uso (na raiz do projeto, Linux):
+    python -m benchmarks.bench_startup --workers 3
+    python -m benchmarks.bench_startup --workers 3 --modos preload --json
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+from benchmarks.load_test import RAIZ, porta_livre
+
+
+def filhos(pid: int) -> set:
+    """PIDs dos workers (filhos diretos do master do gunicorn)."""
+    encontrados = set()
+    for nome in os.listdir('/proc'):
+        if not nome.isdigit():
+            continue
+        try:
+            with open(f'/proc/{nome}/stat') as f:
+                # o nome do processo vem entre parênteses e pode ter espaços
+                campos = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(campos[1]) == pid:
+            encontrados.add(int(nome))
+    return encontrados
+
+
+def memoria(pid: int) -> dict:
+    """RSS/PSS/USS em MB."""
+    valores = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) >= 2 and partes[0].endswith(':'):
+                valores[partes[0][:-1]] = int(partes[1]) / 1024
+    return {
+        'rss': valores.get('Rss', 0.0),
+        'pss': valores.get('Pss', 0.0),
+        'uss': valores.get('Private_Clean', 0.0) + valores.get('Private_Dirty', 0.0),
+    }
+
+
+def consultar_health(base_url):
+    try:
+        # Conexão nova a cada chamada: o accept distribui entre os workers
+        resposta = requests.get(base_url + '/health', timeout=1, headers={'Connection': 'close'})
+        return resposta.json() if resposta.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def aguardar_ia(base_url, processo, pids, timeout):
+    """Espera todos os PIDs informados responderem 'ia: pronta' no /health."""
+    prontos = set()
+    limite = time.perf_counter() + timeout
+    while time.perf_counter() < limite:
+        dados = consultar_health(base_url)
+        if dados and dados.get('ia') == 'pronta':
+            prontos.add(dados['pid'])
+        if pids() <= prontos:
+            return True
+        if processo.poll() is not None:
+            raise RuntimeError('gunicorn encerrou durante a inicialização')
+        time.sleep(0.05)
+    return False
+
+
+def medir(modo, args):
+    porta = porta_livre()
+    base_url = f'http://127.0.0.1:{porta}'
+    env = dict(os.environ)
+    env.update({
+        'IA_PRELOAD': '1' if modo == 'preload' else '0',
+        'LLM_PROVIDER': 'fake',
+        'CHROMA_PATH': args.chroma,
+        'PYTHONPATH': RAIZ,
+        'METRICS_DIR': tempfile.mkdtemp(prefix='bot_metrics_'),
+    })
+    for item in args.env:
+        chave, _, valor = item.partition('=')
+        env[chave] = valor
+
+    # O gunicorn.conf.py da raiz é lido automaticamente (preload_app + aquecimento)
+    comando = [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--timeout', '120',
+               '--bind', f'127.0.0.1:{porta}', '--log-level', 'warning', 'app:app']
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env)
+    try:
+        while consultar_health(base_url) is None:
+            if processo.poll() is not None:
+                raise RuntimeError('gunicorn encerrou durante a inicialização')
+            if time.perf_counter() - inicio > args.timeout:
+                raise RuntimeError('/health não respondeu a tempo')
+            time.sleep(0.02)
+        health_s = time.perf_counter() - inicio
+
+        workers = lambda: filhos(processo.pid)
+        while len(workers()) < args.workers:
+            time.sleep(0.05)
+        if not aguardar_ia(base_url, processo, workers, args.timeout):
+            raise RuntimeError('IA não ficou pronta a tempo')
+        pronta_s = time.perf_counter() - inicio
+
+        # Memória com tudo carregado (uma chamada em cada worker já foi feita pelo aquecimento)
+        master = memoria(processo.pid)
+        por_worker = [memoria(pid) for pid in sorted(workers())]
+
+        # Reinício de um worker, como o gunicorn faz após o timeout
+        antigos = workers()
+        vitima = min(antigos)
+        os.kill(vitima, signal.SIGKILL)
+        t_kill = time.perf_counter()
+        while True:
+            novos = workers() - antigos
+            if novos:
+                break
+            time.sleep(0.01)
+        if not aguardar_ia(base_url, processo, lambda: novos, args.timeout):
+            raise RuntimeError('worker substituto não ficou pronto a tempo')
+        reinicio_s = time.perf_counter() - t_kill
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+    return {
+        'modo': modo,
+        'workers': args.workers,
+        'health_s': round(health_s, 3),
+        'ia_pronta_s': round(pronta_s, 3),
+        'reinicio_worker_s': round(reinicio_s, 3),
+        'master_mb': {k: round(v, 1) for k, v in master.items()},
+        'worker_mb': [{k: round(v, 1) for k, v in w.items()} for w in por_worker],
+        'pss_total_mb': round(master['pss'] + sum(w['pss'] for w in por_worker), 1),
+        'rss_total_mb': round(master['rss'] + sum(w['rss'] for w in por_worker), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--modos', default='lazy,preload')
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--env', action='append', default=[], help='Variável extra para o app (CHAVE=VALOR)')
+    parser.add_argument('--json', action='store_true', help='Imprime os resultados em JSON')
+    args = parser.parse_args()
+
+    resultados = [medir(modo.strip(), args) for modo in args.modos.split(',')]
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return
+
+    print(f"\n{'modo':<9}{'/health':>9}{'IA pronta':>11}{'reinício':>10}"
+          f"{'RSS master':>12}{'RSS/worker':>12}{'USS/worker':>12}{'PSS total':>11}{'RSS total':>11}")
+    for r in resultados:
+        n = len(r['worker_mb']) or 1
+        rss_worker = sum(w['rss'] for w in r['worker_mb']) / n
+        uss_worker = sum(w['uss'] for w in r['worker_mb']) / n
+        print(f"{r['modo']:<9}{r['health_s']:>8.2f}s{r['ia_pronta_s']:>10.2f}s{r['reinicio_worker_s']:>9.2f}s"
+              f"{r['master_mb']['rss']:>9.0f} MB{rss_worker:>9.0f} MB{uss_worker:>9.0f} MB"
+              f"{r['pss_total_mb']:>8.0f} MB{r['rss_total_mb']:>8.0f} MB")
+    print("\nRSS conta as páginas compartilhadas em todos os processos; PSS total é o consumo real do conjunto.")
+
+
+if __name__ == '__main__':
+    main()
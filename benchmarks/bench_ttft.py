@@ -0,0 +1,131 @@
+"""
+Tempo até o primeiro token com o contexto dentro do prompt de sistema (antigo)
+e numa mensagem própria antes da pergunta (atual), contra um LLM local com
+cache de prefixo (LLM_PROVIDER=local, ver bot/local_llm.py).
+
+No layout antigo o contexto muda a cada turno no fim do sistema, então tudo
+que vem depois (o histórico inteiro) é reprocessado. No atual, sistema +
+histórico formam um prefixo estável e só contexto + pergunta são novos.
+
+Reproduz as conversas de benchmarks/bench_prompt.py turno a turno, com as
+respostas gravadas no histórico. Quando o servidor informa (llama.cpp), mostra
+também quantos tokens do prompt vieram do cache.
+
+Uso (na raiz do projeto, com o servidor local no ar):
+    llama-server -m modelo.gguf --port 8080
+    python -m benchmarks.bench_ttft --url http://localhost:8080/v1 --conversas-max 10
+    python -m benchmarks.bench_ttft --intercalar   # vários chats disputando o mesmo servidor
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from langchain_core.documents import Document
+from langchain_core.messages import SystemMessage
+
+from benchmarks.bench_prompt import conversas_do_jsonl, conversas_do_roteiro, recuperar, PALAVRA
+from benchmarks.load_test import percentil
+from bot.kb_store import store_atual
+from bot.local_llm import LocalChatModel
+from bot.prompt_budget import PromptBudget
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def montar(layout, sistema, contexto_template, historico, pergunta, docs):
+    contexto = contexto_template.format(context='\n\n'.join(doc.page_content for doc, _ in docs))
+    if layout == 'antigo':
+        return [SystemMessage(content=sistema + '\n' + contexto)] + historico + [pergunta]
+    return [SystemMessage(content=sistema)] + historico + [SystemMessage(content=contexto), pergunta]
+
+
+def turnos_em_ordem(conversas, intercalar):
+    """(conversa, índice da mensagem do cliente), em sequência ou em rodízio entre os chats."""
+    por_conversa = [[(c, i) for i, m in enumerate(mensagens) if not m.get('fromMe') and m.get('body')]
+                    for c, mensagens in enumerate(conversas)]
+    if not intercalar:
+        return [turno for turnos in por_conversa for turno in turnos]
+    ordem = []
+    for rodada in range(max(len(t) for t in por_conversa)):
+        ordem.extend(turnos[rodada] for turnos in por_conversa if rodada < len(turnos))
+    return ordem
+
+
+def medir(modelo, mensagens):
+    inicio = time.perf_counter()
+    ttft = None
+    timings = {}
+    for chunk in modelo.stream(mensagens):
+        if chunk.content and ttft is None:
+            ttft = time.perf_counter() - inicio
+        timings = chunk.response_metadata.get('timings') or timings
+    return ttft if ttft is not None else time.perf_counter() - inicio, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=os.getenv('LOCAL_LLM_URL', 'http://localhost:8080/v1'))
+    parser.add_argument('--modelo', default=os.getenv('LOCAL_LLM_MODELO', 'local'))
+    parser.add_argument('--conversas', help='Arquivo .jsonl com conversas gravadas (padrão: roteiro sintético)')
+    parser.add_argument('--conversas-max', type=int, default=10)
+    parser.add_argument('--intercalar', action='store_true', help='Alterna os chats a cada turno')
+    parser.add_argument('--max-tokens', type=int, default=16, help='Tokens gerados por turno (só o primeiro importa)')
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    from langchain_chroma import Chroma
+    from bot.ai_bot import SYSTEM_TEMPLATE, CONTEXT_TEMPLATE
+
+    textos = Chroma(persist_directory=store_atual(args.chroma))._collection.get(include=['documents'])['documents']
+    documentos = [(Document(page_content=t), set(PALAVRA.findall(t.lower()))) for t in textos]
+    conversas = conversas_do_jsonl(args.conversas) if args.conversas else conversas_do_roteiro(textos)
+    conversas = conversas[:args.conversas_max]
+
+    modelo = LocalChatModel(base_url=args.url, model=args.modelo, max_tokens=args.max_tokens, temperature=0)
+    # Sem orçamento: os dois layouts recebem exatamente o mesmo histórico e documentos
+    montador = PromptBudget(SYSTEM_TEMPLATE, budget=0)
+    ordem = turnos_em_ordem(conversas, args.intercalar)
+
+    resultado = {'turnos': len(ordem), 'conversas': len(conversas), 'intercalado': args.intercalar, 'layouts': {}}
+    for layout in ('antigo', 'atual'):
+        # Descarta o cache da rodada anterior com um prompt sem nada em comum
+        medir(modelo, [SystemMessage(content=f'reinício {layout} {time.time()}')])
+        ttfts, processados, cache = [], [], []
+        for c, i in ordem:
+            historico = conversas[c][:i + 1]
+            pergunta = historico[-1]['body']
+            prompt = montador.build(historico, pergunta, [])
+            docs = recuperar(pergunta, documentos)
+            mensagens = montar(layout, SYSTEM_TEMPLATE, CONTEXT_TEMPLATE, prompt.messages[:-1], prompt.messages[-1], docs)
+            ttft, timings = medir(modelo, mensagens)
+            ttfts.append(ttft)
+            if 'prompt_n' in timings:
+                processados.append(timings['prompt_n'])
+                cache.append(timings.get('cache_n', 0))
+
+        dados = {
+            'ttft_p50_ms': round(percentil(ttfts, 0.5) * 1000, 1),
+            'ttft_p95_ms': round(percentil(ttfts, 0.95) * 1000, 1),
+            'ttft_media_ms': round(statistics.mean(ttfts) * 1000, 1),
+        }
+        if processados:
+            dados['tokens_processados_media'] = round(statistics.mean(processados), 1)
+            dados['tokens_do_cache_media'] = round(statistics.mean(cache), 1)
+        resultado['layouts'][layout] = dados
+
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+        return
+
+    print(f"💬 {len(conversas)} conversas, {len(ordem)} turnos ({'intercalados' if args.intercalar else 'em sequência'}) | {args.url}\n")
+    print(f"{'layout':<9}{'TTFT p50':>11}{'p95':>10}{'média':>10}{'processados':>13}{'do cache':>10}")
+    for layout, d in resultado['layouts'].items():
+        print(f"{layout:<9}{d['ttft_p50_ms']:>8.0f} ms{d['ttft_p95_ms']:>7.0f} ms{d['ttft_media_ms']:>7.0f} ms"
+              f"{d.get('tokens_processados_media', float('nan')):>13.0f}{d.get('tokens_do_cache_media', float('nan')):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Compara o cliente WAHA síncrono com o AsyncWaha contra o servidor falso.
+
+Cenário: N pares de mensagens independentes (cliente + suporte), com
+latência e falhas 503 injetadas no WAHA falso.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bench_waha --pares 50 --latencia-ms 40 --erro 0.1
+"""
+import os
+import time
+import asyncio
+import argparse
+
+from benchmarks.fake_waha import FakeWaha
+from services.waha import Waha
+from services.waha_async import AsyncWaha
+
+
+def resumo(nome, fake, duracao, esperadas):
+    entregues = sum(1 for e in fake.eventos if e['endpoint'] == 'sendText' and e['status'] == 201)
+    falhas = sum(1 for e in fake.eventos if e['status'] == 503)
+    print(f"{nome:<10} {duracao * 1000:>9.0f} ms | entregues {entregues}/{esperadas} | 503 recebidos {falhas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pares', type=int, default=50)
+    parser.add_argument('--latencia-ms', type=float, default=40)
+    parser.add_argument('--erro', type=float, default=0.1)
+    args = parser.parse_args()
+
+    fake = FakeWaha(latencia_ms=args.latencia_ms, erro=args.erro)
+    url = fake.iniciar_em_thread()
+    mensagens = []
+    for i in range(args.pares):
+        mensagens.append((f'5562{i:08d}@c.us', 'Recebi seus dados!'))
+        mensagens.append(('215470020018431@lid', f'🚨 *SIMULAÇÃO* cliente {i}'))
+    print(f"WAHA falso em {url} | {len(mensagens)} mensagens | latência ~{args.latencia_ms} ms | erro {args.erro:.0%}\n")
+
+    # 1. Cliente atual: requests.Session, uma chamada por vez, sem retry
+    os.environ['WAHA_API_URL'] = url
+    waha = Waha()
+    inicio = time.perf_counter()
+    for chat_id, texto in mensagens:
+        waha.send_message(chat_id, texto)
+    resumo('sync', fake, time.perf_counter() - inicio, len(mensagens))
+
+    # 2. AsyncWaha: pool de conexões, retries com jitter e envio concorrente
+    fake.resetar()
+
+    async def enviar():
+        cliente = AsyncWaha(api_url=url)
+        try:
+            await cliente.send_messages(mensagens)
+        finally:
+            await cliente.close()
+
+    inicio = time.perf_counter()
+    asyncio.run(enviar())
+    resumo('async', fake, time.perf_counter() - inicio, len(mensagens))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Avaliação offline do classificador de intenção (RETRIEVAL_SELETIVO).
+
+Compara a decisão do classificador com o comportamento atual (sempre k=4)
+e com rótulos manuais de "precisa da base de conhecimento", e estima a
+economia de tokens de entrada e de latência de recuperação.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.eval_intent
+    python -m benchmarks.eval_intent --indice ./chroma_datav2/indice_matriz   # tamanho real dos fragmentos
+    python -m benchmarks.eval_intent --medir-retrieval                        # cronometra embedding + busca reais
+"""
+import os
+import json
+import time
+import argparse
+
+from bot.intent import classificar_intencao
+
+K_ATUAL = 4
+
+# (mensagem do cliente, precisa da base de conhecimento?)
+AMOSTRAS = [
+    ("Oi", False),
+    ("Olá, boa tarde!", False),
+    ("bom dia", False),
+    ("Vi o anúncio de vocês sobre FGTS", True),
+    ("Sim", False),
+    ("já estou sim", False),
+    ("Não sei o que é isso", True),
+    ("Acho que sim", False),
+    ("pronto", False),
+    ("Pronto, já autorizei os 3", False),
+    ("feito", False),
+    ("Não estou achando o banco BMP", True),
+    ("não aparece a QI na lista", True),
+    ("Maria Aparecida Souza, 123.456.789-09", False),
+    ("CPF 98765432100 nascida em 12/05/1988", False),
+    ("quero pelo link", False),
+    ("pode fazer por aqui", False),
+    ("Simulação por aqui mesmo", False),
+    ("É seguro?", True),
+    ("isso não é golpe não né?", True),
+    ("vou pagar parcela todo mês?", True),
+    ("desconta do meu salário?", True),
+    ("Estou negativado, consigo?", True),
+    ("tenho nome sujo no serasa", True),
+    ("Quanto tempo demora pra cair na conta?", True),
+    ("qual a taxa de juros?", True),
+    ("Vocês fazem consignado do INSS?", True),
+    ("quero fazer cartão de crédito", True),
+    ("Sim, podemos sim", False),
+    ("Claro, pode seguir", False),
+    ("Banco Itaú agência 1234 conta 56789-0", False),
+    ("Nubank ag 0001 cc 1234567-8", False),
+    ("ok obrigado", False),
+    ("Como funciona a antecipação?", True),
+    ("quanto eu consigo sacar?", True),
+    ("me explica de novo", True),
+]
+
+
+def estimar_tokens(texto: str) -> int:
+    # Aproximação usual para português: ~4 caracteres por token
+    return max(1, len(texto) // 4)
+
+
+def tamanho_medio_fragmento(indice_dir):
+    if indice_dir and os.path.exists(os.path.join(indice_dir, 'docs.json')):
+        with open(os.path.join(indice_dir, 'docs.json'), encoding='utf-8') as f:
+            docs = json.load(f)
+        return sum(estimar_tokens(d['page_content']) for d in docs) / len(docs), 'índice'
+    # chunk_size=800 do rag.py
+    return estimar_tokens('x' * 800), 'chunk_size'
+
+
+def medir_retrieval_ms():
+    from bot.ai_bot import carregar_embeddings, CHROMA_PATH
+    from langchain_chroma import Chroma
+
+    EMBEDDING_MODEL = carregar_embeddings()
+    store = Chroma(persist_directory=CHROMA_PATH, embedding_function=EMBEDDING_MODEL)
+    store.similarity_search("aquecimento", k=K_ATUAL)
+    inicio = time.perf_counter()
+    for mensagem, _ in AMOSTRAS:
+        store.similarity_search(mensagem, k=K_ATUAL)
+    return (time.perf_counter() - inicio) / len(AMOSTRAS) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--indice', help='Diretório do índice em matriz (docs.json) para medir os fragmentos')
+    parser.add_argument('--medir-retrieval', action='store_true', help='Cronometra embedding + Chroma reais')
+    parser.add_argument('--retrieval-ms', type=float, default=25.0, help='Latência assumida de embedding + busca')
+    args = parser.parse_args()
+
+    tokens_fragmento, origem = tamanho_medio_fragmento(args.indice)
+    retrieval_ms = medir_retrieval_ms() if args.medir_retrieval else args.retrieval_ms
+
+    acertos = falsos_negativos = falsos_positivos = mesmo_k = pulados = 0
+    fragmentos_economizados = 0
+    inicio = time.perf_counter()
+    decisoes = [classificar_intencao(mensagem) for mensagem, _ in AMOSTRAS]
+    classificador_ms = (time.perf_counter() - inicio) / len(AMOSTRAS) * 1000
+
+    print(f"{'Mensagem':<45}{'Intenção':<12}{'k':>3}  Rótulo")
+    for (mensagem, precisa), decisao in zip(AMOSTRAS, decisoes):
+        recupera = decisao.k > 0
+        acertos += recupera == precisa
+        falsos_negativos += precisa and not recupera
+        falsos_positivos += recupera and not precisa
+        mesmo_k += decisao.k == K_ATUAL
+        pulados += not recupera
+        fragmentos_economizados += K_ATUAL - decisao.k
+        marca = '✅' if recupera == precisa else '❌'
+        print(f"{mensagem[:43]:<45}{decisao.intent:<12}{decisao.k:>3}  {marca} {'base' if precisa else 'roteiro'}")
+
+    total = len(AMOSTRAS)
+    print(f"\nAmostras: {total}")
+    print(f"Concordância com o comportamento atual (k={K_ATUAL}): {mesmo_k / total:.0%}")
+    print(f"Acurácia vs. rótulos: {acertos / total:.0%} | "
+          f"perdeu contexto necessário: {falsos_negativos} | recuperou sem precisar: {falsos_positivos}")
+    print(f"Recuperação pulada em {pulados / total:.0%} das mensagens")
+    print(f"Tokens de contexto economizados: ~{fragmentos_economizados * tokens_fragmento / total:.0f} por mensagem "
+          f"(~{tokens_fragmento:.0f} tokens/fragmento, fonte: {origem})")
+    print(f"Latência: classificador {classificador_ms:.3f} ms | "
+          f"recuperação evitada ~{pulados / total * retrieval_ms:.1f} ms por mensagem (base {retrieval_ms:.1f} ms)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Servidor WAHA falso para testes e benchmarks offline.
+
+Responde os mesmos endpoints usados pelo services/waha.py, com latência
+(lognormal) e taxa de erro 503 configuráveis, e registra cada chamada.
+Com `concorrencia`, a sessão atende só N chamadas de cada vez (as outras
+esperam na ordem de chegada), como o navegador de uma sessão do WAHA.
+
+Uso isolado:
+    python -m benchmarks.fake_waha --porta 3000 --latencia-ms 40 --erro 0.05
+"""
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import defaultdict
+
+from aiohttp import web
+
+
+class FakeWaha:
+    def __init__(self, latencia_ms: float = 30, sigma: float = 0.5, erro: float = 0.0, seed: int = 42,
+                 concorrencia: int = 0):
+        self.latencia_ms = latencia_ms
+        self.concorrencia = concorrencia
+        self.__sessao = None
+        self.sigma = sigma
+        self.erro = erro
+        self.random = random.Random(seed)
+        self.eventos = []
+        self.envios = defaultdict(list)
+        self.historico = defaultdict(list)
+        self.url = None
+        self.__lock = threading.Condition()
+
+    def _registrar(self, endpoint, chat_id, status, inicio):
+        with self.__lock:
+            evento = {
+                'endpoint': endpoint,
+                'chat_id': chat_id,
+                'status': status,
+                'inicio': inicio,
+                'fim': time.time(),
+            }
+            self.eventos.append(evento)
+            if endpoint == 'sendText' and status == 201:
+                self.envios[chat_id].append(evento)
+            self.__lock.notify_all()
+
+    async def _simular(self):
+        """Aplica a latência sorteada e decide se a chamada falha."""
+        if self.concorrencia > 0:
+            if self.__sessao is None:
+                # Criado dentro do event loop do servidor
+                self.__sessao = asyncio.Semaphore(self.concorrencia)
+            async with self.__sessao:
+                await self._latencia()
+        else:
+            await self._latencia()
+        return self.random.random() < self.erro
+
+    async def _latencia(self):
+        if self.latencia_ms > 0:
+            await asyncio.sleep(self.random.lognormvariate(0, self.sigma) * self.latencia_ms / 1000)
+
+    async def _post(self, request, endpoint):
+        inicio = time.time()
+        data = await request.json()
+        chat_id = data.get('chatId')
+        if await self._simular():
+            self._registrar(endpoint, chat_id, 503, inicio)
+            return web.json_response({'error': 'fake'}, status=503)
+
+        if endpoint == 'sendText':
+            with self.__lock:
+                self.historico[chat_id].append({'body': data.get('text'), 'fromMe': True, 'timestamp': time.time()})
+        self._registrar(endpoint, chat_id, 201, inicio)
+        return web.json_response({'id': f'fake_{len(self.eventos)}'}, status=201)
+
+    async def send_text(self, request):
+        return await self._post(request, 'sendText')
+
+    async def start_typing(self, request):
+        return await self._post(request, 'startTyping')
+
+    async def stop_typing(self, request):
+        return await self._post(request, 'stopTyping')
+
+    async def messages(self, request):
+        inicio = time.time()
+        chat_id = request.match_info['chat_id']
+        if await self._simular():
+            self._registrar('messages', chat_id, 503, inicio)
+            return web.json_response({'error': 'fake'}, status=503)
+        limit = int(request.query.get('limit', 10))
+        with self.__lock:
+            mensagens = list(self.historico[chat_id][-limit:])
+        self._registrar('messages', chat_id, 200, inicio)
+        return web.json_response(mensagens)
+
+    def registrar_recebida(self, chat_id: str, body: str):
+        """Simula a mensagem do cliente já presente no histórico do WhatsApp."""
+        with self.__lock:
+            self.historico[chat_id].append({'body': body, 'fromMe': False, 'timestamp': time.time()})
+
+    def aguardar_envio(self, chat_id: str, depois_de: float, timeout: float = 30):
+        """Espera o primeiro sendText para o chat após o instante informado (ou None no timeout)."""
+        limite = time.time() + timeout
+        with self.__lock:
+            while True:
+                for evento in self.envios[chat_id]:
+                    if evento['inicio'] >= depois_de:
+                        return evento
+                restante = limite - time.time()
+                if restante <= 0:
+                    return None
+                self.__lock.wait(restante)
+
+    def eventos_do_chat(self, chat_id: str, inicio: float, fim: float):
+        with self.__lock:
+            return [e for e in self.eventos if e['chat_id'] == chat_id and inicio <= e['inicio'] <= fim]
+
+    def resetar(self):
+        with self.__lock:
+            self.eventos.clear()
+            self.envios.clear()
+            self.historico.clear()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/sendText', self.send_text)
+        app.router.add_post('/api/startTyping', self.start_typing)
+        app.router.add_post('/api/stopTyping', self.stop_typing)
+        app.router.add_get('/api/{session}/chats/{chat_id}/messages', self.messages)
+        return app
+
+    def iniciar_em_thread(self, porta: int = 0) -> str:
+        """Sobe o servidor num event loop próprio e devolve a URL base."""
+        pronto = threading.Event()
+
+        def rodar():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            runner = web.AppRunner(self.app())
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, '127.0.0.1', porta)
+            loop.run_until_complete(site.start())
+            self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+            pronto.set()
+            loop.run_forever()
+
+        threading.Thread(target=rodar, name='fake-waha', daemon=True).start()
+        pronto.wait()
+        return self.url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--porta', type=int, default=3000)
+    parser.add_argument('--latencia-ms', type=float, default=30)
+    parser.add_argument('--erro', type=float, default=0.0)
+    parser.add_argument('--concorrencia', type=int, default=0, help='Chamadas atendidas ao mesmo tempo (0 = sem limite)')
+    args = parser.parse_args()
+
+    fake = FakeWaha(latencia_ms=args.latencia_ms, erro=args.erro, concorrencia=args.concorrencia)
+    web.run_app(fake.app(), host='0.0.0.0', port=args.porta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""
+Teste de carga offline do /chatbot/webhook/.
+
+Sobe o WAHA falso, inicia o app no gunicorn com o LLM falso (LLM_PROVIDER=fake)
+e os embeddings falsos (EMBEDDINGS_BACKEND=fake, sem baixar o MiniLM; use
+--embeddings torch ou onnx para medir o modelo real) e simula muitos chats em paralelo: clientes seguindo o roteiro, comandos do
+suporte e mensagens de grupo (ignoradas). Cada cliente espera a resposta
+antes de mandar a próxima mensagem, como no WhatsApp.
+
+Relatório: latência ponta a ponta (webhook -> primeira resposta no WAHA)
+p50/p95/p99, vazão, tempo de confirmação do webhook e tempo por etapa
+(histórico, recuperação + LLM, envios) observado pelo WAHA falso, mais a
+média de cada etapa medida pelo próprio app em /metrics.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.load_test --chats 30 --workers 3
+    python -m benchmarks.load_test --chats 30 --workers 1,3,6 --llm-ms 800
+    python -m benchmarks.load_test --chats 30 --workers 3 --env MODO_ASSINCRONO=1 --env FILA_WORKERS=8
+"""
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import random
+import argparse
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fake_waha import FakeWaha
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+WEBHOOK = '/chatbot/webhook/'
+SUPORTE = '556282027373@c.us'
+GRUPO = '120363025246125888@g.us'
+
+ROTEIRO_CLIENTE = [
+    "Oi",
+    "Sim, já estou no saque-aniversário",
+    "É seguro?",
+    "pronto",
+    "Maria Aparecida Souza, CPF 123.456.789-09, nascida em 12/05/1988",
+    "Sim, podemos sim",
+    "Banco Nubank agência 0001 conta 1234567-8",
+]
+
+
+def payload(chat_id: str, body: str) -> dict:
+    return {
+        'event': 'message',
+        'session': 'default',
+        'payload': {
+            'id': f'false_{chat_id}_{random.getrandbits(48):x}',
+            'from': chat_id,
+            'fromMe': False,
+            'body': body,
+            'timestamp': int(time.time()),
+        },
+    }
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Resultados:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.e2e = []
+        self.ack = []
+        self.suporte = []
+        self.grupo_ack = []
+        self.etapas = {'historico': [], 'recuperacao+llm': [], 'envios': []}
+        self.timeouts = 0
+        self.erros_http = 0
+
+    def adicionar(self, campo, valor):
+        with self.lock:
+            getattr(self, campo).append(valor)
+
+    def contar(self, campo):
+        with self.lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def etapa(self, nome, valor):
+        with self.lock:
+            self.etapas[nome].append(valor)
+
+
+def simular_cliente(indice, base_url, fake, args, resultados):
+    chat_id = f'5562{indice:08d}@c.us'
+    http = requests.Session()
+    for body in ROTEIRO_CLIENTE[:args.mensagens]:
+        t0 = time.time()
+        fake.registrar_recebida(chat_id, body)
+        try:
+            resposta = http.post(base_url + WEBHOOK, json=payload(chat_id, body), timeout=args.timeout)
+            resultados.adicionar('ack', time.time() - t0)
+            if resposta.status_code >= 500:
+                resultados.contar('erros_http')
+        except requests.RequestException:
+            resultados.contar('erros_http')
+            continue
+
+        envio = fake.aguardar_envio(chat_id, t0, timeout=args.timeout)
+        if envio is None:
+            resultados.contar('timeouts')
+            continue
+        resultados.adicionar('e2e', envio['fim'] - t0)
+
+        # Etapas observadas do lado do WAHA (dá tempo de chegarem os envios restantes)
+        time.sleep(0.05)
+        eventos = fake.eventos_do_chat(chat_id, t0, time.time())
+        historico = [e for e in eventos if e['endpoint'] == 'messages']
+        envios = [e for e in eventos if e['endpoint'] == 'sendText']
+        inicio_ia = historico[0]['fim'] if historico else t0
+        if historico:
+            resultados.etapa('historico', historico[0]['fim'] - historico[0]['inicio'])
+        resultados.etapa('recuperacao+llm', envios[0]['inicio'] - inicio_ia)
+        resultados.etapa('envios', envios[-1]['fim'] - envios[0]['inicio'])
+
+        time.sleep(random.uniform(0, args.pensar_ms / 1000))
+
+
+def simular_suporte(base_url, fake, args, resultados, parar):
+    http = requests.Session()
+    n = 0
+    while not parar.is_set():
+        n += 1
+        body = f"CPF: 123.456.789-09, TEL: 556299{n:07d}, VALOR: 1.500,00"
+        t0 = time.time()
+        try:
+            http.post(base_url + WEBHOOK, json=payload(SUPORTE, body), timeout=args.timeout)
+        except requests.RequestException:
+            resultados.contar('erros_http')
+            continue
+        envio = fake.aguardar_envio(SUPORTE, t0, timeout=args.timeout)
+        if envio:
+            resultados.adicionar('suporte', envio['fim'] - t0)
+        parar.wait(args.suporte_intervalo)
+
+
+def simular_grupo(base_url, args, resultados, parar):
+    http = requests.Session()
+    while not parar.is_set():
+        t0 = time.time()
+        try:
+            http.post(base_url + WEBHOOK, json=payload(GRUPO, 'bom dia grupo'), timeout=args.timeout)
+            resultados.adicionar('grupo_ack', time.time() - t0)
+        except requests.RequestException:
+            resultados.contar('erros_http')
+        parar.wait(args.grupo_intervalo)
+
+
+def iniciar_app(workers, fake_url, args, porta=None, env_extra=None):
+    porta = porta or porta_livre()
+    env = dict(os.environ)
+    env.update({
+        'WAHA_API_URL': fake_url,
+        'LLM_PROVIDER': 'fake',
+        'FAKE_LLM_LATENCIA_MS': str(args.llm_ms),
+        'FAKE_LLM_SIGMA': str(args.llm_sigma),
+        'EMBEDDINGS_BACKEND': args.embeddings,
+        'FAKE_EMBEDDINGS_LATENCIA_MS': str(args.embeddings_ms),
+        'CHROMA_PATH': args.chroma,
+        'PYTHONPATH': RAIZ,
+        # Diretório de métricas próprio por rodada, para o /metrics não misturar execuções
+        'METRICS_DIR': tempfile.mkdtemp(prefix='bot_metrics_'),
+        # O app escolhe o store de deduplicação pelo número de workers; arquivo próprio por processo
+        # iniciado (nós do bench_cluster não se deduplicam, exceto quando o modo lease passa um comum)
+        'WEB_CONCURRENCY': str(workers),
+        'CLUSTER_SQLITE_PATH': os.path.join(tempfile.mkdtemp(prefix='bot_cluster_'), 'cluster.sqlite3'),
+    })
+    for item in args.env:
+        chave, _, valor = item.partition('=')
+        env[chave] = valor
+    env.update(env_extra or {})
+
+    comando = [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--timeout', '120',
+               '--bind', f'127.0.0.1:{porta}', '--log-level', 'warning', 'app:app']
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=env)
+    base_url = f'http://127.0.0.1:{porta}'
+
+    # Pronto quando todos os workers terminaram de carregar a IA (aquecimento em segundo plano)
+    prontos = set()
+    limite = time.time() + 180
+    while time.time() < limite:
+        try:
+            dados = requests.get(base_url + '/health', timeout=2, headers={'Connection': 'close'}).json()
+            if dados.get('ia') == 'pronta':
+                prontos.add(dados['pid'])
+            if len(prontos) >= workers:
+                return processo, base_url
+        except (requests.RequestException, ValueError):
+            pass
+        if processo.poll() is not None:
+            raise RuntimeError('gunicorn encerrou durante a inicialização')
+        time.sleep(0.1)
+    processo.terminate()
+    raise RuntimeError('app não respondeu a tempo')
+
+
+def rodar(workers, fake, args):
+    fake.resetar()
+    processo, base_url = iniciar_app(workers, fake.url, args)
+    resultados = Resultados()
+    parar = threading.Event()
+    extras = [
+        threading.Thread(target=simular_suporte, args=(base_url, fake, args, resultados, parar), daemon=True),
+        threading.Thread(target=simular_grupo, args=(base_url, args, resultados, parar), daemon=True),
+    ]
+    try:
+        inicio = time.time()
+        for t in extras:
+            t.start()
+        with ThreadPoolExecutor(max_workers=args.chats) as pool:
+            for i in range(args.chats):
+                pool.submit(simular_cliente, i, base_url, fake, args, resultados)
+        duracao = time.time() - inicio
+        parar.set()
+        etapas_app = etapas_do_metrics(base_url)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+    return relatorio(workers, resultados, duracao, etapas_app, args)
+
+
+def etapas_do_metrics(base_url):
+    """Tempo médio de cada etapa medido pelo próprio app (GET /metrics)."""
+    try:
+        texto = requests.get(base_url + '/metrics', timeout=5).text
+    except requests.RequestException:
+        return {}
+    somas, contagens = {}, {}
+    for linha in texto.splitlines():
+        for sufixo, destino in (('_sum', somas), ('_count', contagens)):
+            prefixo = f'bot_etapa_segundos{sufixo}{{etapa="'
+            if linha.startswith(prefixo):
+                etapa, valor = linha[len(prefixo):].split('"} ')
+                destino[etapa] = float(valor)
+    return {etapa: round(somas[etapa] / contagens[etapa] * 1000, 2) for etapa in somas if contagens.get(etapa)}
+
+
+def relatorio(workers, r, duracao, etapas_app, args):
+    ms = lambda valores, p: round(percentil(valores, p) * 1000, 1)
+    dados = {
+        'workers': workers,
+        'env': args.env,
+        'turnos': len(r.e2e),
+        'duracao_s': round(duracao, 2),
+        'vazao_turnos_s': round(len(r.e2e) / duracao, 2) if duracao else 0,
+        'e2e_ms': {'p50': ms(r.e2e, .5), 'p95': ms(r.e2e, .95), 'p99': ms(r.e2e, .99)},
+        'ack_ms': {'p50': ms(r.ack, .5), 'p95': ms(r.ack, .95), 'p99': ms(r.ack, .99)},
+        'suporte_ms': {'p50': ms(r.suporte, .5), 'p95': ms(r.suporte, .95)},
+        'grupo_ack_ms': {'p50': ms(r.grupo_ack, .5), 'p95': ms(r.grupo_ack, .95)},
+        'etapas_ms': {nome: {'p50': ms(v, .5), 'p95': ms(v, .95)} for nome, v in r.etapas.items()},
+        'etapas_app_media_ms': etapas_app,
+        'timeouts': r.timeouts,
+        'erros_http': r.erros_http,
+    }
+
+    print(f"\n=== workers={workers} {' '.join(args.env)} ===")
+    print(f"Turnos: {dados['turnos']} em {dados['duracao_s']} s | vazão {dados['vazao_turnos_s']} turnos/s "
+          f"| timeouts {r.timeouts} | erros HTTP {r.erros_http}")
+    for nome in ('e2e_ms', 'ack_ms', 'suporte_ms', 'grupo_ack_ms'):
+        print(f"  {nome:<14}" + '  '.join(f"{p}={v:>8}" for p, v in dados[nome].items()))
+    for nome, v in dados['etapas_ms'].items():
+        print(f"  etapa {nome:<16} p50={v['p50']:>8}  p95={v['p95']:>8}")
+    if etapas_app:
+        print("  média por etapa no app (/metrics): " + '  '.join(f"{k}={v}" for k, v in sorted(etapas_app.items())))
+    return dados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chats', type=int, default=30, help='Clientes simultâneos')
+    parser.add_argument('--mensagens', type=int, default=len(ROTEIRO_CLIENTE), help='Mensagens por cliente')
+    parser.add_argument('--workers', default='3', help='Workers do gunicorn (lista separada por vírgula para comparar)')
+    parser.add_argument('--llm-ms', type=float, default=800, help='Latência mediana do LLM falso')
+    parser.add_argument('--llm-sigma', type=float, default=0.4, help='Dispersão (lognormal) do LLM falso')
+    parser.add_argument('--embeddings', default='fake', choices=['fake', 'torch', 'onnx'],
+                        help='Backend de embeddings do app (fake = determinístico, sem modelo)')
+    parser.add_argument('--embeddings-ms', type=float, default=5, help='CPU por consulta dos embeddings falsos')
+    parser.add_argument('--waha-ms', type=float, default=30, help='Latência mediana do WAHA falso')
+    parser.add_argument('--waha-erro', type=float, default=0.0, help='Taxa de 503 do WAHA falso')
+    parser.add_argument('--pensar-ms', type=float, default=1500, help='Pausa máxima do cliente entre mensagens')
+    parser.add_argument('--suporte-intervalo', type=float, default=2.0)
+    parser.add_argument('--grupo-intervalo', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--chroma', default=os.path.join(RAIZ, 'chroma_datav2'))
+    parser.add_argument('--env', action='append', default=[], help='CHAVE=valor repassado ao app (ex.: MODO_ASSINCRONO=1)')
+    parser.add_argument('--json', help='Salva o relatório em JSON')
+    args = parser.parse_args()
+
+    fake = FakeWaha(latencia_ms=args.waha_ms, erro=args.waha_erro)
+    fake.iniciar_em_thread()
+    print(f"WAHA falso em {fake.url} | LLM falso ~{args.llm_ms} ms | {args.chats} chats x {args.mensagens} mensagens")
+
+    relatorios = [rodar(int(w), fake, args) for w in args.workers.split(',')]
+
+    if len(relatorios) > 1:
+        print(f"\n{'workers':>8}{'vazão/s':>10}{'e2e p50':>10}{'e2e p95':>10}{'e2e p99':>10}{'ack p95':>10}")
+        for d in relatorios:
+            print(f"{d['workers']:>8}{d['vazao_turnos_s']:>10}{d['e2e_ms']['p50']:>10}"
+                  f"{d['e2e_ms']['p95']:>10}{d['e2e_ms']['p99']:>10}{d['ack_ms']['p95']:>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(relatorios, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
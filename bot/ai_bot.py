@@ -1,15 +1,53 @@
 import os
+import time
+import threading
 from decouple import config
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_chroma import Chroma
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
+from bot.semantic_cache import SemanticCache
+from bot.matrix_retriever import MatrixRetriever, prune_indexes
+from bot.kb_store import REPLICAS_MANTIDAS, replicar_versao, store_atual, versao_atual
+from bot.onnx_embeddings import EMBEDDINGS_BACKEND, OnnxEmbeddings
+from bot.prompt_budget import PromptBudget, TokenCounter
+from bot.intent import classificar_intencao
+from bot.llm import criar_llm
+from services.history_store import MAX_BODY_CHARS
+from services.metrics import metricas
 
 # Configuração Global
 os.environ['GROQ_API_KEY'] = config('GROQ_API_KEY', default='')
 
+# Cache semântico de respostas (perguntas frequentes / saudação)
+CACHE_SEMANTICO = config('CACHE_SEMANTICO', default=False, cast=bool)
+CACHE_LIMIAR = config('CACHE_LIMIAR', default=0.92, cast=float)
+CACHE_TTL = config('CACHE_TTL', default=3600, cast=int)
+CACHE_MAX_ENTRADAS = config('CACHE_MAX_ENTRADAS', default=500, cast=int)
+
+# Recuperação: 'chroma' (padrão) ou 'matriz' (índice NumPy em memória, mmap)
+CHROMA_PATH = config('CHROMA_PATH', default='/app/chroma_datav2')
+RETRIEVAL_MODO = config('RETRIEVAL_MODO', default='chroma')
+# Vazio = <banco em uso>/indice_matriz (acompanha a versão publicada pelo rag.py)
+INDICE_MATRIZ_PATH = config('INDICE_MATRIZ_PATH', default='')
+# Intervalo (s) para checar se o rag.py publicou uma nova versão da base
+KB_RECARGA_S = config('KB_RECARGA_S', default=30, cast=float)
+# Vários nós: cada um lê uma cópia local da versão publicada em CHROMA_PATH (vazio = lê direto)
+KB_REPLICA_PATH = config('KB_REPLICA_PATH', default='')
+# Classificador de intenção decide se (e quanto) recuperar antes de ir ao Chroma
+RETRIEVAL_SELETIVO = config('RETRIEVAL_SELETIVO', default=False, cast=bool)
+
+# Orçamento de tokens do prompt (0 = sem limite, só contabiliza)
+PROMPT_ORCAMENTO_TOKENS = config('PROMPT_ORCAMENTO_TOKENS', default=0, cast=int)
+# tokenizer.json do modelo para contagem exata (vazio = estimativa por caracteres)
+PROMPT_TOKENIZER = config('PROMPT_TOKENIZER', default='')
+PROMPT_MAX_TOKENS_PERGUNTA = config('PROMPT_MAX_TOKENS_PERGUNTA', default=600, cast=int)
+PROMPT_TOKENS_TURNO_ANTIGO = config('PROMPT_TOKENS_TURNO_ANTIGO', default=60, cast=int)
+
+# Resposta segura quando a IA falha
+FALLBACK_RESPONSE = "Desculpe, o sistema está processando muitas solicitações. Pode repetir por favor?"
+
 # PROMPT CONSTANTE (Limpeza do código)
 SYSTEM_TEMPLATE = """
 ## 1. IDENTIDADE E DIRETRIZES FUNDAMENTAIS
@@ -117,73 +155,269 @@ Antes de gerar cada resposta, você deve:
 2.  Identificar em qual **ESTADO** o cliente está.
 3.  Verificar se ele já forneceu a informação solicitada.
 4.  Responder de forma curta, sem gírias e sempre terminando com uma instrução para o próximo passo.
-<context>
-{context}
-</context>
 """
 
-# Carregamento ÚNICO do modelo de Embeddings (Singleton Pattern via módulo)
+# Contexto recuperado vai numa mensagem própria, logo antes da pergunta: o prefixo
+# (sistema + histórico) fica idêntico entre chamadas e o cache de prefixo/KV do provedor acerta
+CONTEXT_TEMPLATE = """<context>
+{context}
+</context>"""
+
+# Carregamento ÚNICO do modelo de Embeddings (Singleton Pattern via módulo).
+# Adiado até o primeiro uso: importar este módulo não carrega torch/sentence-transformers.
+# Com IA_PRELOAD + gunicorn --preload ele é chamado no master e os workers herdam
+# os pesos por copy-on-write.
 MODEL_NAME = "all-MiniLM-L6-v2"
-try:
-    print("🧠 Carregando modelo de Embeddings...")
-    EMBEDDING_MODEL = HuggingFaceEmbeddings(model_name=MODEL_NAME)
-except Exception as e:
-    print(f"❌ Fallback embeddings: {e}")
-    EMBEDDING_MODEL = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+_EMBEDDING_MODEL = None
+_EMBEDDING_LOCK = threading.Lock()
+
+
+def carregar_embeddings():
+    global _EMBEDDING_MODEL
+    with _EMBEDDING_LOCK:
+        if _EMBEDDING_MODEL is None and EMBEDDINGS_BACKEND == 'fake':
+            # Testes e benchmarks: sem download nem modelo (bot/fake_embeddings.py)
+            from bot.fake_embeddings import FakeEmbeddings
+            _EMBEDDING_MODEL = FakeEmbeddings()
+            print("🧠 Embeddings falsos (EMBEDDINGS_BACKEND=fake)")
+        if _EMBEDDING_MODEL is None and EMBEDDINGS_BACKEND == 'onnx':
+            inicio = time.perf_counter()
+            _EMBEDDING_MODEL = OnnxEmbeddings()
+            print(f"🧠 Modelo de Embeddings ONNX (int8) carregado em {time.perf_counter() - inicio:.1f}s")
+        if _EMBEDDING_MODEL is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            inicio = time.perf_counter()
+            try:
+                print("🧠 Carregando modelo de Embeddings...")
+                _EMBEDDING_MODEL = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+            except Exception as e:
+                print(f"❌ Fallback embeddings: {e}")
+                _EMBEDDING_MODEL = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+            print(f"🧠 Modelo de Embeddings carregado em {time.perf_counter() - inicio:.1f}s")
+        return _EMBEDDING_MODEL
+
+class TimedEmbeddings(Embeddings):
+    """Repassa para o modelo de embeddings cronometrando as consultas."""
+
+    def __init__(self, embeddings):
+        self.__embeddings = embeddings
+
+    def embed_documents(self, texts):
+        return self.__embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with metricas.timer(etapa='embedding'):
+            return self.__embeddings.embed_query(text)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Contabiliza os tokens de prompt e de resposta informados pelo LLM."""
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get('token_usage') or {}
+        prompt, completion = usage.get('prompt_tokens'), usage.get('completion_tokens')
+        if prompt is None:
+            try:
+                meta = response.generations[0][0].message.usage_metadata or {}
+            except (IndexError, AttributeError):
+                meta = {}
+            prompt, completion = meta.get('input_tokens'), meta.get('output_tokens')
+        if prompt:
+            metricas.inc('bot_llm_tokens_total', prompt, tipo='prompt')
+        if completion:
+            metricas.inc('bot_llm_tokens_total', completion, tipo='completion')
+
 
 class AIBot:
     def __init__(self):
-        self.__chat = ChatGroq(
-            model="llama-3.3-70b-versatile",
-            temperature=0.3 # Reduzi a temperatura para ser mais fiel ao script
-        )
-        # Inicializa retriever apenas uma vez
+        self.__chat = criar_llm()
+        self.__embeddings = TimedEmbeddings(carregar_embeddings())
+        self.__callbacks = {'callbacks': [TokenUsageCallback()]}
+        # Inicializa retriever uma vez; troca só quando o rag.py publica nova versão
+        self.__kb_lock = threading.Lock()
+        self.__kb_versao = versao_atual(CHROMA_PATH)
+        self.__kb_checado = time.monotonic()
         self.__retriever = self.__build_retriever()
         
         # Prepara a chain (melhora performance de invocação)
         self.__chain = self.__build_chain()
+        self.__prompt = PromptBudget(
+            # Partes fixas do prompt: sistema + moldura da mensagem de contexto
+            SYSTEM_TEMPLATE + CONTEXT_TEMPLATE.replace('{context}', ''),
+            budget=PROMPT_ORCAMENTO_TOKENS,
+            counter=TokenCounter(PROMPT_TOKENIZER),
+            question_tokens=PROMPT_MAX_TOKENS_PERGUNTA,
+            old_turn_tokens=PROMPT_TOKENS_TURNO_ANTIGO,
+            body_chars=MAX_BODY_CHARS,
+        )
+
+        self.__cache = SemanticCache(
+            self.__embeddings,
+            threshold=CACHE_LIMIAR,
+            ttl=CACHE_TTL,
+            max_entries=CACHE_MAX_ENTRADAS,
+        ) if CACHE_SEMANTICO else None
 
     def __build_retriever(self):
-        persist_directory = '/app/chroma_datav2'
-        vector_store = Chroma(
+        from langchain_chroma import Chroma
+
+        if KB_REPLICA_PATH:
+            persist_directory = replicar_versao(CHROMA_PATH, KB_REPLICA_PATH)
+        else:
+            persist_directory = store_atual(CHROMA_PATH)
+        if RETRIEVAL_MODO == 'matriz':
+            if INDICE_MATRIZ_PATH:
+                # Um índice por versão (pasta com o nome da versão carregada): a versão nova
+                # publicada pelo rag.py é exportada de novo em vez de reaproveitar a antiga
+                index_dir = os.path.join(INDICE_MATRIZ_PATH, os.path.basename(os.path.normpath(persist_directory)))
+                retriever = MatrixRetriever.from_chroma(persist_directory, index_dir, self.__embeddings, k=4)
+                prune_indexes(INDICE_MATRIZ_PATH, index_dir, keep=REPLICAS_MANTIDAS)
+                return retriever
+            index_dir = os.path.join(persist_directory, 'indice_matriz')
+            return MatrixRetriever.from_chroma(persist_directory, index_dir, self.__embeddings, k=4)
+
+        # O vector store direto (e não as_retriever) devolve a distância de cada documento
+        return Chroma(
             persist_directory=persist_directory,
-            embedding_function=EMBEDDING_MODEL, # Usa a instância global
+            embedding_function=self.__embeddings, # Usa a instância global (cronometrada)
         )
-        return vector_store.as_retriever(search_kwargs={'k': 4})
+
+    def __recarregar_base(self):
+        """Troca o retriever se o ponteiro ATUAL mudou (sem reiniciar o worker)."""
+        if time.monotonic() - self.__kb_checado < KB_RECARGA_S:
+            return
+        with self.__kb_lock:
+            if time.monotonic() - self.__kb_checado < KB_RECARGA_S:
+                return
+            self.__kb_checado = time.monotonic()
+            versao = versao_atual(CHROMA_PATH)
+            if versao == self.__kb_versao:
+                return
+            try:
+                self.__retriever = self.__build_retriever()
+                self.__kb_versao = versao
+                print(f"📚 Base de conhecimento recarregada: versão {versao}")
+            except Exception as e:
+                print(f"❌ Erro ao carregar a versão {versao} da base: {e}")
+
+    def __retrieve(self, question, vector=None):
+        self.__recarregar_base()
+        with metricas.timer(etapa='recuperacao'):
+            return self.__retrieve_docs(question, vector)
+
+    def __retrieve_docs(self, question, vector=None):
+        k = 4
+        if RETRIEVAL_SELETIVO:
+            k = classificar_intencao(question).k
+            if not k:
+                return []
+        if vector is None:
+            vector = self.__embeddings.embed_query(question)
+        # Pares (documento, distância L2): o orçamento do prompt descarta os piores primeiro
+        if isinstance(self.__retriever, MatrixRetriever):
+            return self.__retriever.search_by_vector(vector, k)
+        return self.__retriever.similarity_search_by_vector_with_relevance_scores(vector, k=k)
 
     def __build_chain(self):
         prompt = ChatPromptTemplate.from_messages([
-            ('system', SYSTEM_TEMPLATE),
-            MessagesPlaceholder(variable_name='messages'),
+            # Mensagem literal (não é template): sempre os mesmos bytes
+            SystemMessage(content=SYSTEM_TEMPLATE),
+            MessagesPlaceholder(variable_name='historico'),
+            ('system', CONTEXT_TEMPLATE),
+            MessagesPlaceholder(variable_name='pergunta'),
         ])
         return create_stuff_documents_chain(self.__chat, prompt)
 
-    def __build_messages(self, history_messages, question):
-        messages = []
-        # Pega as últimas 6 mensagens para contexto
-        for message in history_messages[-6:]:
-            body = message.get('body', '')
-            if not body: continue
-            
-            if message.get('fromMe'):
-                messages.append(AIMessage(content=body))
-            else:
-                messages.append(HumanMessage(content=body))
-
-        messages.append(HumanMessage(content=question))
-        return messages
+    def __build_prompt(self, history_messages, question, scored_docs):
+        """Histórico, pergunta e contexto dentro do orçamento de tokens."""
+        prompt = self.__prompt.build(history_messages, question, scored_docs)
+        usage = prompt.usage
+        print(f"🧾 Prompt: {usage['total']} tokens (sistema {usage['sistema']}, pergunta {usage['pergunta']}, "
+              f"histórico {usage['historico']}, contexto {usage['contexto']}) | "
+              f"{usage['turnos_cortados']} turnos encurtados, {usage['docs_descartados']} docs descartados")
+        for parte in ('sistema', 'pergunta', 'historico', 'contexto'):
+            metricas.inc('bot_prompt_tokens_total', usage[parte], parte=parte)
+        return prompt
+
+    def cache_stats(self) -> dict:
+        return self.__cache.stats() if self.__cache else {'enabled': False}
+
+    def llm_stats(self) -> dict:
+        """Latência, erros, hedges e disjuntores por backend (só com LLM_ROTEADOR)."""
+        stats = getattr(self.__chat, 'stats', None)
+        return stats() if stats else {'enabled': False}
+
+    def __query_vector(self, question):
+        """Embedding da pergunta para o cache, calculado uma vez e reaproveitado na recuperação."""
+        if self.__cache and self.__cache.cacheable_question(question):
+            return self.__embeddings.embed_query(question)
+        return None
+
+    def __cache_lookup(self, history_messages, question, vector):
+        cached = self.__cache.lookup(history_messages, question, vector)
+        metricas.inc('bot_cache_total', resultado='hit' if cached is not None else 'miss')
+        return cached
 
     def invoke(self, history_messages, question) -> str:
         try:
-            docs = self.__retriever.invoke(question)
-            
-            response = self.__chain.invoke({
-                'context': docs,
-                'messages': self.__build_messages(history_messages, question),
-            })
+            vector = self.__query_vector(question)
+            if self.__cache:
+                cached = self.__cache_lookup(history_messages, question, vector)
+                if cached is not None:
+                    return cached
+
+            prompt = self.__build_prompt(history_messages, question, self.__retrieve(question, vector))
+
+            with metricas.timer(etapa='llm'):
+                response = self.__chain.invoke({
+                    'context': prompt.docs,
+                    'historico': prompt.messages[:-1],
+                    'pergunta': prompt.messages[-1:],
+                }, config=self.__callbacks)
 
+            if self.__cache:
+                self.__cache.store(history_messages, question, response, vector)
             return response
         except Exception as e:
             print(f"❌ ERRO BOT: {e}")
+            metricas.inc('bot_fallback_total')
             # Fallback seguro para não travar o chat
-            return "Desculpe, o sistema está processando muitas solicitações. Pode repetir por favor?"
\ No newline at end of file
+            return FALLBACK_RESPONSE
+
+    def stream(self, history_messages, question):
+        """Versão em streaming do invoke: gera os trechos da resposta conforme chegam."""
+        sent = False
+        try:
+            vector = self.__query_vector(question)
+            if self.__cache:
+                cached = self.__cache_lookup(history_messages, question, vector)
+                if cached is not None:
+                    yield cached
+                    return
+
+            prompt = self.__build_prompt(history_messages, question, self.__retrieve(question, vector))
+
+            parts = []
+            inicio = time.perf_counter()
+            for chunk in self.__chain.stream({
+                'context': prompt.docs,
+                'historico': prompt.messages[:-1],
+                'pergunta': prompt.messages[-1:],
+            }, config=self.__callbacks):
+                if not chunk:
+                    continue
+                if not sent:
+                    metricas.observe('bot_etapa_segundos', time.perf_counter() - inicio, etapa='llm_primeiro_token')
+                parts.append(chunk)
+                sent = True
+                yield chunk
+            metricas.observe('bot_etapa_segundos', time.perf_counter() - inicio, etapa='llm')
+
+            if self.__cache:
+                self.__cache.store(history_messages, question, ''.join(parts), vector)
+        except Exception as e:
+            print(f"❌ ERRO BOT (stream): {e}")
+            # Só dá para usar o fallback se nada foi enviado ainda
+            if not sent:
+                metricas.inc('bot_fallback_total')
+                yield FALLBACK_RESPONSE
\ No newline at end of file
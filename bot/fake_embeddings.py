@@ -0,0 +1,54 @@
+"""
+Embeddings falsos e determinísticos, no lugar do all-MiniLM-L6-v2 em testes e benchmarks.
+
+Ativados com EMBEDDINGS_BACKEND=fake (ver bot/ai_bot.py e rag/rag.py): não
+baixam nem carregam modelo, então o teste de carga roda numa máquina limpa e
+sem rede. Cada palavra cai numa posição do vetor (hashing), na mesma
+dimensão do MiniLM, para a base já indexada continuar consultável; textos com
+as mesmas palavras ficam próximos, o que basta para exercitar o cache e a
+recuperação (a relevância dos documentos não é a do modelo real).
+"""
+import re
+import time
+import hashlib
+from typing import List
+
+import numpy as np
+from decouple import config
+from langchain_core.embeddings import Embeddings
+
+# Tempo de CPU simulado por consulta (o MiniLM leva alguns ms em CPU)
+FAKE_EMBEDDINGS_LATENCIA_MS = config('FAKE_EMBEDDINGS_LATENCIA_MS', default=0, cast=float)
+
+DIMENSAO = 384  # all-MiniLM-L6-v2
+PALAVRA = re.compile(r'\w+')
+
+
+class FakeEmbeddings(Embeddings):
+    """Saco de palavras com hashing, normalizado (L2) como os vetores do MiniLM."""
+
+    def __init__(self, latencia_ms: float = FAKE_EMBEDDINGS_LATENCIA_MS):
+        self.__latencia = latencia_ms / 1000
+
+    def _vetor(self, texto: str) -> List[float]:
+        vetor = np.zeros(DIMENSAO, dtype=np.float32)
+        for palavra in PALAVRA.findall(texto.lower()):
+            digest = hashlib.blake2b(palavra.encode('utf-8'), digest_size=4).digest()
+            posicao = int.from_bytes(digest, 'big')
+            vetor[posicao % DIMENSAO] += 1.0 if posicao & 0x80000000 else -1.0
+        norma = np.linalg.norm(vetor)
+        if norma == 0:
+            vetor[0] = 1.0
+            norma = 1.0
+        return (vetor / norma).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vetor(texto) for texto in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.__latencia:
+            # Espera ativa: o modelo real ocupa a CPU (e o GIL), não dorme
+            fim = time.perf_counter() + self.__latencia
+            while time.perf_counter() < fim:
+                pass
+        return self._vetor(text)
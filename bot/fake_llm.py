@@ -0,0 +1,91 @@
+"""
+ChatModel falso com latência configurável, no lugar do ChatGroq em testes e benchmarks.
+
+Ativado no app com LLM_PROVIDER=fake (ver bot/llm.py); os scripts de
+benchmarks/ também o instanciam direto. Responde seguindo o
+roteiro do SYSTEM_TEMPLATE, inclusive as tags de alerta, para exercitar os
+fluxos de simulação e fechamento do app.
+"""
+import re
+import time
+import random
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+CPF = re.compile(r'\d{3}\.?\d{3}\.?\d{3}-?\d{2}')
+CONTA = re.compile(r'\b(ag|agência|agencia|conta)\b', re.I)
+
+RESPOSTA_SIMULACAO = (
+    "Recebi seus dados! Vou verificar a melhor proposta no sistema e já te chamo.\n"
+    "|||SUPORTE_ALERT: Nome: Cliente Teste | CPF: {cpf} | Nasc: 01/01/1990|||"
+)
+RESPOSTA_FECHAMENTO = (
+    "Maravilha! Já encaminhei para o nosso financeiro. O valor cairá na sua conta em breve. Parabéns!\n"
+    "|||FECHAMENTO_ALERT: Banco: Nubank | Ag: 0001 | Conta: 1234567-8|||"
+)
+RESPOSTA_PADRAO = (
+    "Perfeito! Agora, lá no App FGTS, entre em 'Autorizar bancos a consultarem FGTS'.\n\n"
+    "Você precisa adicionar estes 3 bancos parceiros para eu conseguir a melhor taxa: "
+    "BMP SOCIEDADE DE CREDITO, FACTA FINANCEIRA e QI SOCIEDADE DE CREDITO.\n\n"
+    "Consegue autorizar eles agora? Assim que terminar me manda um \"pronto\" aqui."
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """Latência lognormal até o primeiro token + geração a tokens_por_segundo."""
+
+    latencia_ms: float = 800.0
+    sigma: float = 0.4
+    tokens_por_segundo: float = 250.0
+    erro: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake-latency'
+
+    def _resposta(self, messages: List[BaseMessage]) -> str:
+        pergunta = str(messages[-1].content) if messages else ''
+        cpf = CPF.search(pergunta)
+        if cpf:
+            return RESPOSTA_SIMULACAO.format(cpf=cpf.group(0))
+        if CONTA.search(pergunta):
+            return RESPOSTA_FECHAMENTO
+        return RESPOSTA_PADRAO
+
+    def _esperar_primeiro_token(self):
+        time.sleep(random.lognormvariate(0, self.sigma) * self.latencia_ms / 1000)
+        if random.random() < self.erro:
+            raise RuntimeError('429 Too Many Requests (fake)')
+
+    def _uso(self, messages: List[BaseMessage], texto: str) -> dict:
+        # Mesma aproximação de ~4 caracteres por token usada nos benchmarks
+        prompt = sum(len(str(m.content)) for m in messages) // 4
+        completion = len(texto) // 4
+        return {'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': prompt + completion}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self._esperar_primeiro_token()
+        texto = self._resposta(messages)
+        time.sleep(len(texto) / 4 / self.tokens_por_segundo)
+        uso = self._uso(messages, texto)
+        mensagem = AIMessage(content=texto, usage_metadata={
+            'input_tokens': uso['prompt_tokens'],
+            'output_tokens': uso['completion_tokens'],
+            'total_tokens': uso['total_tokens'],
+        })
+        return ChatResult(generations=[ChatGeneration(message=mensagem)], llm_output={'token_usage': uso})
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        self._esperar_primeiro_token()
+        texto = self._resposta(messages)
+        for pedaco in re.findall(r'\S+\s*', texto):
+            time.sleep(len(pedaco) / 4 / self.tokens_por_segundo)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=pedaco))
+            if run_manager:
+                run_manager.on_llm_new_token(pedaco, chunk=chunk)
+            yield chunk
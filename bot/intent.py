@@ -0,0 +1,62 @@
+import re
+import unicodedata
+from typing import NamedTuple
+
+
+class RetrievalDecision(NamedTuple):
+    intent: str
+    k: int
+
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos, para as regras não dependerem da digitação do cliente."""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+# --- REGRAS (pré-compiladas, avaliadas em ordem) ---
+
+# Dúvidas e objeções: precisam da base de conhecimento
+REGEX_DUVIDA = re.compile(
+    r"\b(seguro|seguranca|golpe|confiavel|confianca|custo|custa|cobra|mensal|parcela|desconta|salario|"
+    r"negativad\w*|nome sujo|spc|serasa|prazo|quanto tempo|demora|cai na conta|taxa|juros|"
+    r"como funciona|o que e|que e isso|duvida|documento|contrato|consignado|cartao|emprestimo pessoal|"
+    r"achando|nao (acho|encontr\w*|aparece)|erro|problema|saldo|valor|quanto)\b"
+)
+# Envio de dados pessoais ou bancários: resposta vem do roteiro, não do PDF
+REGEX_DADOS = re.compile(
+    r"(\d{3}\.?\d{3}\.?\d{3}-?\d{2}|\b\d{2}/\d{2}/\d{2,4}\b|\b(cpf|nome completo|nascimento|agencia|conta|banco)\b|\b(ag|cc)\.?\s*\d)"
+)
+# Confirmações curtas e escolhas do fluxo roteirizado (ESTADOS 1 a 4)
+REGEX_FLUXO = re.compile(
+    r"^\W*(sim|nao|ja|ok|okay|pronto|feito|fiz|ja fiz|ja autorizei|autorizei|certo|claro|beleza|"
+    r"pode( ser| fazer| seguir)?|quero|podemos|link|pelo link|simulacao|por aqui|aqui|acho que sim|ta feito|obrigad[oa])\b[\w\s!.,]{0,30}$"
+)
+REGEX_SAUDACAO = re.compile(r"^\W*(oi+|ola|opa|bom dia|boa tarde|boa noite|e ai|hello|hi)\b[\w\s!.,]{0,20}$")
+
+
+def classificar_intencao(question: str) -> RetrievalDecision:
+    """
+    Decide, antes da recuperação, se a mensagem precisa da base de conhecimento
+    e quantos fragmentos usar (k=0 pula embedding e busca).
+    """
+    texto = _normalizar(question).strip()
+
+    if REGEX_DUVIDA.search(texto):
+        # Pergunta explícita ganha o contexto completo; menção solta, só o essencial
+        return RetrievalDecision('duvida', 4 if '?' in texto else 2)
+    if REGEX_DADOS.search(texto):
+        return RetrievalDecision('dados', 0)
+    if REGEX_SAUDACAO.match(texto):
+        return RetrievalDecision('saudacao', 0)
+    if REGEX_FLUXO.match(texto):
+        return RetrievalDecision('fluxo', 0)
+    if '?' in texto:
+        return RetrievalDecision('pergunta', 4)
+    # Sem sinal claro: mantém o comportamento atual
+    return RetrievalDecision('outro', 4)
+
+
+def contem_dados(question: str) -> bool:
+    """Mensagem traz CPF, data, dados bancários ou pedido deles (mesmo junto de uma dúvida)."""
+    return bool(REGEX_DADOS.search(_normalizar(question)))
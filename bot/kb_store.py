@@ -0,0 +1,75 @@
+import os
+import shutil
+from typing import Optional
+
+# Layout versionado da base de conhecimento:
+#   <db_path>/versoes/<versao>/   -> banco Chroma (+ indice_matriz/) de cada ingestão
+#   <db_path>/ATUAL               -> nome da versão em uso (trocado atomicamente)
+# Sem o arquivo ATUAL, o próprio <db_path> é o banco (layout antigo).
+ATUAL_FILE = 'ATUAL'
+VERSOES_DIR = 'versoes'
+# Réplicas locais mantidas por nó: a atual + a anterior (workers podem estar lendo até recarregar)
+REPLICAS_MANTIDAS = 2
+
+
+def versao_atual(db_path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(db_path, ATUAL_FILE), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def caminho_versao(db_path: str, versao: str) -> str:
+    return os.path.join(db_path, VERSOES_DIR, versao)
+
+
+def store_atual(db_path: str) -> str:
+    """Diretório do banco Chroma em uso."""
+    versao = versao_atual(db_path)
+    if versao and os.path.isdir(caminho_versao(db_path, versao)):
+        return caminho_versao(db_path, versao)
+    return db_path
+
+
+def publicar_versao(db_path: str, versao: str) -> None:
+    """Aponta ATUAL para a nova versão com os.replace (atômico para quem está lendo)."""
+    tmp = os.path.join(db_path, f'{ATUAL_FILE}.tmp{os.getpid()}')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(versao)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(db_path, ATUAL_FILE))
+
+
+def replicar_versao(db_path: str, replica_path: str) -> str:
+    """
+    Copia a versão em uso para um diretório local do nó e devolve o caminho.
+
+    Com vários nós, cada um lê a sua réplica (disco local, sem SQLite
+    compartilhado pela rede); a ingestão só escreve em <db_path> e publica
+    uma versão nova, que cada nó copia quando o ATUAL muda. A cópia é feita
+    ao lado e renomeada, então workers do mesmo nó nunca veem pela metade.
+    """
+    versao = versao_atual(db_path)
+    origem = caminho_versao(db_path, versao) if versao else db_path
+    if not os.path.isdir(origem):
+        versao, origem = None, db_path
+    versao = versao or 'sem_versao'
+    destino = os.path.join(replica_path, versao)
+    if os.path.isdir(destino):
+        return destino
+
+    os.makedirs(replica_path, exist_ok=True)
+    tmp = f'{destino}.tmp{os.getpid()}'
+    shutil.copytree(origem, tmp, ignore=shutil.ignore_patterns(VERSOES_DIR, f'{ATUAL_FILE}*'))
+    try:
+        os.rename(tmp, destino)
+    except OSError:
+        # Outro worker do nó terminou a mesma cópia antes
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    antigas = sorted(v for v in os.listdir(replica_path) if v != versao and '.tmp' not in v)
+    for antiga in antigas[:max(0, len(antigas) - (REPLICAS_MANTIDAS - 1))]:
+        shutil.rmtree(os.path.join(replica_path, antiga), ignore_errors=True)
+    return destino
@@ -0,0 +1,104 @@
+from urllib.parse import parse_qsl
+
+from decouple import config
+
+LLM_PROVIDER = config('LLM_PROVIDER', default='groq')
+
+# Roteador com vários backends (bot/llm_router.py). Cada backend é uma spec
+# "provedor[:modelo][?parametro=valor&...]", ex.: groq:llama-3.1-8b-instant,
+# local:qwen2.5-3b?base_url=http://gpu:8080/v1, fake?latencia_ms=300&erro=0.1
+LLM_ROTEADOR = config('LLM_ROTEADOR', default=False, cast=bool)
+LLM_RAPIDO = config('LLM_RAPIDO', default='groq:llama-3.1-8b-instant')
+LLM_EXTRACAO = config('LLM_EXTRACAO', default='groq:llama-3.3-70b-versatile')
+# Backends extras (separados por vírgula), tentados depois do principal da rota
+LLM_RESERVA = config('LLM_RESERVA', default='')
+# Hedge: segunda requisição quando a primeira passa do percentil de latência do backend
+LLM_HEDGE = config('LLM_HEDGE', default=True, cast=bool)
+# 'mesmo': repete no backend da rota (mantém o modelo); 'proximo': usa o seguinte da rota
+LLM_HEDGE_DESTINO = config('LLM_HEDGE_DESTINO', default='mesmo')
+LLM_HEDGE_PERCENTIL = config('LLM_HEDGE_PERCENTIL', default=0.95, cast=float)
+LLM_HEDGE_INICIAL_MS = config('LLM_HEDGE_INICIAL_MS', default=3000, cast=float)
+LLM_HEDGE_MIN_MS = config('LLM_HEDGE_MIN_MS', default=300, cast=float)
+LLM_DISJUNTOR_FALHAS = config('LLM_DISJUNTOR_FALHAS', default=5, cast=int)
+LLM_DISJUNTOR_PAUSA_S = config('LLM_DISJUNTOR_PAUSA_S', default=30, cast=float)
+LLM_TIMEOUT_S = config('LLM_TIMEOUT_S', default=60, cast=float)
+
+
+def criar_backend(provider: str, model: str = '', **params):
+    """Instancia um modelo de chat do provedor (groq, local ou fake)."""
+    if provider == 'fake':
+        # Modelo offline para testes e benchmarks (sem chamadas ao Groq)
+        from bot.fake_llm import FakeChatModel
+        opcoes = dict(
+            latencia_ms=config('FAKE_LLM_LATENCIA_MS', default=800, cast=float),
+            sigma=config('FAKE_LLM_SIGMA', default=0.4, cast=float),
+            tokens_por_segundo=config('FAKE_LLM_TOKENS_S', default=250, cast=float),
+            erro=config('FAKE_LLM_ERRO', default=0.0, cast=float),
+        )
+        return FakeChatModel(**{**opcoes, **params})
+
+    if provider == 'local':
+        # Servidor local compatível com a OpenAI (llama.cpp, Ollama, vLLM) com cache de prefixo
+        from bot.local_llm import LocalChatModel
+        opcoes = dict(
+            base_url=config('LOCAL_LLM_URL', default='http://localhost:8080/v1'),
+            model=model or config('LOCAL_LLM_MODELO', default='local'),
+            temperature=0.3,
+            max_tokens=config('LOCAL_LLM_MAX_TOKENS', default=512, cast=int),
+        )
+        return LocalChatModel(**{**opcoes, **params})
+
+    if provider != 'groq':
+        raise ValueError(f"Provedor de LLM desconhecido: {provider}")
+
+    from langchain_groq import ChatGroq
+    opcoes = dict(
+        model=model or "llama-3.3-70b-versatile",
+        temperature=0.3, # Reduzi a temperatura para ser mais fiel ao script
+    )
+    return ChatGroq(**{**opcoes, **params})
+
+
+def ler_spec(spec: str):
+    """'provedor:modelo?a=1&b=2' -> ('provedor', 'modelo', {'a': '1', 'b': '2'})."""
+    spec, _, query = spec.strip().partition('?')
+    provider, _, model = spec.partition(':')
+    return provider, model, dict(parse_qsl(query))
+
+
+def criar_roteador():
+    from bot.llm_router import LLMRouter
+
+    specs = {'rapido': LLM_RAPIDO, 'extracao': LLM_EXTRACAO}
+    reserva = [s.strip() for s in LLM_RESERVA.split(',') if s.strip()]
+    # A mesma spec em duas rotas vira um único backend (estatísticas e disjuntor compartilhados)
+    backends = {}
+    for spec in [*specs.values(), *reserva]:
+        if spec not in backends:
+            provider, model, params = ler_spec(spec)
+            backends[spec] = criar_backend(provider, model, **params)
+
+    # Cada rota: o backend dela, as reservas e, por último, o da outra rota
+    routes = {
+        'rapido': [LLM_RAPIDO, *reserva, LLM_EXTRACAO],
+        'extracao': [LLM_EXTRACAO, *reserva, LLM_RAPIDO],
+    }
+    return LLMRouter.create(
+        backends,
+        routes=routes,
+        hedge=LLM_HEDGE,
+        hedge_target=LLM_HEDGE_DESTINO,
+        hedge_percentile=LLM_HEDGE_PERCENTIL,
+        hedge_initial=LLM_HEDGE_INICIAL_MS / 1000,
+        hedge_min=LLM_HEDGE_MIN_MS / 1000,
+        breaker_failures=LLM_DISJUNTOR_FALHAS,
+        breaker_cooldown=LLM_DISJUNTOR_PAUSA_S,
+        timeout=LLM_TIMEOUT_S,
+    )
+
+
+def criar_llm():
+    """Instancia o modelo de chat configurado em LLM_PROVIDER (ou o roteador, com LLM_ROTEADOR)."""
+    if LLM_ROTEADOR:
+        return criar_roteador()
+    return criar_backend(LLM_PROVIDER)
@@ -0,0 +1,358 @@
+"""
+Roteamento entre vários backends de LLM atrás do AIBot (LLM_ROTEADOR=true).
+
+- Rota por turno: mensagens com dados do cliente (CPF, nascimento, conta) vão
+  para o modelo de extração (70B); o resto, para o modelo rápido.
+- Hedge: se a resposta (ou o primeiro token, em streaming) passa do p95 de
+  latência do backend, dispara uma segunda requisição (no mesmo backend ou no
+  próximo da rota) e fica com a que chegar primeiro.
+- Fallback: erro em um backend (429, 5xx, timeout) passa para o próximo.
+- Disjuntor por backend: depois de N erros seguidos o backend sai da rota por
+  alguns segundos, em vez de cada mensagem esperar o erro de novo.
+"""
+import time
+import queue
+import threading
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from bot.intent import contem_dados
+from services.metrics import metricas
+
+# Janela de latências por backend usada no percentil do hedge
+LATENCY_WINDOW = 200
+# Abaixo disso o percentil não é confiável e vale o atraso inicial configurado
+MIN_SAMPLES = 20
+
+
+class NoBackendAvailable(RuntimeError):
+    """Todos os backends da rota estão com o disjuntor aberto."""
+
+
+class CircuitBreaker:
+    """
+    Fechado: tudo passa. Após `failures` erros seguidos abre e recusa chamadas
+    por `cooldown` segundos; depois libera uma única sonda (meio-aberto), que
+    fecha o disjuntor se der certo ou o reabre se falhar.
+    """
+
+    def __init__(self, failures: int = 5, cooldown: float = 30.0):
+        self.__failures = failures
+        self.__cooldown = cooldown
+        self.__errors = 0
+        self.__opened_at: Optional[float] = None
+        self.__probing = False
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            if self.__opened_at is None:
+                return 'closed'
+            if self.__probing or time.monotonic() - self.__opened_at >= self.__cooldown:
+                return 'half_open'
+            return 'open'
+
+    def allow(self) -> bool:
+        with self.__lock:
+            if self.__opened_at is None:
+                return True
+            if self.__probing or time.monotonic() - self.__opened_at < self.__cooldown:
+                return False
+            self.__probing = True
+            return True
+
+    def success(self) -> None:
+        with self.__lock:
+            self.__errors = 0
+            self.__opened_at = None
+            self.__probing = False
+
+    def failure(self) -> bool:
+        """Registra um erro; True se o disjuntor acabou de abrir."""
+        with self.__lock:
+            self.__errors += 1
+            if self.__probing or (self.__opened_at is None and self.__errors >= self.__failures):
+                self.__opened_at = time.monotonic()
+                self.__probing = False
+                return True
+            return False
+
+
+class Backend:
+    """Um modelo de chat com seu disjuntor e suas latências recentes."""
+
+    def __init__(self, name: str, model: BaseChatModel, breaker: CircuitBreaker):
+        self.name = name
+        self.model = model
+        self.breaker = breaker
+        # 'invoke': resposta completa; 'stream': primeiro token
+        self.__latencies = {'invoke': deque(maxlen=LATENCY_WINDOW), 'stream': deque(maxlen=LATENCY_WINDOW)}
+        self.__calls = 0
+        self.__errors = 0
+        self.__served = 0
+        self.__lock = threading.Lock()
+
+    def record_success(self, mode: str, seconds: float) -> None:
+        with self.__lock:
+            self.__calls += 1
+            self.__latencies[mode].append(seconds)
+        self.breaker.success()
+        metricas.inc('bot_llm_chamadas_total', backend=self.name, resultado='ok')
+        metricas.observe('bot_llm_segundos', seconds, backend=self.name, modo=mode)
+        metricas.set('bot_llm_disjuntor_aberto', 0, backend=self.name)
+
+    def record_failure(self, error: Exception) -> None:
+        with self.__lock:
+            self.__calls += 1
+            self.__errors += 1
+        metricas.inc('bot_llm_chamadas_total', backend=self.name, resultado='erro')
+        if self.breaker.failure():
+            print(f"⚡ Disjuntor aberto para {self.name}: {error}")
+            metricas.set('bot_llm_disjuntor_aberto', 1, backend=self.name)
+
+    def record_served(self) -> None:
+        with self.__lock:
+            self.__served += 1
+
+    def _percentile(self, mode: str, percentile: float) -> Optional[float]:
+        with self.__lock:
+            samples = sorted(self.__latencies[mode])
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile))]
+
+    def hedge_delay(self, mode: str, percentile: float, initial: float, minimum: float) -> float:
+        value = self._percentile(mode, percentile)
+        return initial if value is None else max(minimum, value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__lock:
+            stats = {
+                'state': self.breaker.state,
+                'calls': self.__calls,
+                'errors': self.__errors,
+                'error_rate': round(self.__errors / self.__calls, 4) if self.__calls else 0.0,
+                'served': self.__served,
+            }
+        for mode in ('invoke', 'stream'):
+            p50, p95 = self._percentile(mode, 0.5), self._percentile(mode, 0.95)
+            if p50 is not None:
+                stats[f'{mode}_p50_ms'] = round(p50 * 1000, 1)
+                stats[f'{mode}_p95_ms'] = round(p95 * 1000, 1)
+        return stats
+
+
+class LLMRouter(BaseChatModel):
+    """Chat model que escolhe, dispara em paralelo (hedge) e alterna entre backends."""
+
+    _backends: Dict[str, Backend] = PrivateAttr(default_factory=dict)
+    _routes: Dict[str, List[str]] = PrivateAttr(default_factory=dict)
+    _options: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _counters: Dict[str, Any] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @classmethod
+    def create(cls, models: Dict[str, BaseChatModel], routes: Dict[str, List[str]], hedge: bool = True,
+               hedge_target: str = 'mesmo', hedge_percentile: float = 0.95, hedge_initial: float = 3.0,
+               hedge_min: float = 0.3, breaker_failures: int = 5, breaker_cooldown: float = 30.0,
+               timeout: float = 60.0) -> 'LLMRouter':
+        router = cls()
+        router._backends = {name: Backend(name, model, CircuitBreaker(breaker_failures, breaker_cooldown))
+                            for name, model in models.items()}
+        # Ordem de tentativa por rota, sem repetir backend
+        router._routes = {route: list(dict.fromkeys(names)) for route, names in routes.items()}
+        router._options = {'hedge': hedge, 'target': hedge_target, 'percentile': hedge_percentile, 'initial': hedge_initial,
+                           'minimum': hedge_min, 'timeout': timeout}
+        router._counters = {'routes': {route: 0 for route in routes}, 'hedges': 0, 'hedge_wins': 0,
+                            'fallbacks': 0, 'timeouts': 0, 'rejected': 0}
+        return router
+
+    @property
+    def _llm_type(self) -> str:
+        return 'llm-router'
+
+    # --- ROTA ---
+
+    def route(self, messages: List[BaseMessage]) -> str:
+        """'extracao' se a mensagem do cliente traz dados pessoais/bancários; senão 'rapido'."""
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                return 'extracao' if contem_dados(str(message.content)) else 'rapido'
+        return 'rapido'
+
+    def _next_backend(self, order: List[str], tried: set) -> Optional[Backend]:
+        for name in order:
+            if name not in tried and self._backends[name].breaker.allow():
+                tried.add(name)
+                return self._backends[name]
+        return None
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+    # --- TENTATIVAS ---
+
+    @staticmethod
+    def _run(attempt: int, backend: Backend, messages, stop, stream: bool, events: queue.Queue,
+             cancel: threading.Event) -> None:
+        """Roda numa thread própria e publica os eventos da tentativa na fila compartilhada."""
+        inicio = time.perf_counter()
+        try:
+            if not stream:
+                message = backend.model.invoke(messages, stop=stop)
+                backend.record_success('invoke', time.perf_counter() - inicio)
+                events.put((attempt, 'fim', message))
+                return
+
+            first = False
+            for chunk in backend.model.stream(messages, stop=stop):
+                if not first:
+                    # O perdedor do hedge só para depois do primeiro token, para a amostra de latência valer
+                    first = True
+                    backend.record_success('stream', time.perf_counter() - inicio)
+                if cancel.is_set():
+                    return
+                events.put((attempt, 'chunk', chunk))
+            if not first:
+                backend.record_success('stream', time.perf_counter() - inicio)
+            events.put((attempt, 'fim', None))
+        except Exception as e:
+            backend.record_failure(e)
+            events.put((attempt, 'erro', e))
+
+    def _race(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool) -> Iterator[tuple]:
+        """
+        Gera os eventos da tentativa vencedora: ('chunk', AIMessageChunk)... em
+        streaming ou um único ('fim', AIMessage). A primeira tentativa que
+        responde vence; as outras são descartadas.
+        """
+        route = self.route(messages)
+        with self._lock:
+            self._counters['routes'][route] += 1
+        metricas.inc('bot_llm_rota_total', rota=route)
+        order = self._routes[route]
+        mode = 'stream' if stream else 'invoke'
+        events: queue.Queue = queue.Queue()
+        attempts: List[tuple] = []  # (backend, cancel, é hedge)
+        pending, tried, errors = set(), set(), []
+        deadline = time.monotonic() + self._options['timeout']
+
+        def launch(hedge: bool = False) -> Optional[Backend]:
+            backend = None
+            if hedge and self._options['target'] == 'mesmo':
+                # A lentidão costuma ser da requisição (fila do provedor), não do modelo:
+                # repetir no mesmo backend mantém a qualidade da rota
+                backend = attempts[0][0] if attempts[0][0].breaker.state == 'closed' else None
+            backend = backend or self._next_backend(order, tried)
+            if backend is None and hedge and attempts[0][0].breaker.state == 'closed':
+                # Rota com um único backend: o hedge repete a requisição no mesmo
+                backend = attempts[0][0]
+            if backend is None:
+                return None
+            cancel = threading.Event()
+            attempts.append((backend, cancel, hedge))
+            pending.add(len(attempts) - 1)
+            threading.Thread(target=self._run, args=(len(attempts) - 1, backend, messages, stop, stream, events, cancel),
+                             name=f'llm-{backend.name}', daemon=True).start()
+            return backend
+
+        primary = launch()
+        if primary is None:
+            self._count('rejected')
+            raise NoBackendAvailable(f"Nenhum backend disponível para a rota {route}")
+        hedge_at = None
+        if self._options['hedge']:
+            hedge_at = time.monotonic() + primary.hedge_delay(
+                mode, self._options['percentile'], self._options['initial'], self._options['minimum'])
+
+        # 1. Corrida até o primeiro evento útil (resposta ou primeiro token)
+        while True:
+            if not pending:
+                # Todas as tentativas falharam: próximo backend da rota
+                if launch() is None:
+                    raise errors[-1]
+                self._count('fallbacks')
+                continue
+            agora = time.monotonic()
+            limite = deadline if hedge_at is None else min(deadline, hedge_at)
+            try:
+                attempt, kind, payload = events.get(timeout=max(0.0, limite - agora))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    self._count('timeouts')
+                    for _, cancel, _ in attempts:
+                        cancel.set()
+                    raise TimeoutError(f"LLM sem resposta em {self._options['timeout']:.0f}s (rota {route})")
+                hedge_at = None
+                if launch(hedge=True) is not None:
+                    self._count('hedges')
+                    metricas.inc('bot_llm_hedge_total', resultado='disparado')
+                continue
+            if kind == 'erro':
+                pending.discard(attempt)
+                errors.append(payload)
+                continue
+            break
+
+        winner, _, hedged = attempts[attempt]
+        winner.record_served()
+        for i, (_, cancel, _) in enumerate(attempts):
+            if i != attempt:
+                cancel.set()
+        if hedged:
+            self._count('hedge_wins')
+            metricas.inc('bot_llm_hedge_total', resultado='venceu')
+
+        # 2. Só a vencedora daqui em diante
+        while kind != 'fim':
+            if kind == 'erro':
+                raise payload
+            yield kind, payload
+            kind, payload = self._next_event(events, attempt, winner, attempts[attempt][1])
+        if payload is not None:
+            yield kind, payload
+
+    def _next_event(self, events: queue.Queue, attempt: int, backend: Backend, cancel: threading.Event) -> tuple:
+        """Próximo evento da tentativa vencedora (os das perdedoras são ignorados)."""
+        while True:
+            try:
+                origem, kind, payload = events.get(timeout=self._options['timeout'])
+            except queue.Empty:
+                cancel.set()
+                raise TimeoutError(f"Streaming de {backend.name} parado há {self._options['timeout']:.0f}s")
+            if origem == attempt:
+                return kind, payload
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        for _, message in self._race(messages, stop, stream=False):
+            return ChatResult(generations=[ChatGeneration(message=message)],
+                              llm_output={'token_usage': (message.response_metadata or {}).get('token_usage', {})})
+        raise RuntimeError('LLM sem resposta')
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for _, message in self._race(messages, stop, stream=True):
+            chunk = ChatGenerationChunk(message=message)
+            if run_manager and message.content:
+                run_manager.on_llm_new_token(str(message.content), chunk=chunk)
+            yield chunk
+
+    # --- ESTATÍSTICAS ---
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {key: dict(value) if isinstance(value, dict) else value for key, value in self._counters.items()}
+        stats['enabled'] = True
+        stats['backends'] = {name: backend.stats() for name, backend in self._backends.items()}
+        for name, backend in self._backends.items():
+            stats['backends'][name]['hedge_ms'] = round(backend.hedge_delay(
+                'invoke', self._options['percentile'], self._options['initial'], self._options['minimum']) * 1000, 1)
+        return stats
@@ -0,0 +1,91 @@
+"""
+Cliente de LLM local com API compatível com a da OpenAI (llama.cpp server,
+Ollama em /v1, vLLM), usado com LLM_PROVIDER=local para medir o ganho do
+cache de prefixo sem ir ao Groq.
+
+Exemplo com llama.cpp (mantém o KV do prefixo entre requisições):
+    llama-server -m llama-3.2-3b-instruct-q4_k_m.gguf --port 8080
+    LLM_PROVIDER=local LOCAL_LLM_URL=http://localhost:8080/v1 gunicorn app:app
+"""
+import json
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+ROLES = {SystemMessage: 'system', HumanMessage: 'user', AIMessage: 'assistant'}
+
+
+class LocalChatModel(BaseChatModel):
+    """POST /chat/completions (com e sem streaming) num servidor local."""
+
+    base_url: str = 'http://localhost:8080/v1'
+    model: str = 'local'
+    temperature: float = 0.3
+    max_tokens: int = 512
+    timeout: float = 120.0
+    # llama.cpp: reaproveita o KV do maior prefixo em comum com a requisição anterior
+    cache_prompt: bool = True
+
+    _session: requests.Session = PrivateAttr(default_factory=requests.Session)
+
+    @property
+    def _llm_type(self) -> str:
+        return 'local-openai-compatible'
+
+    def _payload(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool) -> Dict[str, Any]:
+        payload = {
+            'model': self.model,
+            'messages': [{'role': ROLES.get(type(m), 'user'), 'content': str(m.content)} for m in messages],
+            'temperature': self.temperature,
+            'max_tokens': self.max_tokens,
+            'stream': stream,
+        }
+        if stop:
+            payload['stop'] = stop
+        if self.cache_prompt:
+            payload['cache_prompt'] = True
+        if stream:
+            payload['stream_options'] = {'include_usage': True}
+        return payload
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        response = self._session.post(f'{self.base_url}/chat/completions',
+                                      json=self._payload(messages, stop, stream=False), timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        usage = data.get('usage') or {}
+        message = AIMessage(content=data['choices'][0]['message'].get('content') or '',
+                            response_metadata={'timings': data.get('timings', {})})
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={'token_usage': usage})
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        with self._session.post(f'{self.base_url}/chat/completions', json=self._payload(messages, stop, stream=True),
+                                timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b'data:'):
+                    continue
+                data = line[5:].strip()
+                if data == b'[DONE]':
+                    break
+                event = json.loads(data)
+                choices = event.get('choices') or [{}]
+                text = (choices[0].get('delta') or {}).get('content') or ''
+                metadata = {}
+                # Último evento: uso de tokens (e, no llama.cpp, quantos vieram do cache)
+                if event.get('usage'):
+                    metadata['token_usage'] = event['usage']
+                if event.get('timings'):
+                    metadata['timings'] = event['timings']
+                if not text and not metadata:
+                    continue
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, response_metadata=metadata))
+                if run_manager and text:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
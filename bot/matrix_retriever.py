@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILE = 'vectors.npy'
+NORMS_FILE = 'norms.npy'
+DOCS_FILE = 'docs.json'
+
+logger = logging.getLogger(__name__)
+
+
+def export_index(chroma_dir: str, index_dir: str) -> int:
+    """Exporta os vetores e textos do Chroma para arquivos .npy/.json (troca atômica)."""
+    from langchain_chroma import Chroma
+
+    collection = Chroma(persist_directory=chroma_dir)._collection
+    data = collection.get(include=['embeddings', 'documents', 'metadatas'])
+
+    vectors = np.ascontiguousarray(np.asarray(data['embeddings'], dtype=np.float32))
+    docs = [
+        {'id': doc_id, 'page_content': text, 'metadata': metadata or {}}
+        for doc_id, text, metadata in zip(data['ids'], data['documents'], data['metadatas'])
+    ]
+
+    os.makedirs(index_dir, exist_ok=True)
+    suffix = f'.tmp{os.getpid()}'
+    # np.save acrescenta .npy se o nome não terminar com ele
+    np.save(os.path.join(index_dir, VECTORS_FILE + suffix + '.npy'), vectors)
+    np.save(os.path.join(index_dir, NORMS_FILE + suffix + '.npy'), np.einsum('ij,ij->i', vectors, vectors))
+    with open(os.path.join(index_dir, DOCS_FILE + suffix), 'w', encoding='utf-8') as f:
+        json.dump(docs, f, ensure_ascii=False)
+
+    # Documentos primeiro, vetores por último: quem vê os vetores novos já encontra os textos novos
+    os.replace(os.path.join(index_dir, DOCS_FILE + suffix), os.path.join(index_dir, DOCS_FILE))
+    os.replace(os.path.join(index_dir, NORMS_FILE + suffix + '.npy'), os.path.join(index_dir, NORMS_FILE))
+    os.replace(os.path.join(index_dir, VECTORS_FILE + suffix + '.npy'), os.path.join(index_dir, VECTORS_FILE))
+    return len(docs)
+
+
+def prune_indexes(root: str, current: str, keep: int = 2) -> None:
+    """Apaga os índices por versão mais antigos em root, nunca o atual (workers com mmap aberto seguem lendo)."""
+    try:
+        dirs = [os.path.join(root, d) for d in os.listdir(root) if '.tmp' not in d]
+    except OSError:
+        return
+    others = sorted((d for d in dirs if os.path.isdir(d) and d != current), key=os.path.getmtime, reverse=True)
+    for old in others[keep - 1:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class MatrixRetriever:
+    """
+    Busca exata top-k em memória: todos os vetores numa matriz contígua
+    (mmap, compartilhada entre os workers) e um único produto matriz-vetor.
+    Usa a mesma distância L2 do Chroma para devolver o mesmo top-k.
+    """
+
+    def __init__(self, index_dir: str, embeddings, k: int = 4):
+        self.__embeddings = embeddings
+        self.__k = k
+        self.__vectors = np.load(os.path.join(index_dir, VECTORS_FILE), mmap_mode='r')
+        self.__norms = np.load(os.path.join(index_dir, NORMS_FILE), mmap_mode='r')
+        with open(os.path.join(index_dir, DOCS_FILE), encoding='utf-8') as f:
+            self.__docs = [Document(page_content=d['page_content'], metadata=d['metadata']) for d in json.load(f)]
+        logger.info(f"🧮 Índice em matriz carregado: {self.__vectors.shape}")
+
+    @classmethod
+    def from_chroma(cls, chroma_dir: str, index_dir: str, embeddings, k: int = 4) -> 'MatrixRetriever':
+        """Carrega o índice, exportando do Chroma na primeira vez."""
+        if not os.path.exists(os.path.join(index_dir, VECTORS_FILE)):
+            total = export_index(chroma_dir, index_dir)
+            logger.info(f"🧮 Índice em matriz exportado do Chroma ({total} fragmentos)")
+        return cls(index_dir, embeddings, k)
+
+    def search_by_vector(self, vector, k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        """Top-k pela distância L2 ao quadrado (menor = mais parecido)."""
+        k = min(k or self.__k, len(self.__docs))
+        if k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        # ||d - q||² = ||d||² - 2 d·q + ||q||²
+        distances = self.__norms - 2.0 * (self.__vectors @ query) + float(query @ query)
+        top = np.argpartition(distances, k - 1)[:k] if k < len(distances) else np.arange(len(distances))
+        top = top[np.argsort(distances[top], kind='stable')]
+        return [(self.__docs[i], float(distances[i])) for i in top]
+
+    def invoke_with_scores(self, question: str, k: Optional[int] = None) -> List[Tuple[Document, float]]:
+        return self.search_by_vector(self.__embeddings.embed_query(question), k)
+
+    def invoke(self, question: str, k: Optional[int] = None) -> List[Document]:
+        """Mesma interface do retriever do Chroma usada pelo AIBot."""
+        return [doc for doc, _ in self.invoke_with_scores(question, k)]
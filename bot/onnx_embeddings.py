@@ -0,0 +1,128 @@
+"""
+Backend de embeddings em ONNX (int8) para CPU.
+
+Mesmo all-MiniLM-L6-v2 do HuggingFaceEmbeddings, exportado uma vez para ONNX
+e quantizado em int8. Em produção só precisa de onnxruntime + tokenizers
+(sem torch/sentence-transformers), o que reduz a imagem e a latência por consulta.
+
+Exportação (máquina com torch/transformers e acesso ao HuggingFace):
+    python -m bot.onnx_embeddings --destino ./modelo_onnx
+"""
+import os
+import inspect
+import argparse
+from typing import List
+
+import numpy as np
+from decouple import config
+from langchain_core.embeddings import Embeddings
+
+# Backend dos embeddings: 'torch' (HuggingFaceEmbeddings) ou 'onnx' (int8)
+EMBEDDINGS_BACKEND = config('EMBEDDINGS_BACKEND', default='torch')
+ONNX_MODELO_PATH = config('ONNX_MODELO_PATH', default='/app/modelo_onnx')
+# Threads por sessão; com vários workers do gunicorn na mesma VM, 1 evita disputa de CPU
+ONNX_THREADS = config('ONNX_THREADS', default=1, cast=int)
+
+HF_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+MODEL_FILE = 'model_int8.onnx'
+MODEL_FP32_FILE = 'model.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+MAX_TOKENS = 256  # max_seq_length do all-MiniLM-L6-v2
+INPUT_NAMES = ['input_ids', 'attention_mask', 'token_type_ids']
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Mean pooling + normalização L2 sobre a saída do modelo, igual ao pipeline
+    do sentence-transformers para o all-MiniLM-L6-v2.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODELO_PATH, threads: int = ONNX_THREADS,
+                 batch_size: int = 32, model_file: str = MODEL_FILE):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.__tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.__tokenizer.enable_truncation(MAX_TOKENS)
+        self.__tokenizer.enable_padding(pad_id=0, pad_token='[PAD]')
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.__session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=['CPUExecutionProvider'])
+        self.__inputs = {i.name for i in self.__session.get_inputs()}
+        self.__batch_size = batch_size
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.__tokenizer.encode_batch(texts)
+        ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': ids, 'attention_mask': mask}
+        if 'token_type_ids' in self.__inputs:
+            feeds['token_type_ids'] = np.zeros_like(ids)
+
+        hidden = self.__session.run(None, feeds)[0]  # (lote, tokens, 384)
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Lotes por tamanho parecido: menos padding por lote
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = [None] * len(texts)
+        for start in range(0, len(order), self.__batch_size):
+            batch = order[start:start + self.__batch_size]
+            for i, vector in zip(batch, self._encode([texts[i] for i in batch])):
+                vectors[i] = vector.tolist()
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+def exportar_modelo(destino: str, model_name: str = HF_MODEL_NAME, manter_fp32: bool = False) -> str:
+    """Exporta o modelo para ONNX e quantiza os pesos em int8 (torch só é necessário aqui)."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+    os.makedirs(destino, exist_ok=True)
+
+    exemplo = tokenizer(['exemplo de frase para exportação'], return_tensors='pt')
+    eixos = {nome: {0: 'lote', 1: 'tokens'} for nome in INPUT_NAMES + ['last_hidden_state']}
+    fp32 = os.path.join(destino, MODEL_FP32_FILE)
+    # Exportador clássico (TorchScript); versões novas do torch usam o dynamo por padrão
+    legado = {'dynamo': False} if 'dynamo' in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(exemplo[nome] for nome in INPUT_NAMES),
+            fp32,
+            input_names=INPUT_NAMES,
+            output_names=['last_hidden_state'],
+            dynamic_axes=eixos,
+            opset_version=14,
+            **legado,
+        )
+
+    quantize_dynamic(fp32, os.path.join(destino, MODEL_FILE), weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(os.path.join(destino, TOKENIZER_FILE))
+    if not manter_fp32:
+        os.remove(fp32)
+    return os.path.join(destino, MODEL_FILE)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--destino', default=ONNX_MODELO_PATH)
+    parser.add_argument('--modelo', default=HF_MODEL_NAME, help='Nome no HuggingFace ou pasta local')
+    parser.add_argument('--manter-fp32', action='store_true', help='Mantém o model.onnx sem quantização (para comparar)')
+    args = parser.parse_args()
+
+    caminho = exportar_modelo(args.destino, args.modelo, args.manter_fp32)
+    print(f"✅ Modelo exportado: {caminho} ({os.path.getsize(caminho) / 1e6:.1f} MB)")
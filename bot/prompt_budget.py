@@ -0,0 +1,169 @@
+import math
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+# Sem o tokenizer do modelo, estimativa para português no BPE do Llama 3
+CHARS_POR_TOKEN = 3.5
+# Cabeçalho de cada mensagem no template de chat (papel + delimitadores)
+MESSAGE_OVERHEAD = 4
+# Separador entre documentos no {context} do create_stuff_documents_chain
+DOC_OVERHEAD = 2
+TRUNCATION_MARK = ' [...] '
+
+
+class TokenCounter:
+    """Conta tokens com um tokenizer.json (tokenizers) ou, sem ele, por estimativa de caracteres."""
+
+    def __init__(self, tokenizer_path: str = ''):
+        self.__tokenizer = None
+        if tokenizer_path:
+            from tokenizers import Tokenizer
+            self.__tokenizer = Tokenizer.from_file(tokenizer_path)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.__tokenizer is not None:
+            return len(self.__tokenizer.encode(text, add_special_tokens=False).ids)
+        return math.ceil(len(text) / CHARS_POR_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Corta o meio do texto (mantém início e fim) até caber em max_tokens."""
+        if self.count(text) <= max_tokens:
+            return text
+        chars = int(len(text) * max_tokens / self.count(text))
+        while chars > 0:
+            head = chars * 2 // 3
+            cut = text[:head].rstrip() + TRUNCATION_MARK + text[len(text) - (chars - head):].lstrip()
+            if self.count(cut) <= max_tokens:
+                return cut
+            chars -= max(1, chars // 10)
+        return ''
+
+
+class BuiltPrompt(NamedTuple):
+    messages: List[BaseMessage]
+    docs: List[Document]
+    usage: Dict[str, int]
+
+
+def _matches(bodies: List[Tuple[str, bool]], question: str) -> bool:
+    """As mensagens (corpo, cortado?), juntadas com '\n', reproduzem a pergunta?"""
+    pos = 0
+    for i, (body, cut) in enumerate(bodies):
+        if not question.startswith(body, pos):
+            return False
+        pos += len(body)
+        last = i == len(bodies) - 1
+        if cut:
+            # Cópia cortada pelo histórico: a parte continua até a próxima mensagem (ou até o fim)
+            if last:
+                return True
+            pos = question.find('\n' + bodies[i + 1][0], pos)
+            if pos < 0:
+                return False
+        if not last:
+            if not question.startswith('\n', pos):
+                return False
+            pos += 1
+    return pos == len(question)
+
+
+def _asked_tail(turns: List[Dict[str, Any]], question: str, body_chars: int = 0) -> int:
+    """
+    Quantas mensagens do cliente no fim do histórico formam a pergunta atual
+    (0 se nenhuma). Com body_chars, corpos com esse tamanho são tratados como
+    cópias cortadas pelo histórico local (textos colados muito longos).
+    """
+    tail: List[Tuple[str, bool]] = []
+    for message in reversed(turns):
+        if message.get('fromMe'):
+            break
+        tail.insert(0, (message['body'].strip(), 0 < body_chars <= len(message['body'])))
+        if _matches(tail, question):
+            return len(tail)
+        if sum(len(body) for body, _ in tail) >= len(question):
+            break
+    return 0
+
+
+class PromptBudget:
+    """
+    Monta histórico + pergunta + contexto dentro de um orçamento de tokens,
+    gastando na ordem: prompt de sistema, pergunta atual, turnos recentes,
+    documentos recuperados. Turnos antigos são encurtados e os documentos de
+    pior score são os primeiros a sair. Orçamento 0 = sem limite (só conta).
+    """
+
+    def __init__(self, system_prompt: str, budget: int = 0, counter: Optional[TokenCounter] = None,
+                 max_history: int = 6, recent_full: int = 2, old_turn_tokens: int = 60,
+                 question_tokens: int = 600, body_chars: int = 0):
+        self.__counter = counter or TokenCounter()
+        self.__budget = budget
+        self.__max_history = max_history
+        self.__recent_full = recent_full
+        self.__old_turn_tokens = old_turn_tokens
+        self.__question_tokens = question_tokens
+        # Tamanho máximo dos corpos no histórico local (0 = guardados inteiros)
+        self.__body_chars = body_chars
+        self.__system_tokens = self.__counter.count(system_prompt)
+
+    @property
+    def counter(self) -> TokenCounter:
+        return self.__counter
+
+    def build(self, history_messages: List[Dict[str, Any]], question: str,
+              scored_docs: List[Tuple[Document, float]]) -> BuiltPrompt:
+        count = self.__counter.count
+        limited = self.__budget > 0
+        remaining = self.__budget - self.__system_tokens if limited else math.inf
+        usage = {'sistema': self.__system_tokens, 'pergunta': 0, 'historico': 0, 'contexto': 0,
+                 'turnos_cortados': 0, 'docs_descartados': 0}
+
+        # 1. Pergunta atual (sempre vai; texto colado muito longo é encurtado)
+        asked = question.strip()
+        if limited and count(question) > self.__question_tokens:
+            question = self.__counter.truncate(question, self.__question_tokens)
+            usage['turnos_cortados'] += 1
+        usage['pergunta'] = count(question) + MESSAGE_OVERHEAD
+        remaining -= usage['pergunta']
+
+        # 2. Turnos recentes, do mais novo para o mais antigo
+        turns = [m for m in history_messages[-self.__max_history:] if m.get('body')]
+        # O WAHA já devolve a própria pergunta como última mensagem do histórico; mensagens
+        # agrupadas pelo coalescer (juntadas com '\n') aparecem separadas no fim, e o
+        # histórico local guarda só o começo de textos longos
+        turns = turns[:len(turns) - _asked_tail(turns, asked, self.__body_chars)]
+        kept = []
+        for age, message in enumerate(reversed(turns)):
+            body = message['body']
+            if limited and age >= self.__recent_full:
+                body = self.__counter.truncate(body, self.__old_turn_tokens)
+            tokens = count(body) + MESSAGE_OVERHEAD
+            if tokens > remaining:
+                body = self.__counter.truncate(body, int(remaining) - MESSAGE_OVERHEAD) if remaining > MESSAGE_OVERHEAD * 4 else ''
+                if not body:
+                    break
+                tokens = count(body) + MESSAGE_OVERHEAD
+            if body != message['body']:
+                usage['turnos_cortados'] += 1
+            kept.append(AIMessage(content=body) if message.get('fromMe') else HumanMessage(content=body))
+            usage['historico'] += tokens
+            remaining -= tokens
+        messages = list(reversed(kept)) + [HumanMessage(content=question)]
+
+        # 3. Contexto: melhores documentos primeiro (menor distância), até acabar o orçamento
+        docs = []
+        for position, (doc, _) in enumerate(sorted(scored_docs, key=lambda pair: pair[1])):
+            tokens = count(doc.page_content) + DOC_OVERHEAD
+            if tokens > remaining:
+                usage['docs_descartados'] = len(scored_docs) - position
+                break
+            docs.append(doc)
+            usage['contexto'] += tokens
+            remaining -= tokens
+
+        usage['total'] = usage['sistema'] + usage['pergunta'] + usage['historico'] + usage['contexto']
+        return BuiltPrompt(messages, docs, usage)
@@ -0,0 +1,275 @@
+"""
+Extrator de tags e campos das respostas da IA e dos comandos do suporte.
+
+Substitui as várias varreduras de antes (substring de cada tag e gatilho,
+re.search montado na hora, limpar_tags e um regex por campo) por uma passada
+que separa o texto do cliente das tags |||...||| e detecta o tipo de alerta
+(tag ou frase gatilho de simulação/fechamento). Os campos (CPF, telefone,
+valor, banco, agência, conta) saem de uma única regex compilada, já tipados e
+validados, e só são procurados quando há alerta (no conteúdo das tags ou,
+sem tag, no texto) ou num comando do suporte.
+
+O ResponseParser aceita a resposta em trechos (streaming): cada linha
+completa é processada assim que chega, guardando se está dentro de uma tag, e
+o resultado é o mesmo do texto inteiro (tags abertas numa linha e fechadas em
+outra também somem do texto do cliente).
+"""
+import re
+from operator import mul
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, NamedTuple, Optional
+
+TAG_SIMULACAO = 'SUPORTE_ALERT'
+TAG_FECHAMENTO = 'FECHAMENTO_ALERT'
+GATILHO_SIMULACAO = 'Vou verificar a melhor proposta'
+GATILHO_FECHAMENTO = 'Já encaminhei para o nosso financeiro'
+
+SIMULACAO = 'simulacao'
+FECHAMENTO = 'fechamento'
+
+# '|||' abre e fecha as tags; sequências maiores de pipes contam como um delimitador
+TAG = '|||'
+DELIMITER = re.compile(r'\|{3,}')
+# Logo depois de um delimitador: tipo da tag ('|||SUPORTE_ALERT: dados|||')
+TAG_KIND = re.compile(rf'[ \t]*({TAG_SIMULACAO}|{TAG_FECHAMENTO}):')
+
+# Só espaço horizontal entre rótulo e valor: campo nunca atravessa linhas
+_H = r'[ \t]*'
+_LABEL_END = rf'{_H}:?{_H}'
+
+
+def _rotulo(*palavras: str) -> str:
+    """
+    Rótulos sem re.I ('cpf' -> '[Cc][Pp][Ff]'): com re.I o sre testa cada
+    posição do texto; sem ele, só as que começam com uma das letras.
+    """
+    return '(?:' + '|'.join(
+        ''.join(f'[{c.upper()}{c.lower()}]' if c.isalpha() else re.escape(c) for c in palavra)
+        for palavra in sorted(palavras, key=len, reverse=True)
+    ) + ')'
+
+
+# --- CAMPOS (uma alternativa por campo, avaliadas em um único finditer) ---
+# O (?<!\w) no início faz o papel do \b de cada rótulo sem esconder do sre as letras iniciais
+FIELD = re.compile(
+    rf'(?<!\w)(?:{_rotulo("cpf")}{_LABEL_END}(?P<cpf>\d[\d.\-]*\d)'
+    rf'|{_rotulo("tel", "telefone", "id")}{_LABEL_END}(?P<telefone>\+?\d[\d ()\-]*\d)'
+    rf'|(?:{_rotulo("valor")}(?:{_LABEL_END}[Rr]\$)?|[Rr]\$){_LABEL_END}(?P<valor>\d[\d.,]*\d|\d)'
+    # Nome do banco vai até um separador, o próximo rótulo ou o fim da linha
+    rf'|{_rotulo("banco")}\b{_LABEL_END}(?P<banco>[^\W\d_][\w .&]*?)'
+    rf'(?={_H}(?:[|,;]|\b{_rotulo("ag", "agência", "agencia", "conta", "cc", "c/c")}\b|$))'
+    rf'|{_rotulo("ag", "agência", "agencia")}\.?{_LABEL_END}(?P<agencia>\d[\d\-]{{2,}})'
+    rf'|{_rotulo("conta", "cc", "c/c")}\.?{_LABEL_END}(?P<conta>\d[\d\-]{{3,}}))',
+    re.M,
+)
+FIELDS = ('cpf', 'telefone', 'valor', 'banco', 'agencia', 'conta')
+NAO_DIGITO = re.compile(r'\D')
+# Moeda escrita junto do valor no comando do suporte ('R$ 1.500', '1500 reais')
+MOEDA = re.compile(r'^R\$\s*|\s*reais$', re.I)
+# Pesos dos dois dígitos verificadores do CPF (módulo 11)
+PESOS_CPF = (range(10, 1, -1), range(11, 1, -1))
+
+
+class ParsedResponse(NamedTuple):
+    text: str                     # o que o cliente vê (sem tags de controle)
+    kind: Optional[str]           # SIMULACAO, FECHAMENTO ou None
+    tag_data: Optional[str]       # conteúdo da tag do alerta (None se veio só a frase gatilho)
+    fields: Dict[str, Any]        # só com alerta; cpf/telefone/agencia/conta: str, valor: Decimal, banco: str
+    errors: List[str]             # campos presentes mas inválidos (ex.: 'cpf')
+
+
+class SupportCommand(NamedTuple):
+    cpf: Optional[str]
+    telefone: Optional[str]
+    valor: Optional[Decimal]
+    errors: List[str]
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.cpf and self.telefone and self.valor is not None)
+
+
+# --- VALIDAÇÃO E CONVERSÃO ---
+
+def cpf_valido(cpf: str) -> bool:
+    """Dígitos verificadores do CPF (aceita com ou sem pontuação)."""
+    digits = cpf if cpf.isdigit() else NAO_DIGITO.sub('', cpf)
+    if len(digits) != 11 or not digits.isascii() or digits == digits[0] * 11:
+        return False
+    # Bytes ASCII: cada dígito vale o código - 48 (descontado de uma vez na soma)
+    codigos = digits.encode()
+    for posicao, pesos in enumerate(PESOS_CPF, start=9):
+        soma = sum(map(mul, codigos, pesos)) - 48 * sum(pesos)
+        if soma * 10 % 11 % 10 != codigos[posicao] - 48:
+            return False
+    return True
+
+
+def formatar_cpf(digits: str) -> str:
+    return f'{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}' if len(digits) == 11 else digits
+
+
+def ler_valor(texto: str) -> Optional[Decimal]:
+    """'1.500,00', '1500,5', '1500.50', '1.500' e '1500' (com ou sem 'R$'/'reais') -> Decimal (None se não for número)."""
+    texto = MOEDA.sub('', texto.strip()).strip('.,')
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    elif texto.count('.') > 1 or re.fullmatch(r'\d{1,3}(\.\d{3})+', texto):
+        # Só pontos de milhar
+        texto = texto.replace('.', '')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        return None
+
+
+def formatar_reais(valor: Decimal) -> str:
+    """Decimal('1500') -> '1.500,00'."""
+    return f'{valor:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _typed_fields(raw: Dict[str, str]):
+    fields: Dict[str, Any] = {}
+    errors: List[str] = []
+    if 'cpf' in raw:
+        digits = NAO_DIGITO.sub('', raw['cpf'])
+        fields['cpf'] = formatar_cpf(digits)
+        if not cpf_valido(digits):
+            errors.append('cpf')
+    if 'telefone' in raw:
+        fields['telefone'] = NAO_DIGITO.sub('', raw['telefone'])
+    if 'valor' in raw:
+        valor = ler_valor(raw['valor'])
+        if valor is None:
+            errors.append('valor')
+        else:
+            fields['valor'] = valor
+    for name in ('banco', 'agencia', 'conta'):
+        if name in raw:
+            fields[name] = raw[name].strip()
+    return fields, errors
+
+
+def extract_fields(text: str):
+    """Primeira ocorrência de cada campo (como o re.search de antes), tipada; e os inválidos."""
+    raw: Dict[str, str] = {}
+    for match in FIELD.finditer(text):
+        if match.lastgroup not in raw:
+            raw[match.lastgroup] = match.group(match.lastgroup)
+            if len(raw) == len(FIELDS):
+                break
+    return _typed_fields(raw)
+
+
+# --- PARSER ---
+
+class ResponseParser:
+    """
+    Parser incremental: feed() com os trechos da resposta (ou uma vez com o
+    texto todo) e finish() para o resultado. Cada linha completa é separada
+    em texto e tags uma única vez; linhas incompletas esperam o próximo trecho.
+    """
+
+    def __init__(self):
+        self.__pending = ''
+        self.__visible: List[str] = []
+        self.__in_tag = False
+        # Tag aberta: (tipo ou None, partes do conteúdo)
+        self.__tag: Optional[tuple] = None
+        # Conteúdo das tags, na ordem; os dados do alerta vêm da primeira de cada tipo
+        self.__tags: List[tuple] = []
+        self.__seen = set()
+
+    def feed(self, chunk: str) -> None:
+        self.__pending += chunk
+        cut = self.__pending.rfind('\n')
+        if cut != -1:
+            self.__scan(self.__pending[:cut + 1])
+            self.__pending = self.__pending[cut + 1:]
+
+    def finish(self) -> ParsedResponse:
+        self.__scan(self.__pending)
+        self.__pending = ''
+        self.__close_tag()
+
+        if TAG_SIMULACAO in self.__seen or GATILHO_SIMULACAO in self.__seen:
+            kind, tag_kind = SIMULACAO, TAG_SIMULACAO
+        elif TAG_FECHAMENTO in self.__seen or GATILHO_FECHAMENTO in self.__seen:
+            kind, tag_kind = FECHAMENTO, TAG_FECHAMENTO
+        else:
+            return ParsedResponse(''.join(self.__visible).strip(), None, None, {}, [])
+
+        text = ''.join(self.__visible).strip()
+        tag_data = next((content for tipo, content in self.__tags if tipo == tag_kind), None)
+        # Campos saem das tags; o texto só é varrido quando veio apenas a frase gatilho
+        fields, errors = extract_fields('\n'.join(content for _, content in self.__tags) or text)
+        return ParsedResponse(text, kind, tag_data, fields, errors)
+
+    def __text(self, text: str) -> None:
+        if not text:
+            return
+        if GATILHO_SIMULACAO in text:
+            self.__seen.add(GATILHO_SIMULACAO)
+        if GATILHO_FECHAMENTO in text:
+            self.__seen.add(GATILHO_FECHAMENTO)
+        if not self.__in_tag:
+            self.__visible.append(text)
+        elif self.__tag is not None:
+            self.__tag[1].append(text)
+
+    def __close_tag(self) -> None:
+        if self.__tag is not None:
+            self.__tags.append((self.__tag[0], ''.join(self.__tag[1]).strip()))
+            self.__tag = None
+        self.__in_tag = False
+
+    def __scan(self, text: str) -> None:
+        segments = DELIMITER.split(text)
+        self.__text(segments[0])
+        for segment in segments[1:]:
+            kind = TAG_KIND.match(segment)
+            if self.__in_tag:
+                self.__close_tag()
+                # '|||' seguido de 'TIPO:' é sempre abertura (duas tags coladas)
+                if not kind:
+                    self.__text(segment)
+                    continue
+            self.__in_tag = True
+            tipo = kind.group(1) if kind else None
+            if tipo:
+                self.__seen.add(tipo)
+                segment = segment[kind.end():]
+            self.__tag = (tipo, [])
+            self.__text(segment)
+
+
+def parse_response(text: str) -> ParsedResponse:
+    # Caso comum (resposta sem tag nem gatilho): só as buscas de substring, em C
+    if TAG not in text and GATILHO_SIMULACAO not in text and GATILHO_FECHAMENTO not in text:
+        return ParsedResponse(text.strip(), None, None, {}, [])
+    parser = ResponseParser()
+    parser.feed(text)
+    return parser.finish()
+
+
+def strip_tags(text: str) -> str:
+    """Remove as tags de controle (|||...||| ou ||| até o fim) para o cliente não vê-las."""
+    return parse_response(text).text
+
+
+def parse_support_command(body: str) -> SupportCommand:
+    """Comando do suporte 'CPF: ..., TEL: ..., VALOR: ...' ou, sem rótulos, 'cpf, telefone, valor'."""
+    fields, errors = extract_fields(body)
+
+    # Fallback: separa por vírgula os campos sem rótulo (o valor pode ter vírgula decimal);
+    # os que já vieram rotulados ('R$ 1500' conta como rótulo do valor) são mantidos
+    if not (fields.get('cpf') and fields.get('telefone') and 'valor' in fields):
+        partes = [p.strip() for p in body.split(',', 2)]
+        if len(partes) == 3:
+            posicionais = {nome: parte for nome, parte in zip(('cpf', 'telefone', 'valor'), partes)
+                           if nome not in fields or (nome != 'valor' and not fields[nome])}
+            extra, extra_errors = _typed_fields(posicionais)
+            fields.update(extra)
+            errors = [e for e in errors if e not in posicionais] + extra_errors
+
+    return SupportCommand(fields.get('cpf') or None, fields.get('telefone') or None, fields.get('valor'), errors)
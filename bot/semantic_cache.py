@@ -0,0 +1,115 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from bot.response_parser import TAG, parse_response
+
+# Perguntas com sequências longas de dígitos carregam dados pessoais (CPF, telefone, conta)
+PERSONAL_DATA = re.compile(r'\d[\d.\-/ ]{5,}\d')
+
+
+class SemanticCache:
+    """
+    Cache de respostas do AIBot indexado pelo embedding da pergunta e por uma
+    impressão digital do estado da conversa (última resposta enviada pela IA).
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, ttl: float = 3600, max_entries: int = 500):
+        self.__embeddings = embeddings
+        self.__threshold = threshold
+        self.__ttl = ttl
+        self.__max_entries = max_entries
+        # LRU global: chave -> (fingerprint, vetor, resposta, criado_em)
+        self.__entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__skipped = 0
+
+    @staticmethod
+    def fingerprint(history_messages: List[Dict[str, Any]]) -> str:
+        """Estado da conversa = última mensagem da IA (vazio na primeira mensagem)."""
+        for message in reversed(history_messages[-6:]):
+            if message.get('fromMe') and message.get('body'):
+                normalized = ' '.join(message['body'].lower().split())
+                return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        return ''
+
+    def _vector(self, question: str, vector=None) -> np.ndarray:
+        if vector is None:
+            vector = self.__embeddings.embed_query(question)
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def cacheable_question(self, question: str) -> bool:
+        return not PERSONAL_DATA.search(question)
+
+    def lookup(self, history_messages, question: str, vector=None) -> Optional[str]:
+        """
+        Retorna a resposta mais parecida acima do limiar, ou None. `vector` é o
+        embedding da pergunta já calculado (o AIBot reaproveita o mesmo na recuperação).
+        """
+        if not self.cacheable_question(question):
+            with self.__lock:
+                self.__skipped += 1
+            return None
+
+        fingerprint = self.fingerprint(history_messages)
+        vector = self._vector(question, vector)
+        now = time.time()
+
+        with self.__lock:
+            best_key, best_score = None, self.__threshold
+            for key, (fp, cached, _, created) in list(self.__entries.items()):
+                if now - created > self.__ttl:
+                    del self.__entries[key]
+                    continue
+                if fp != fingerprint:
+                    continue
+                score = float(np.dot(vector, cached))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.__misses += 1
+                return None
+
+            self.__hits += 1
+            self.__entries.move_to_end(best_key)
+            return self.__entries[best_key][2]
+
+    def store(self, history_messages, question: str, response: str, vector=None) -> None:
+        # Respostas com tags ou gatilhos de automação nunca são reaproveitadas: o mesmo detector
+        # do envio (parse_response) decide, senão a frase gatilho sem tag dispararia um alerta
+        # ao suporte para outro cliente
+        if not response or TAG in response or parse_response(response).kind is not None:
+            return
+        if not self.cacheable_question(question):
+            return
+
+        fingerprint = self.fingerprint(history_messages)
+        key = f"{fingerprint}:{' '.join(question.lower().split())}"
+        vector = self._vector(question, vector)
+
+        with self.__lock:
+            self.__entries[key] = (fingerprint, vector, response, time.time())
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_entries:
+                self.__entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__lock:
+            total = self.__hits + self.__misses
+            return {
+                'entries': len(self.__entries),
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'skipped': self.__skipped,
+                'hit_rate': round(self.__hits / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+from bot.response_parser import TAG, ParsedResponse, ResponseParser, strip_tags
+
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+
+class ParagraphStreamer:
+    """
+    Recebe os tokens da IA e libera cada parágrafo assim que ele termina.
+    Tudo o que vem depois de um '|||' fica retido até o fim, para que as
+    tags de controle nunca cheguem ao cliente. As tags e os campos são
+    extraídos durante o streaming pelo ResponseParser.
+    """
+
+    def __init__(self):
+        self.__parser = ResponseParser()
+        self.__response = None
+        self.__chunks: List[str] = []
+        self.__pending = ''
+        self.__held = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """Acrescenta um trecho e devolve os parágrafos completos prontos para envio."""
+        self.__chunks.append(chunk)
+        self.__parser.feed(chunk)
+        if self.__held:
+            self.__pending += chunk
+            return []
+
+        self.__pending += chunk
+        cut = self.__pending.find(TAG)
+        if cut != -1:
+            self.__held = True
+            visible = self.__pending[:cut]
+        else:
+            # Um '|' no final pode ser o começo de uma tag: espera o próximo trecho
+            visible = self.__pending.rstrip('|')
+
+        parts = PARAGRAPH_BREAK.split(visible)
+        if len(parts) == 1:
+            return []
+
+        consumed = len(visible) - len(parts[-1])
+        self.__pending = self.__pending[consumed:]
+        return [p.strip() for p in parts[:-1] if p.strip()]
+
+    def finish(self) -> List[str]:
+        """Libera o que sobrou, já sem as tags de controle."""
+        rest = strip_tags(self.__pending)
+        self.__pending = ''
+        self.__response = self.__parser.finish()
+        return [p.strip() for p in PARAGRAPH_BREAK.split(rest) if p.strip()]
+
+    @property
+    def response(self) -> ParsedResponse:
+        """Tags e campos da resposta completa (depois do finish), usados nos alertas."""
+        return self.__response
+
+    @property
+    def text(self) -> str:
+        """Resposta completa (com tags), usada no roteamento de alertas."""
+        return ''.join(self.__chunks)
@@ -0,0 +1,34 @@
+# Lido automaticamente pelo gunicorn (diretório de trabalho /app).
+# Bind e timeout vêm da linha de comando do Dockerfile; os workers, de WEB_CONCURRENCY.
+import os
+import sys
+
+# IA_PRELOAD=true: importa o app (e o modelo de embeddings) uma vez no master
+# e os workers herdam a memória por copy-on-write, em vez de cada um carregar o seu.
+preload_app = os.getenv('IA_PRELOAD', 'false').lower() in ('1', 'true', 'sim')
+
+
+def post_worker_init(worker):
+    # Cada worker monta o AIBot em segundo plano; o /health já responde enquanto isso
+    app_module = sys.modules.get('app')
+    if app_module is not None and hasattr(app_module, 'aquecer_bot'):
+        app_module.aquecer_bot()
+
+
+def on_starting(server):
+    # Métricas de uma execução anterior (pids podem se repetir após reiniciar o container)
+    from services.metrics import metricas
+    metricas.clear()
+
+
+def worker_exit(server, worker):
+    # No worker que está saindo: grava o que ainda não foi para o arquivo
+    from services.metrics import metricas
+    if metricas.enabled:
+        metricas.flush()
+
+
+def child_exit(server, worker):
+    # No master: soma os contadores do worker encerrado e descarta os gauges dele
+    from services.metrics import metricas
+    metricas.mark_process_dead(worker.pid)
@@ -1,50 +1,134 @@
 import os
-import shutil
+import sys
+import glob
 import time
-from langchain_community.document_loaders import PyPDFLoader
+import uuid
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
 
 # --- CONFIGURAÇÃO DE CAMINHOS DINÂMICOS ---
 # Pega o diretório onde este arquivo (rag.py) está: .../Chatbot_Multipla/rag
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Define o caminho do PDF relativo ao script: .../Chatbot_Multipla/rag/data/Multipla_atendimento.pdf
-PDF_PATH = os.path.join(BASE_DIR, "data", "Multipla_atendimento.pdf")
+# Pasta com os documentos da base: .../Chatbot_Multipla/rag/data (*.pdf, *.txt, *.md)
+DATA_DIR = os.path.join(BASE_DIR, "data")
+EXTENSOES = ('*.pdf', '*.txt', '*.md')
 
 # Define o caminho do Banco na raiz do projeto: .../Chatbot_Multipla/chroma_datav2
 # O 'os.pardir' sobe um nível (para sair da pasta 'rag')
 PROJECT_ROOT = os.path.abspath(os.path.join(BASE_DIR, os.pardir))
 DB_PATH = os.path.join(PROJECT_ROOT, "chroma_datav2")
 
-def ingest_data():
+# Permite `python rag/rag.py` importar os módulos do bot
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from bot.kb_store import VERSOES_DIR, ATUAL_FILE, caminho_versao, store_atual, versao_atual, publicar_versao  # noqa: E402
+from bot.matrix_retriever import export_index  # noqa: E402
+from bot.onnx_embeddings import EMBEDDINGS_BACKEND, OnnxEmbeddings  # noqa: E402
+
+# --- CONFIGURAÇÃO DA INGESTÃO ---
+LOTE_EMBEDDINGS = 32
+VERSOES_MANTIDAS = 3  # a atual + anteriores (workers podem estar lendo até recarregar)
+
+# Modelo por processo do pool (carregado uma vez no initializer)
+_modelo = None
+
+
+def _criar_modelo():
+    if EMBEDDINGS_BACKEND == 'fake':
+        from bot.fake_embeddings import FakeEmbeddings
+        return FakeEmbeddings()
+    if EMBEDDINGS_BACKEND == 'onnx':
+        return OnnxEmbeddings()
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    # Tenta usar CPU explicitamente para evitar erros de CUDA no Windows sem GPU configurada
+    model_kwargs = {'device': 'cpu'}
+    encode_kwargs = {'normalize_embeddings': False}
+
+    return HuggingFaceEmbeddings(
+        model_name="all-MiniLM-L6-v2",
+        model_kwargs=model_kwargs,
+        encode_kwargs=encode_kwargs
+    )
+
+
+def _iniciar_processo():
+    global _modelo
+    _modelo = _criar_modelo()
+
+
+def _embed_lote(textos):
+    return _modelo.embed_documents(textos)
+
+
+def hash_fragmento(chunk) -> str:
+    """Id do fragmento = hash do conteúdo + origem: mesmo texto, mesmo id."""
+    origem = os.path.basename(chunk.metadata.get('source', ''))
+    return hashlib.sha256(f"{origem}\0{chunk.page_content}".encode('utf-8')).hexdigest()
+
+
+def carregar_documentos():
+    arquivos = sorted(p for ext in EXTENSOES for p in glob.glob(os.path.join(DATA_DIR, ext)))
+    docs = []
+    for path in arquivos:
+        print(f"📄 Carregando {os.path.basename(path)}...")
+        loader = PyPDFLoader(path) if path.lower().endswith('.pdf') else TextLoader(path, encoding='utf-8')
+        docs.extend(loader.load())
+    return arquivos, docs
+
+
+def gerar_embeddings(textos, processos):
+    lotes = [textos[i:i + LOTE_EMBEDDINGS] for i in range(0, len(textos), LOTE_EMBEDDINGS)]
+    if processos <= 1 or len(lotes) <= 1:
+        # Poucos fragmentos: subir processos custa mais do que embedar aqui mesmo
+        _iniciar_processo()
+        resultados = [_embed_lote(lote) for lote in lotes]
+    else:
+        with ProcessPoolExecutor(max_workers=min(processos, len(lotes)), initializer=_iniciar_processo) as pool:
+            resultados = list(pool.map(_embed_lote, lotes))
+    return [vetor for lote in resultados for vetor in lote]
+
+
+def _copiar_versao(origem, destino):
+    """Copia o banco em uso como ponto de partida (sem versões antigas nem índice em matriz)."""
+    ignorar = shutil.ignore_patterns(VERSOES_DIR, f'{ATUAL_FILE}*', 'indice_matriz')
+    if os.path.isdir(origem) and os.path.exists(os.path.join(origem, 'chroma.sqlite3')):
+        shutil.copytree(origem, destino, ignore=ignorar)
+    else:
+        os.makedirs(destino)
+
+
+def _limpar_versoes_antigas(atual):
+    pasta = os.path.join(DB_PATH, VERSOES_DIR)
+    versoes = sorted(v for v in os.listdir(pasta) if v != atual)
+    for versao in versoes[:max(0, len(versoes) - (VERSOES_MANTIDAS - 1))]:
+        shutil.rmtree(caminho_versao(DB_PATH, versao), ignore_errors=True)
+        print(f"   🧹 Versão antiga removida: {versao}")
+
+
+def ingest_data(processos=None):
+    processos = processos or os.cpu_count() or 1
     print(f"📂 Diretório Base: {BASE_DIR}")
-    print(f"📄 Buscando PDF em: {PDF_PATH}")
+    print(f"📄 Buscando documentos em: {DATA_DIR}")
     print(f"💾 Banco de Dados será salvo em: {DB_PATH}")
 
-    if not os.path.exists(PDF_PATH):
-        print(f"❌ ERRO CRÍTICO: Arquivo não encontrado!")
-        print(f"   Certifique-se que o arquivo está na pasta: {os.path.join('rag', 'data')}")
-        return
-
-    # Limpeza do banco com tratamento de erro para Windows
-    if os.path.exists(DB_PATH):
-        print("🧹 Tentando limpar banco de dados antigo...")
-        try:
-            shutil.rmtree(DB_PATH)
-            print("   ✅ Banco antigo removido.")
-        except OSError as e:
-            print(f"   ⚠️ Aviso: Não foi possível deletar a pasta completamente: {e}")
-            print("   Isso geralmente acontece se o Docker ou outro processo estiver usando o banco.")
-            print("   Tentando continuar mesmo assim...")
-
-    print("📄 Carregando PDF...")
     try:
-        loader = PyPDFLoader(PDF_PATH)
-        docs = loader.load()
+        arquivos, docs = carregar_documentos()
     except Exception as e:
-        print(f"❌ Erro ao ler o PDF: {e}")
+        print(f"❌ Erro ao ler os documentos: {e}")
+        return
+
+    if not arquivos:
+        print(f"❌ ERRO CRÍTICO: Nenhum documento encontrado!")
+        print(f"   Coloque arquivos {', '.join(EXTENSOES)} na pasta: {os.path.join('rag', 'data')}")
         return
 
     print("✂️ Dividindo texto...")
@@ -52,29 +136,71 @@ def ingest_data():
         chunk_size=800,
         chunk_overlap=150
     )
-    chunks = splitter.split_documents(docs)
+    chunks = {}
+    for chunk in splitter.split_documents(docs):
+        # Backend gravado no fragmento: trocar de torch para onnx (ou vice-versa) reembeda tudo
+        chunk.metadata['embeddings'] = EMBEDDINGS_BACKEND
+        chunks.setdefault(hash_fragmento(chunk), chunk)
 
-    print("🧠 Gerando Embeddings (all-MiniLM-L6-v2)...")
-    # Tenta usar CPU explicitamente para evitar erros de CUDA no Windows sem GPU configurada
-    model_kwargs = {'device': 'cpu'}
-    encode_kwargs = {'normalize_embeddings': False}
-    
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
+    # Nova versão construída ao lado da atual: a API continua lendo a antiga até a troca
+    atual = store_atual(DB_PATH)
+    # Sufixo único: duas ingestões no mesmo segundo não montam na mesma pasta
+    versao = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    destino = caminho_versao(DB_PATH, versao)
+    print(f"📦 Montando versão {versao} a partir de: {atual}")
 
-    print(f"💾 Salvando {len(chunks)} fragmentos...")
     try:
-        Chroma.from_documents(
-            documents=chunks,
-            embedding=embedding_model,
-            persist_directory=DB_PATH
-        )
-        print("✅ Ingestão concluída com sucesso!")
+        _copiar_versao(atual, destino)
+        collection = Chroma(persist_directory=destino)._collection
+        atuais = collection.get(include=['metadatas'])
+        # Vetores gerados por outro backend não servem: saem e voltam recalculados
+        existentes = {
+            doc_id for doc_id, metadata in zip(atuais['ids'], atuais['metadatas'])
+            if (metadata or {}).get('embeddings', 'torch') == EMBEDDINGS_BACKEND
+        }
+        novos = [doc_id for doc_id in chunks if doc_id not in existentes]
+        removidos = [doc_id for doc_id in atuais['ids'] if doc_id not in chunks or doc_id not in existentes]
+        print(f"🔎 {len(chunks)} fragmentos: {len(novos)} novos, {len(removidos)} removidos, "
+              f"{len(chunks) - len(novos)} reaproveitados")
+
+        if removidos:
+            collection.delete(ids=removidos)
+
+        if novos:
+            print(f"🧠 Gerando Embeddings (all-MiniLM-L6-v2, {EMBEDDINGS_BACKEND}) em {processos} processo(s)...")
+            inicio = time.perf_counter()
+            textos = [chunks[doc_id].page_content for doc_id in novos]
+            vetores = gerar_embeddings(textos, processos)
+            print(f"   ✅ {len(vetores)} embeddings em {time.perf_counter() - inicio:.1f}s")
+
+            print(f"💾 Salvando {len(novos)} fragmentos...")
+            for i in range(0, len(novos), LOTE_EMBEDDINGS * 4):
+                fatia = slice(i, i + LOTE_EMBEDDINGS * 4)
+                collection.upsert(
+                    ids=novos[fatia],
+                    embeddings=vetores[fatia],
+                    documents=textos[fatia],
+                    metadatas=[chunks[doc_id].metadata for doc_id in novos[fatia]],
+                )
+
+        print("🧮 Exportando índice em matriz...")
+        export_index(destino, os.path.join(destino, 'indice_matriz'))
     except Exception as e:
-        print(f"❌ Erro ao salvar no ChromaDB: {e}")
+        print(f"❌ Erro ao montar a versão {versao}: {e}")
+        # Nada de versão pela metade: cópia, Chroma ou índice que falhou sai inteiro
+        shutil.rmtree(destino, ignore_errors=True)
+        return
+
+    # Troca atômica do ponteiro: os workers pegam a versão nova na próxima checagem
+    anterior = versao_atual(DB_PATH)
+    publicar_versao(DB_PATH, versao)
+    print(f"🔁 Versão publicada: {anterior or 'legado'} -> {versao}")
+    _limpar_versoes_antigas(versao)
+    print("✅ Ingestão concluída com sucesso!")
+
 
 if __name__ == '__main__':
-    ingest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingestão incremental da base de conhecimento")
+    parser.add_argument('--processos', type=int, default=None, help="processos para os embeddings (padrão: nº de CPUs)")
+    args = parser.parse_args()
+    ingest_data(args.processos)
@@ -0,0 +1,385 @@
+import os
+import time
+import bisect
+import socket
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from services.sqlite_store import SQLiteStore
+
+# Webhook repassado por outro nó: o dono processa e não repassa de novo
+FORWARD_HEADER = 'X-Cluster-Origem'
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """
+    Hash consistente sobre o chat_id: cada chat tem um nó dono e, se ele cair,
+    o próximo do anel assume. Entrar ou sair um nó move só ~1/N dos chats.
+    """
+
+    def __init__(self, nodes: List[str], replicas: int = 100):
+        points = sorted((_hash(f'{node}#{i}'), node) for node in nodes for i in range(replicas))
+        self.__hashes = [h for h, _ in points]
+        self.__points = [node for _, node in points]
+        self.nodes = list(dict.fromkeys(nodes))
+
+    def preference(self, key: str) -> List[str]:
+        """Nós na ordem de preferência para a chave: o dono e depois os sucessores no anel."""
+        start = bisect.bisect(self.__hashes, _hash(key))
+        order: List[str] = []
+        for i in range(len(self.__points)):
+            node = self.__points[(start + i) % len(self.__points)]
+            if node not in order:
+                order.append(node)
+                if len(order) == len(self.nodes):
+                    break
+        return order
+
+    def owner(self, key: str) -> str:
+        return self.preference(key)[0]
+
+
+class MemoryLeaseStore:
+    """
+    Leases por chave com TTL em memória. Vale para um processo: no modo hash
+    com um worker por nó cada chat sempre cai no mesmo processo, então a
+    deduplicação local basta.
+    """
+
+    # Não é visto por outros workers nem nós
+    shared = False
+
+    def __init__(self, max_keys: int = 100000):
+        self.__max_keys = max_keys
+        self.__leases: Dict[str, Tuple[str, float]] = {}
+        self.__lock = threading.Lock()
+
+    def claim(self, key: str, owner: str, ttl: float) -> bool:
+        """Pega (ou renova) o lease se estiver livre, expirado ou já for do owner."""
+        now = time.time()
+        with self.__lock:
+            entry = self.__leases.get(key)
+            if entry is not None and entry[0] != owner and entry[1] > now:
+                return False
+            self.__leases[key] = (owner, now + ttl)
+            self._evict(now)
+            return True
+
+    def add(self, key: str, ttl: float) -> bool:
+        """Marca a chave; False se já estava marcada e não expirou (webhook repetido)."""
+        now = time.time()
+        with self.__lock:
+            entry = self.__leases.get(key)
+            if entry is not None and entry[1] > now:
+                return False
+            self.__leases[key] = ('', now + ttl)
+            self._evict(now)
+            return True
+
+    def release(self, key: str, owner: str) -> None:
+        with self.__lock:
+            entry = self.__leases.get(key)
+            if entry is not None and entry[0] == owner:
+                del self.__leases[key]
+
+    def _evict(self, now: float) -> None:
+        if len(self.__leases) <= self.__max_keys:
+            return
+        for key in [k for k, (_, expires) in self.__leases.items() if expires <= now]:
+            del self.__leases[key]
+        # Ainda cheio: descarta as chaves mais antigas (ordem de inserção)
+        while len(self.__leases) > self.__max_keys:
+            del self.__leases[next(iter(self.__leases))]
+
+    def __len__(self):
+        return len(self.__leases)
+
+
+class SQLiteLeaseStore(SQLiteStore):
+    """
+    Leases em SQLite (WAL), compartilhados entre workers e nós que montam o
+    mesmo arquivo. Mesmo contrato de um store externo (claim/add/release com
+    TTL), para trocar por um serviço compartilhado sem mexer no app.
+    """
+
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS idx_leases_expires ON leases (expires);
+        """)
+
+    def claim(self, key: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        # Upsert condicional: uma única instrução, atômica entre processos
+        cursor = self._conn().execute(
+            'INSERT INTO leases (key, owner, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires = excluded.expires '
+            'WHERE leases.expires <= ? OR leases.owner = excluded.owner',
+            (key, owner, now + ttl, now),
+        )
+        self._maybe_cleanup()
+        return cursor.rowcount == 1
+
+    def add(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        cursor = self._conn().execute(
+            'INSERT INTO leases (key, owner, expires) VALUES (?, \'\', ?) '
+            'ON CONFLICT(key) DO UPDATE SET owner = \'\', expires = excluded.expires '
+            'WHERE leases.expires <= ?',
+            (key, now + ttl, now),
+        )
+        self._maybe_cleanup()
+        return cursor.rowcount == 1
+
+    def release(self, key: str, owner: str) -> None:
+        self._conn().execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def _cleanup(self, conn: sqlite3.Connection) -> None:
+        conn.execute('DELETE FROM leases WHERE expires <= ?', (time.time(),))
+
+
+class Cluster:
+    """
+    Vários nós da API atrás de um balanceador, sem líder:
+      - hash: cada chat tem um nó dono (HashRing); os outros repassam o webhook
+        a ele em segundo plano. Se o dono não responder, o próximo do anel
+        assume por um tempo (e, se for este nó, processa aqui mesmo).
+      - lease: qualquer nó atende, mas só um processa o chat por vez (lease
+        por chat_id no store compartilhado).
+    Em qualquer modo, webhooks reentregues pelo WAHA (mesmo id de mensagem)
+    são descartados; com MemoryLeaseStore, só os que caem no mesmo worker.
+    """
+
+    def __init__(
+        self,
+        node: str,
+        mode: str = 'off',
+        peers: Optional[Dict[str, str]] = None,
+        store=None,
+        dedupe_ttl: float = 600,
+        lease_ttl: float = 120,
+        lease_wait: float = 30,
+        forward_timeout: float = 10,
+        peer_cooldown: float = 10,
+        forward_lanes: int = 8,
+    ):
+        if mode not in ('off', 'hash', 'lease'):
+            raise ValueError(f"Modo de cluster desconhecido: {mode}")
+        self.node = node
+        self.mode = mode
+        self.__peers = dict(peers or {})
+        self.__ring = HashRing(list(self.__peers) or [node]) if mode == 'hash' else None
+        self.__store = store
+        self.__dedupe_ttl = dedupe_ttl
+        self.__lease_ttl = lease_ttl
+        self.__lease_wait = lease_wait
+        self.__forward_timeout = forward_timeout
+        self.__peer_cooldown = peer_cooldown
+        self.__down: Dict[str, float] = {}
+        self.__session = requests.Session()
+        self.__forward_lanes = forward_lanes
+        self.__lanes: List[ThreadPoolExecutor] = []
+        self.__lock = threading.Lock()
+        self.__counters = {'forwarded': 0, 'forward_failures': 0, 'forward_unconfirmed': 0, 'duplicates': 0,
+                           'lease_waits': 0, 'lease_timeouts': 0}
+
+        if mode == 'hash' and node not in self.__peers:
+            raise ValueError(f"CLUSTER_NO '{node}' não está em CLUSTER_NOS")
+        if mode == 'lease' and not getattr(store, 'shared', False):
+            # Com um store por processo o lease não exclui nada entre workers e nós
+            raise ValueError("Modo lease precisa de um store compartilhado (CLUSTER_STORE=sqlite)")
+
+        self.logger = logging.getLogger(__name__)
+
+    def _count(self, name: str) -> None:
+        with self.__lock:
+            self.__counters[name] += 1
+
+    # --- DEDUPLICAÇÃO ---
+
+    def first_delivery(self, message_id: Optional[str]) -> bool:
+        """True na primeira entrega do id; False para reentregas dentro do TTL."""
+        if self.__store is None or not message_id:
+            return True
+        if self.__store.add(f'msg:{message_id}', self.__dedupe_ttl):
+            return True
+        self._count('duplicates')
+        return False
+
+    def forget(self, message_id: Optional[str]) -> None:
+        """Desfaz o first_delivery: a mensagem não foi aceita (503/erro) e a reentrega deve ser processada."""
+        if self.__store is not None and message_id:
+            self.__store.release(f'msg:{message_id}', '')
+
+    # --- MODO HASH ---
+
+    def forward(self, chat_id: str, path: str, data: Any, fallback: Callable[[], Any]) -> Optional[str]:
+        """
+        Agenda o repasse do webhook ao dono do chat e devolve o nome dele; None
+        quando este nó é quem deve processar agora.
+
+        O repasse roda fora do worker: com workers síncronos, dois nós que
+        esperassem um pelo outro travariam. Cada chat usa sempre a mesma faixa
+        (uma thread), então as mensagens chegam ao dono na ordem. Se nenhum
+        nó antes deste no anel aceitar (conexão recusada ou 503), fallback()
+        processa aqui; timeout de leitura conta como entregue.
+        """
+        if self.__ring is None:
+            return None
+        candidates = self._candidates(chat_id)
+        if not candidates:
+            return None
+        if not self.__lanes:
+            # Criadas no primeiro uso
+            with self.__lock:
+                if not self.__lanes:
+                    self.__lanes = [ThreadPoolExecutor(1, thread_name_prefix=f'repasse-{i}')
+                                    for i in range(self.__forward_lanes)]
+        lane = self.__lanes[_hash(chat_id) % len(self.__lanes)]
+        lane.submit(self._deliver, candidates, path, data, fallback)
+        return candidates[0]
+
+    def _candidates(self, chat_id: str) -> List[str]:
+        """Nós antes deste na preferência do chat, sem os pausados."""
+        now = time.monotonic()
+        candidates = []
+        for node in self.__ring.preference(chat_id):
+            if node == self.node:
+                break
+            if self.__down.get(node, 0) <= now:
+                candidates.append(node)
+        return candidates
+
+    def _deliver(self, candidates: List[str], path: str, data: Any, fallback: Callable[[], Any]) -> None:
+        for node in candidates:
+            try:
+                response = self.__session.post(
+                    self.__peers[node].rstrip('/') + path,
+                    json=data,
+                    headers={FORWARD_HEADER: self.node},
+                    timeout=self.__forward_timeout,
+                )
+                if response.status_code == 503:
+                    # Fila do dono cheia: tenta o próximo, sem pausar o dono
+                    self._count('forward_failures')
+                    continue
+                response.raise_for_status()
+            except requests.ConnectionError as e:
+                # Não chegou ao dono (ou ele caiu): pausa e tenta o próximo
+                self.logger.warning(f"⚠️ Nó {node} não aceitou o repasse ({e}); pausado por {self.__peer_cooldown:.0f}s")
+                self.__down[node] = time.monotonic() + self.__peer_cooldown
+                self._count('forward_failures')
+                continue
+            except requests.RequestException as e:
+                # Timeout de leitura ou erro do dono: o webhook foi entregue (com workers
+                # síncronos o dono só responde depois do LLM). Processar aqui também
+                # mandaria uma segunda resposta ao cliente.
+                self.logger.warning(f"⚠️ Repasse ao nó {node} sem confirmação ({e}); não será reprocessado aqui")
+                self._count('forward_unconfirmed')
+                return
+            self._count('forwarded')
+            return
+        try:
+            fallback()
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao processar localmente o webhook repassado: {e}", exc_info=True)
+
+    # --- MODO LEASE ---
+
+    @contextmanager
+    def lease(self, chat_id: str):
+        """
+        Exclusividade do chat entre nós e workers enquanto o turno roda.
+        Passado lease_wait sem conseguir, processa assim mesmo (melhor
+        responder fora de ordem do que não responder) e devolve False.
+        """
+        if self.mode != 'lease':
+            yield True
+            return
+
+        key = f'chat:{chat_id}'
+        owner = f'{self.node}/{os.getpid()}/{threading.get_ident()}'
+        deadline = time.monotonic() + self.__lease_wait
+        acquired = self.__store.claim(key, owner, self.__lease_ttl)
+        if not acquired:
+            self._count('lease_waits')
+            while not acquired and time.monotonic() < deadline:
+                time.sleep(0.05)
+                acquired = self.__store.claim(key, owner, self.__lease_ttl)
+            if not acquired:
+                self._count('lease_timeouts')
+                self.logger.warning(f"⏳ Lease de {chat_id} ocupado há {self.__lease_wait:.0f}s; processando mesmo assim")
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.__store.release(key, owner)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.__lock:
+            stats = dict(self.__counters)
+        stats.update({
+            'node': self.node,
+            'mode': self.mode,
+            'nodes': list(self.__peers) if self.__ring else [self.node],
+            'down': sorted(node for node, until in self.__down.items() if until > now),
+        })
+        return stats
+
+
+def create_lease_store():
+    """
+    Instancia o store configurado em CLUSTER_STORE (none, memory ou sqlite).
+    Sem CLUSTER_STORE: sqlite no modo lease ou com mais de um worker
+    (WEB_CONCURRENCY), para a reentrega que cai em outro worker também ser
+    descartada; memory com um só.
+    """
+    backend = os.getenv('CLUSTER_STORE', '').lower()
+    if not backend:
+        compartilhado = os.getenv('CLUSTER_MODO', 'off').lower() == 'lease' or int(os.getenv('WEB_CONCURRENCY', 1)) > 1
+        backend = 'sqlite' if compartilhado else 'memory'
+    if backend == 'memory':
+        return MemoryLeaseStore(int(os.getenv('CLUSTER_MAX_CHAVES', 100000)))
+    if backend == 'sqlite':
+        return SQLiteLeaseStore(os.getenv('CLUSTER_SQLITE_PATH', '/tmp/cluster.sqlite3'))
+    return None
+
+
+def parse_peers(spec: str) -> Dict[str, str]:
+    """'api-1=http://api-1:5050,api-2=http://api-2:5050' -> {'api-1': 'http://api-1:5050', ...}."""
+    peers = {}
+    for item in spec.split(','):
+        name, _, url = item.strip().partition('=')
+        if name and url:
+            peers[name.strip()] = url.strip()
+    return peers
+
+
+def create_cluster() -> Cluster:
+    """Cluster configurado por CLUSTER_MODO (off, hash ou lease) e variáveis CLUSTER_*."""
+    return Cluster(
+        node=os.getenv('CLUSTER_NO') or socket.gethostname(),
+        mode=os.getenv('CLUSTER_MODO', 'off').lower(),
+        peers=parse_peers(os.getenv('CLUSTER_NOS', '')),
+        store=create_lease_store(),
+        dedupe_ttl=float(os.getenv('CLUSTER_DEDUPE_TTL', 600)),
+        lease_ttl=float(os.getenv('CLUSTER_LEASE_TTL', 120)),
+        lease_wait=float(os.getenv('CLUSTER_LEASE_ESPERA', 30)),
+        forward_timeout=float(os.getenv('CLUSTER_TIMEOUT', 10)),
+        peer_cooldown=float(os.getenv('CLUSTER_PAUSA_NO', 10)),
+        forward_lanes=int(os.getenv('CLUSTER_REPASSE_THREADS', 8)),
+    )
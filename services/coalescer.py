@@ -0,0 +1,127 @@
+import heapq
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+
+class _Lane:
+    """Estado de um chat: mensagens pendentes e se já existe um job em andamento."""
+    __slots__ = ('buffer', 'first_at', 'deadline', 'running')
+
+    def __init__(self):
+        self.buffer: List[Dict[str, Any]] = []
+        self.first_at = 0.0
+        self.deadline = 0.0
+        self.running = False
+
+
+class ChatCoalescer:
+    """
+    Agrupa mensagens seguidas do mesmo chat_id em um único job (debounce) e
+    garante uma faixa ordenada por chat: no máximo um job em andamento por vez.
+    """
+
+    def __init__(self, submit: Callable[[Dict[str, Any]], bool], window: float, max_wait: float):
+        self.__submit = submit
+        self.__window = window
+        self.__max_wait = max(max_wait, window)
+        self.__lanes: Dict[str, _Lane] = {}
+        self.__heap: list = []
+        self.__cond = threading.Condition()
+        self.__started = False
+
+        self.__messages = 0
+        self.__dispatches = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def _start(self):
+        # Thread única de agendamento, criada no primeiro uso
+        if not self.__started:
+            threading.Thread(target=self._run, name='coalescer', daemon=True).start()
+            self.__started = True
+
+    def add(self, job: Dict[str, Any]) -> None:
+        """Adiciona uma mensagem à faixa do chat e (re)arma a janela de espera."""
+        now = time.monotonic()
+        with self.__cond:
+            self._start()
+            self.__messages += 1
+            lane = self.__lanes.get(job['chat_id'])
+            if lane is None:
+                lane = self.__lanes[job['chat_id']] = _Lane()
+            if not lane.buffer:
+                lane.first_at = now
+            lane.buffer.append(job)
+
+            # Com job em andamento, as mensagens aguardam o done()
+            if not lane.running:
+                self._arm(job['chat_id'], lane, now)
+
+    def done(self, chat_id: str) -> None:
+        """Chamado ao fim do processamento: libera a faixa e despacha o que acumulou."""
+        now = time.monotonic()
+        with self.__cond:
+            lane = self.__lanes.get(chat_id)
+            if lane is None:
+                return
+            lane.running = False
+            if lane.buffer:
+                self._arm(chat_id, lane, now)
+            else:
+                del self.__lanes[chat_id]
+
+    def _arm(self, chat_id: str, lane: _Lane, now: float) -> None:
+        # Janela deslizante, limitada pelo tempo máximo desde a primeira mensagem
+        lane.deadline = min(now + self.__window, lane.first_at + self.__max_wait)
+        heapq.heappush(self.__heap, (lane.deadline, chat_id))
+        self.__cond.notify()
+
+    def _run(self):
+        while True:
+            with self.__cond:
+                while not self.__heap or self.__heap[0][0] > time.monotonic():
+                    timeout = self.__heap[0][0] - time.monotonic() if self.__heap else None
+                    self.__cond.wait(timeout)
+
+                deadline, chat_id = heapq.heappop(self.__heap)
+                lane = self.__lanes.get(chat_id)
+                # Entradas antigas do heap (janela rearmada) são descartadas
+                if lane is None or lane.running or not lane.buffer or lane.deadline != deadline:
+                    continue
+
+                jobs, lane.buffer = lane.buffer, []
+                lane.running = True
+
+            self._dispatch(chat_id, jobs)
+
+    def _dispatch(self, chat_id: str, jobs: List[Dict[str, Any]]) -> None:
+        merged = dict(jobs[0])
+        merged['body'] = '\n'.join(j['body'] for j in jobs)
+        merged['coalesced'] = len(jobs)
+
+        if len(jobs) > 1:
+            self.logger.info(f"🧩 {len(jobs)} mensagens agrupadas para {chat_id}")
+
+        if self.__submit(merged):
+            with self.__cond:
+                self.__dispatches += 1
+            return
+
+        # Fila cheia: devolve as mensagens para a faixa e tenta de novo depois
+        self.logger.warning(f"⚠️ Fila cheia, reagendando {chat_id}")
+        with self.__cond:
+            lane = self.__lanes[chat_id]
+            lane.buffer = jobs + lane.buffer
+            lane.running = False
+            lane.first_at = time.monotonic()
+            self._arm(chat_id, lane, lane.first_at)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.__cond:
+            return {
+                'active_chats': len(self.__lanes),
+                'messages': self.__messages,
+                'dispatches': self.__dispatches,
+            }
@@ -0,0 +1,191 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from services.sqlite_store import SQLiteStore
+
+# Limite de caracteres guardados por mensagem (clientes às vezes colam textos enormes)
+MAX_BODY_CHARS = 2000
+
+
+def _message(body: str, from_me: bool, timestamp: Optional[float] = None) -> Dict[str, Any]:
+    """Mesmo formato das mensagens do WAHA consumido pelo AIBot."""
+    return {
+        'body': (body or '')[:MAX_BODY_CHARS],
+        'fromMe': bool(from_me),
+        'timestamp': timestamp or time.time(),
+    }
+
+
+class MemoryHistoryStore:
+    """Histórico por chat em memória (LRU + TTL). Indicado para um único worker."""
+
+    def __init__(self, max_chats: int = 20000, max_messages: int = 10, ttl: float = 3600):
+        self.__max_chats = max_chats
+        self.__max_messages = max_messages
+        self.__ttl = ttl
+        self.__chats: "OrderedDict[str, tuple]" = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Retorna o histórico ou None em caso de miss (ausente ou expirado)."""
+        now = time.time()
+        with self.__lock:
+            entry = self.__chats.get(chat_id)
+            if entry is None:
+                return None
+            touched, messages = entry
+            if now - touched > self.__ttl:
+                del self.__chats[chat_id]
+                return None
+            self.__chats[chat_id] = (now, messages)
+            self.__chats.move_to_end(chat_id)
+            return list(messages)
+
+    def seed(self, chat_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Preenche o chat a partir do backfill do WAHA."""
+        items = deque(
+            (_message(m.get('body', ''), m.get('fromMe'), m.get('timestamp')) for m in messages),
+            maxlen=self.__max_messages,
+        )
+        with self.__lock:
+            self.__chats[chat_id] = (time.time(), items)
+            self.__chats.move_to_end(chat_id)
+            while len(self.__chats) > self.__max_chats:
+                self.__chats.popitem(last=False)
+
+    def append(self, chat_id: str, body: str, from_me: bool) -> None:
+        """Acrescenta uma mensagem apenas se o chat já estiver aquecido."""
+        with self.__lock:
+            entry = self.__chats.get(chat_id)
+            if entry is not None:
+                entry[1].append(_message(body, from_me))
+
+    def __len__(self):
+        return len(self.__chats)
+
+
+class SQLiteHistoryStore(SQLiteStore):
+    """Histórico por chat em SQLite (WAL), compartilhado entre os workers do gunicorn."""
+
+    def __init__(self, path: str, max_chats: int = 20000, max_messages: int = 10, ttl: float = 3600):
+        self.__max_chats = max_chats
+        self.__max_messages = max_messages
+        self.__ttl = ttl
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS chats (chat_id TEXT PRIMARY KEY, touched REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id TEXT NOT NULL,
+                body TEXT NOT NULL,
+                from_me INTEGER NOT NULL,
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, id);
+            CREATE INDEX IF NOT EXISTS idx_chats_touched ON chats (touched);
+        """)
+
+    def get(self, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute('SELECT touched FROM chats WHERE chat_id = ?', (chat_id,)).fetchone()
+        if row is None:
+            return None
+        if now - row[0] > self.__ttl:
+            self._delete(conn, chat_id)
+            return None
+
+        conn.execute('UPDATE chats SET touched = ? WHERE chat_id = ?', (now, chat_id))
+        rows = conn.execute(
+            'SELECT body, from_me, ts FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT ?',
+            (chat_id, self.__max_messages),
+        ).fetchall()
+        return [_message(body, from_me, ts) for body, from_me, ts in reversed(rows)]
+
+    def seed(self, chat_id: str, messages: List[Dict[str, Any]]) -> None:
+        conn = self._conn()
+        rows = [
+            (chat_id, m['body'], int(m['fromMe']), m['timestamp'])
+            for m in (_message(m.get('body', ''), m.get('fromMe'), m.get('timestamp'))
+                      for m in messages[-self.__max_messages:])
+        ]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+            conn.executemany('INSERT INTO messages (chat_id, body, from_me, ts) VALUES (?, ?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO chats (chat_id, touched) VALUES (?, ?)', (chat_id, time.time()))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._maybe_cleanup()
+
+    def append(self, chat_id: str, body: str, from_me: bool) -> None:
+        conn = self._conn()
+        message = _message(body, from_me)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            exists = conn.execute('SELECT 1 FROM chats WHERE chat_id = ?', (chat_id,)).fetchone()
+            if exists:
+                conn.execute(
+                    'INSERT INTO messages (chat_id, body, from_me, ts) VALUES (?, ?, ?, ?)',
+                    (chat_id, message['body'], int(from_me), message['timestamp']),
+                )
+                # Mantém só as últimas max_messages do chat
+                conn.execute(
+                    'DELETE FROM messages WHERE chat_id = ? AND id NOT IN '
+                    '(SELECT id FROM messages WHERE chat_id = ? ORDER BY id DESC LIMIT ?)',
+                    (chat_id, chat_id, self.__max_messages),
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if exists:
+            self._maybe_cleanup()
+
+    def _delete(self, conn: sqlite3.Connection, chat_id: str) -> None:
+        conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat_id,))
+        conn.execute('DELETE FROM chats WHERE chat_id = ?', (chat_id,))
+
+    def _cleanup(self, conn: sqlite3.Connection) -> None:
+        # Remove chats expirados e os menos usados acima do limite
+        cutoff = time.time() - self.__ttl
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM chats WHERE touched < ?', (cutoff,))
+            conn.execute(
+                'DELETE FROM chats WHERE chat_id IN '
+                '(SELECT chat_id FROM chats ORDER BY touched DESC LIMIT -1 OFFSET ?)',
+                (self.__max_chats,),
+            )
+            conn.execute('DELETE FROM messages WHERE chat_id NOT IN (SELECT chat_id FROM chats)')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def create_history_store():
+    """Instancia o backend configurado em HISTORICO_BACKEND (none, memory ou sqlite)."""
+    backend = os.getenv('HISTORICO_BACKEND', 'none').lower()
+    max_chats = int(os.getenv('HISTORICO_MAX_CHATS', 20000))
+    max_messages = int(os.getenv('HISTORICO_MAX_MENSAGENS', 10))
+    ttl = float(os.getenv('HISTORICO_TTL', 3600))
+
+    if backend == 'memory':
+        workers = int(os.getenv('WEB_CONCURRENCY', 1))
+        if workers > 1:
+            # Cada worker teria o seu histórico parcial do mesmo chat, sem aviso
+            raise ValueError(
+                f"HISTORICO_BACKEND=memory é por processo e há {workers} workers (WEB_CONCURRENCY): "
+                "use HISTORICO_BACKEND=sqlite"
+            )
+        return MemoryHistoryStore(max_chats, max_messages, ttl)
+    if backend == 'sqlite':
+        path = os.getenv('HISTORICO_SQLITE_PATH', '/tmp/historico.sqlite3')
+        return SQLiteHistoryStore(path, max_chats, max_messages, ttl)
+    return None
@@ -0,0 +1,98 @@
+import os
+import queue
+import time
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class JobQueue:
+    """Fila limitada em memória + pool de workers para processar webhooks fora da requisição."""
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], None], workers: Optional[int] = None,
+                 max_size: Optional[int] = None, backend: Optional[Any] = None):
+        self.__handler = handler
+        self.__workers = workers or int(os.getenv('FILA_WORKERS', 4))
+        # Backend plugável: qualquer objeto com put_nowait/get/qsize (ex.: adaptador Redis).
+        # Por padrão usa a queue.Queue local como substituto.
+        self.__queue = backend or queue.Queue(maxsize=max_size or int(os.getenv('FILA_TAMANHO', 100)))
+        self.__lock = threading.Lock()
+        self.__started = False
+
+        # Métricas para dimensionar o pool
+        self.__enqueued = 0
+        self.__processed = 0
+        self.__rejected = 0
+        self.__failed = 0
+        self.__max_depth = 0
+        self.__waits = deque(maxlen=1000)
+
+        self.logger = logging.getLogger(__name__)
+
+    def _start(self):
+        """Sobe os workers no primeiro uso."""
+        with self.__lock:
+            if self.__started:
+                return
+            for i in range(self.__workers):
+                threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True).start()
+            self.__started = True
+            self.logger.info(f"⚙️ Fila iniciada com {self.__workers} workers")
+
+    def submit(self, job: Dict[str, Any]) -> bool:
+        """Enfileira um job. Retorna False se a fila estiver cheia."""
+        self._start()
+        job['enqueued_at'] = time.monotonic()
+        try:
+            self.__queue.put_nowait(job)
+        except queue.Full:
+            with self.__lock:
+                self.__rejected += 1
+            return False
+
+        with self.__lock:
+            self.__enqueued += 1
+            self.__max_depth = max(self.__max_depth, self.__queue.qsize())
+        return True
+
+    def _run(self):
+        while True:
+            job = self.__queue.get()
+            wait = time.monotonic() - job.get('enqueued_at', time.monotonic())
+            with self.__lock:
+                self.__waits.append(wait)
+            try:
+                self.__handler(job)
+            except Exception as e:
+                with self.__lock:
+                    self.__failed += 1
+                self.logger.error(f"❌ Erro no job {job.get('chat_id')}: {e}", exc_info=True)
+            finally:
+                with self.__lock:
+                    self.__processed += 1
+                if hasattr(self.__queue, 'task_done'):
+                    self.__queue.task_done()
+
+    def depth(self) -> int:
+        return self.__queue.qsize()
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidade da fila e tempos de espera (segundos) das últimas execuções."""
+        with self.__lock:
+            waits = sorted(self.__waits)
+            stats = {
+                'workers': self.__workers,
+                'depth': self.__queue.qsize(),
+                'max_depth': self.__max_depth,
+                'enqueued': self.__enqueued,
+                'processed': self.__processed,
+                'rejected': self.__rejected,
+                'failed': self.__failed,
+            }
+
+        if waits:
+            stats['wait_p50'] = round(waits[len(waits) // 2], 4)
+            stats['wait_p95'] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4)
+            stats['wait_max'] = round(waits[-1], 4)
+        return stats
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import glob
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+# Arquivo com a soma dos workers já encerrados (metrics_<ACCUMULATED>.json)
+ACCUMULATED = 'encerrados'
+
+# Limites dos histogramas de latência (segundos)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    'bot_etapa_segundos': 'Duração de cada etapa do atendimento (recuperacao inclui o embedding, exceto com o cache semântico, que o calcula antes)',
+    'bot_fila_espera_segundos': 'Tempo de espera dos jobs na fila do modo assíncrono',
+    'bot_llm_tokens_total': 'Tokens enviados (prompt) e gerados (completion) pelo LLM',
+    'bot_llm_segundos': 'Latência por backend do roteador de LLM (invoke: resposta completa; stream: primeiro token)',
+    'bot_llm_chamadas_total': 'Chamadas a cada backend do roteador por resultado',
+    'bot_llm_rota_total': 'Turnos por rota do roteador (rapido / extracao)',
+    'bot_llm_hedge_total': 'Requisições de hedge disparadas e vencedoras',
+    'bot_llm_disjuntor_aberto': 'Workers com o disjuntor do backend aberto',
+    'bot_prompt_tokens_total': 'Tokens do prompt montado pelo orçamento, por parte (estimativa local)',
+    'bot_fallback_total': 'Respostas de fallback do AIBot (erro na IA)',
+    'bot_cache_total': 'Consultas ao cache semântico por resultado',
+    'bot_webhook_total': 'Webhooks recebidos por origem e status (duplicado = reentrega do mesmo id)',
+    'bot_cluster_total': 'Webhooks repassados ao nó dono do chat e leases de chat estourados',
+    'bot_waha_envios_total': 'Mensagens enviadas ao WAHA',
+    'bot_envio_total': 'Envios do agendador por faixa e status (repetido = nova tentativa, descartado = digitando anulado)',
+    'bot_envio_atraso_segundos': 'Tempo entre entrar na fila do agendador e ser enviado ao WAHA, por faixa',
+    'bot_fila_profundidade': 'Jobs aguardando na fila (soma dos workers)',
+}
+
+
+def _key(name: str, labels: Dict[str, str]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """
+    Contadores, gauges e histogramas em memória, com um arquivo por processo
+    em METRICS_DIR. O /metrics soma os arquivos de todos os workers do gunicorn.
+    """
+
+    def __init__(self, directory: str = None, enabled: bool = True, flush_interval: float = 1.0):
+        self.enabled = enabled
+        self.__dir = directory or os.getenv('METRICS_DIR', '/tmp/bot_metrics')
+        self.__flush_interval = flush_interval
+        self.__counters: Dict[tuple, float] = {}
+        self.__gauges: Dict[tuple, float] = {}
+        self.__histograms: Dict[tuple, list] = {}
+        self.__lock = threading.Lock()
+        self.__last_flush = 0.0
+        self.__dirty = False
+        # Processo que já tem a thread de gravação (cada worker sobe a sua)
+        self.__flusher_pid = None
+        self.logger = logging.getLogger(__name__)
+
+    # --- REGISTRO (caminho quente: só dicionário + lock) ---
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def set(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__gauges[_key(name, labels)] = value
+        self._maybe_flush()
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self.__lock:
+            hist = self.__histograms.get(key)
+            if hist is None:
+                # [contagem por bucket..., +Inf, soma]
+                hist = self.__histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, limit in enumerate(BUCKETS):
+                if seconds <= limit:
+                    hist[i] += 1
+                    break
+            else:
+                hist[len(BUCKETS)] += 1
+            hist[-1] += seconds
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name: str = 'bot_etapa_segundos', **labels):
+        """Cronometra um bloco: `with metricas.timer(etapa='llm'):`."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # --- AGREGAÇÃO ENTRE WORKERS ---
+
+    def _path(self, pid: int = None) -> str:
+        return os.path.join(self.__dir, f'metrics_{pid or os.getpid()}.json')
+
+    def _write(self, path: str, data: dict) -> None:
+        os.makedirs(self.__dir, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _maybe_flush(self) -> None:
+        self.__dirty = True
+        if self.__flusher_pid != os.getpid():
+            self._start_flusher()
+        if time.monotonic() - self.__last_flush >= self.__flush_interval:
+            self.flush()
+
+    def _start_flusher(self) -> None:
+        """
+        Thread que grava o que ficou em memória a cada intervalo: sem ela, os
+        eventos do último segundo só iriam para o arquivo no próximo evento
+        deste worker, e o /metrics servido por outro worker contaria a menos.
+        """
+        with self.__lock:
+            if self.__flusher_pid == os.getpid():
+                return
+            self.__flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='metricas', daemon=True).start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.__flush_interval)
+            if self.__dirty:
+                self.flush()
+
+    def flush(self) -> None:
+        """Grava o estado deste processo (troca atômica do arquivo)."""
+        with self.__lock:
+            self.__last_flush = time.monotonic()
+            self.__dirty = False
+            data = {
+                'counters': [[n, list(l), v] for (n, l), v in self.__counters.items()],
+                'gauges': [[n, list(l), v] for (n, l), v in self.__gauges.items()],
+                'histograms': [[n, list(l), h] for (n, l), h in self.__histograms.items()],
+            }
+        try:
+            self._write(self._path(), data)
+        except OSError as e:
+            self.logger.error(f"Erro ao gravar métricas: {e}")
+
+    # --- CICLO DE VIDA DOS WORKERS (hooks do gunicorn.conf.py, no master) ---
+
+    def clear(self) -> None:
+        """Apaga os arquivos de uma execução anterior (no início do master)."""
+        for path in glob.glob(os.path.join(self.__dir, 'metrics_*.json*')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def mark_process_dead(self, pid: int) -> None:
+        """
+        Worker encerrado: soma contadores e histogramas dele no arquivo
+        acumulado e descarta os gauges (o valor de um processo morto não vale
+        mais). Sem isso o arquivo ficaria para sempre no /metrics, e um pid
+        reaproveitado sobrescreveria os contadores dele (que voltariam atrás).
+        """
+        path = self._path(pid)
+        try:
+            with open(path) as f:
+                dead = json.load(f)
+        except (OSError, ValueError):
+            return
+        accumulated_path = os.path.join(self.__dir, f'metrics_{ACCUMULATED}.json')
+        try:
+            with open(accumulated_path) as f:
+                accumulated = json.load(f)
+        except (OSError, ValueError):
+            accumulated = {}
+
+        merged = {}
+        for section in ('counters', 'histograms'):
+            series = {}
+            for name, labels, value in accumulated.get(section, []) + dead.get(section, []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if key not in series:
+                    series[key] = value
+                elif section == 'counters':
+                    series[key] += value
+                else:
+                    series[key] = [a + b for a, b in zip(series[key], value)]
+            merged[section] = [[n, [list(pair) for pair in l], v] for (n, l), v in series.items()]
+        merged['gauges'] = []
+        try:
+            self._write(accumulated_path, merged)
+            os.remove(path)
+        except OSError as e:
+            self.logger.error(f"Erro ao acumular métricas do worker {pid}: {e}")
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus, somando todos os workers."""
+        self.flush()
+        counters: Dict[tuple, float] = {}
+        gauges: Dict[tuple, float] = {}
+        histograms: Dict[tuple, list] = {}
+
+        for path in glob.glob(os.path.join(self.__dir, 'metrics_*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for target, section in ((counters, 'counters'), (gauges, 'gauges')):
+                for name, labels, value in data.get(section, []):
+                    key = (name, tuple(tuple(pair) for pair in labels))
+                    target[key] = target.get(key, 0) + value
+            for name, labels, hist in data.get('histograms', []):
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if key in histograms:
+                    histograms[key] = [a + b for a, b in zip(histograms[key], hist)]
+                else:
+                    histograms[key] = list(hist)
+
+        lines = []
+        for kind, series in (('counter', counters), ('gauge', gauges)):
+            for name in sorted({n for n, _ in series}):
+                lines.append(f'# HELP {name} {HELP.get(name, name)}')
+                lines.append(f'# TYPE {name} {kind}')
+                for (n, labels), value in sorted(series.items()):
+                    if n == name:
+                        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+        for name in sorted({n for n, _ in histograms}):
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            for (n, labels), hist in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for limit, count in zip(BUCKETS + ('+Inf',), hist[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", str(limit)),))} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(hist[-1])}')
+                lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels) -> str:
+    if not labels:
+        return ''
+    escaped = (f'{k}="{str(v)}"'.replace('\n', ' ') for k, v in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f'{value:.6f}'
+
+
+# Instância do processo (cada worker do gunicorn grava o próprio arquivo)
+metricas = Metrics(enabled=os.getenv('METRICAS', 'true').lower() in ('1', 'true', 'sim'))
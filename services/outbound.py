@@ -0,0 +1,334 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import metricas
+
+# Faixas de prioridade (menor sai primeiro): alertas ao suporte (fechamento e
+# simulação), ofertas do suporte aos clientes, respostas da IA e "digitando"
+ALERTA, OFERTA, RESPOSTA, DIGITANDO = range(4)
+LANES = ('alerta', 'oferta', 'resposta', 'digitando')
+
+TEXT, START_TYPING, STOP_TYPING = 'text', 'start_typing', 'stop_typing'
+
+
+class TokenBucket:
+    """Balde de fichas: `rate` envios por segundo, com rajadas de até `capacity`."""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver uma ficha (0 se já há)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        """Cheio de novo: pode ser descartado (recriado cheio, é o mesmo estado)."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class _Item:
+    __slots__ = ('lane', 'kind', 'chat_id', 'text', 'enqueued', 'not_before', 'attempts')
+
+    def __init__(self, lane: int, kind: str, chat_id: str, text: Optional[str] = None):
+        self.lane = lane
+        self.kind = kind
+        self.chat_id = chat_id
+        self.text = text
+        self.enqueued = time.monotonic()
+        self.not_before = 0.0
+        self.attempts = 0
+
+
+class OutboundScheduler:
+    """
+    Agenda tudo que sai para o WAHA (mesma interface do Waha, com prioridade).
+
+    - Faixas de prioridade: um alerta ao suporte nunca espera atrás de
+      respostas em massa; dentro da faixa, a ordem de cada destinatário é
+      mantida (e só um envio por destinatário fica em andamento).
+    - Capacidade reservada aos alertas: `reserved` threads de envio ficam só
+      para eles, e um alerta não espera a ficha da sessão (toma emprestada;
+      as outras faixas pagam a dívida esperando um pouco mais). Alertas não
+      seguem a ordem por destinatário: saem em paralelo, como no envio direto.
+    - Baldes de fichas por destinatário e por sessão do WAHA, para não
+      disparar rajadas no mesmo número nem na conta. "Digitando" e os
+      destinatários em `exempt` (os números do suporte, que recebem os
+      alertas de todos os chats) só contam na sessão.
+    - start/stop de "digitando" ainda pendentes se anulam (a resposta chegou
+      antes do indicador sair), e um start pendente cai quando a mensagem do
+      mesmo chat sai.
+    - Falhas (o cliente devolve False) voltam para a frente da faixa com
+      backoff exponencial e jitter, até `retries` vezes (a primeira
+      repetição de um alerta é imediata).
+
+    Os envios retornam assim que entram na fila; o atraso até sair vai para
+    bot_envio_atraso_segundos. Os limites valem por processo (por worker).
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        recipient_rate: float = 1.0,
+        recipient_burst: float = 3,
+        session_rate: float = 20.0,
+        session_burst: float = 40,
+        threads: int = 4,
+        reserved: int = 1,
+        retries: int = 3,
+        backoff: float = 0.5,
+        exempt: Iterable[str] = (),
+    ):
+        self.__client = client
+        self.__recipient_rate = recipient_rate
+        self.__recipient_burst = recipient_burst
+        self.__session = TokenBucket(session_rate, session_burst, time.monotonic())
+        self.__buckets: Dict[str, TokenBucket] = {}
+        self.__exempt = frozenset(exempt)
+        self.__threads = threads
+        # Com uma thread só não há o que reservar
+        self.__reserved = min(reserved, threads - 1)
+        self.__retries = retries
+        self.__backoff = backoff
+
+        self.__lanes: List[deque] = [deque() for _ in LANES]
+        # Envios em andamento por destinatário (mantém a ordem por chat)
+        self.__busy: Dict[str, int] = {}
+        self.__in_flight = 0
+        # Chats cujo start de "digitando" caiu antes de sair: o stop também cai
+        self.__skip_stop = set()
+        self.__cond = threading.Condition()
+        self.__pool: Optional[ThreadPoolExecutor] = None
+
+        self.__sent = [0] * len(LANES)
+        self.__failed = [0] * len(LANES)
+        self.__retried = 0
+        self.__typing_dropped = 0
+        self.__lags = [deque(maxlen=1000) for _ in LANES]
+
+        self.logger = logging.getLogger(__name__)
+
+    def _start(self) -> None:
+        # Thread de despacho e pool de envio criados no primeiro uso
+        if self.__pool is None:
+            self.__pool = ThreadPoolExecutor(self.__threads, thread_name_prefix='envio')
+            threading.Thread(target=self._run, name='envio-agendador', daemon=True).start()
+
+    # --- MESMA INTERFACE DO WAHA ---
+
+    def send_message(self, chat_id: str, message: str, priority: int = RESPOSTA) -> None:
+        self._enqueue(_Item(priority, TEXT, chat_id, message))
+
+    def send_messages(self, messages, priority: int = RESPOSTA) -> None:
+        """Lista de (chat_id, texto) ou (chat_id, texto, prioridade)."""
+        for message in messages:
+            chat_id, text, *lane = message
+            self._enqueue(_Item(lane[0] if lane else priority, TEXT, chat_id, text))
+
+    def start_typing(self, chat_id: str) -> None:
+        with self.__cond:
+            # stop pendente + novo start: o indicador já está aceso, os dois caem
+            if self._drop_pending(chat_id, STOP_TYPING):
+                self._dropped(2)
+                return
+            self.__skip_stop.discard(chat_id)
+        self._enqueue(_Item(DIGITANDO, START_TYPING, chat_id))
+
+    def stop_typing(self, chat_id: str) -> None:
+        with self.__cond:
+            # start que nem saiu: nada para apagar
+            if self._drop_pending(chat_id, START_TYPING):
+                self._dropped(2)
+                return
+            if chat_id in self.__skip_stop:
+                self.__skip_stop.discard(chat_id)
+                self._dropped(1)
+                return
+        self._enqueue(_Item(DIGITANDO, STOP_TYPING, chat_id))
+
+    def get_history_messages(self, chat_id: str, limit: int = 10) -> list:
+        # Leitura: não passa pela fila
+        return self.__client.get_history_messages(chat_id, limit)
+
+    # --- AGENDAMENTO ---
+
+    def _enqueue(self, item: _Item) -> None:
+        with self.__cond:
+            self._start()
+            self.__lanes[item.lane].append(item)
+            self.__cond.notify()
+
+    def _drop_pending(self, chat_id: str, kind: str) -> bool:
+        lane = self.__lanes[DIGITANDO]
+        for item in lane:
+            if item.chat_id == chat_id and item.kind == kind:
+                lane.remove(item)
+                return True
+        return False
+
+    def _dropped(self, count: int) -> None:
+        self.__typing_dropped += count
+        metricas.inc('bot_envio_total', count, fila=LANES[DIGITANDO], status='descartado')
+
+    def _next(self, now: float) -> Tuple[Optional[_Item], Optional[float]]:
+        """Próximo envio liberado ou, se nenhum, quanto esperar (None = até chegar algo)."""
+        busy = self.__in_flight
+        if busy >= self.__threads:
+            return None, None
+        session_wait = self.__session.delay(now)
+
+        wait = None
+        for index_lane, lane in enumerate(self.__lanes):
+            if index_lane != ALERTA:
+                # As demais faixas deixam livres as threads reservadas aos alertas
+                # e esperam a ficha da sessão (um alerta pode tomá-la emprestada)
+                if busy >= self.__threads - self.__reserved:
+                    break
+                if session_wait > 0:
+                    wait = session_wait if wait is None else min(wait, session_wait)
+                    break
+            seen = set()
+            for index, item in enumerate(lane):
+                # Alertas são avisos independentes: saem em paralelo, mesmo para o mesmo
+                # número do suporte, e um alerta em backoff não segura os seguintes
+                if index_lane != ALERTA:
+                    if item.chat_id in seen:
+                        continue
+                    seen.add(item.chat_id)
+                    if item.chat_id in self.__busy:
+                        continue
+                delay = item.not_before - now
+                if self._limited(item):
+                    delay = max(delay, self._bucket(item.chat_id, now).delay(now))
+                if delay <= 0:
+                    del lane[index]
+                    return item, None
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _limited(self, item: _Item) -> bool:
+        return item.kind == TEXT and item.chat_id not in self.__exempt
+
+    def _bucket(self, chat_id: str, now: float) -> TokenBucket:
+        bucket = self.__buckets.get(chat_id)
+        if bucket is None:
+            if len(self.__buckets) > 10000:
+                # Baldes cheios são iguais a baldes novos: limpa para não crescer sem fim
+                for key in [k for k, b in self.__buckets.items() if b.idle(now) and k not in self.__busy]:
+                    del self.__buckets[key]
+            bucket = self.__buckets[chat_id] = TokenBucket(self.__recipient_rate, self.__recipient_burst, now)
+        return bucket
+
+    def _run(self) -> None:
+        while True:
+            with self.__cond:
+                now = time.monotonic()
+                item, wait = self._next(now)
+                if item is None:
+                    self.__cond.wait(wait)
+                    continue
+                self.__session.take()
+                if self._limited(item):
+                    self.__buckets[item.chat_id].take()
+                if item.kind == TEXT:
+                    if self._drop_pending(item.chat_id, START_TYPING):
+                        self._dropped(1)
+                        self.__skip_stop.add(item.chat_id)
+                self.__busy[item.chat_id] = self.__busy.get(item.chat_id, 0) + 1
+                self.__in_flight += 1
+            self.__pool.submit(self._send, item)
+
+    def _send(self, item: _Item) -> None:
+        lag = time.monotonic() - item.enqueued
+        lane = LANES[item.lane]
+        try:
+            if item.kind == TEXT:
+                ok = self.__client.send_message(item.chat_id, item.text)
+            elif item.kind == START_TYPING:
+                ok = self.__client.start_typing(item.chat_id)
+            else:
+                ok = self.__client.stop_typing(item.chat_id)
+        except Exception as e:
+            self.logger.error(f"❌ Erro no envio para {item.chat_id}: {e}")
+            ok = False
+
+        with self.__cond:
+            self.__in_flight -= 1
+            if self.__busy[item.chat_id] > 1:
+                self.__busy[item.chat_id] -= 1
+            else:
+                del self.__busy[item.chat_id]
+            if ok is not False:
+                status = 'enviado'
+                self.__sent[item.lane] += 1
+                self.__lags[item.lane].append(lag)
+            elif item.attempts < self.__retries:
+                # Volta para a frente da faixa: continua antes das próximas do mesmo chat
+                status = 'repetido'
+                item.attempts += 1
+                # Alerta repete a primeira falha na hora (503 isolado do WAHA); depois, backoff
+                exponent = item.attempts - 1 if item.lane == ALERTA else item.attempts
+                item.not_before = time.monotonic() + (
+                    random.uniform(0.5, 1) * self.__backoff * 2 ** exponent if exponent else 0)
+                self.__lanes[item.lane].appendleft(item)
+                self.__retried += 1
+            else:
+                status = 'falhou'
+                self.__failed[item.lane] += 1
+            self.__cond.notify()
+
+        metricas.inc('bot_envio_total', fila=lane, status=status)
+        if status == 'enviado':
+            metricas.observe('bot_envio_atraso_segundos', lag, fila=lane)
+
+    def pending(self) -> int:
+        with self.__cond:
+            return sum(len(lane) for lane in self.__lanes) + self.__in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        """Pendentes, enviados, falhas e atraso (segundos) por faixa."""
+        with self.__cond:
+            stats: Dict[str, Any] = {
+                'retried': self.__retried,
+                'typing_dropped': self.__typing_dropped,
+                'in_flight': self.__in_flight,
+                'lanes': {},
+            }
+            for i, name in enumerate(LANES):
+                lags = sorted(self.__lags[i])
+                lane = {'pending': len(self.__lanes[i]), 'sent': self.__sent[i], 'failed': self.__failed[i]}
+                if lags:
+                    lane['lag_p50'] = round(lags[len(lags) // 2], 4)
+                    lane['lag_p95'] = round(lags[int(len(lags) * 0.95)], 4)
+                stats['lanes'][name] = lane
+        return stats
+
+
+def create_outbound(client: Any, exempt: Iterable[str] = ()) -> OutboundScheduler:
+    """Agendador com os limites das variáveis ENVIO_*."""
+    return OutboundScheduler(
+        client,
+        exempt=exempt,
+        recipient_rate=float(os.getenv('ENVIO_CONTATO_POR_S', 1)),
+        recipient_burst=float(os.getenv('ENVIO_CONTATO_RAJADA', 3)),
+        session_rate=float(os.getenv('ENVIO_SESSAO_POR_S', 20)),
+        session_burst=float(os.getenv('ENVIO_SESSAO_RAJADA', 40)),
+        threads=int(os.getenv('ENVIO_THREADS', 4)),
+        reserved=int(os.getenv('ENVIO_THREADS_ALERTA', 1)),
+        retries=int(os.getenv('ENVIO_RETRIES', 3)),
+        backoff=float(os.getenv('ENVIO_BACKOFF', 0.5)),
+    )
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import logging
+import threading
+
+
+class SQLiteStore:
+    """
+    Base dos stores em SQLite (WAL) compartilhados entre os workers: cria o
+    esquema, abre uma conexão por thread e por processo e chama _cleanup() a
+    cada CLEANUP_EVERY escritas.
+    """
+
+    # Limpeza de expirados/excedentes a cada N escritas
+    CLEANUP_EVERY = 500
+
+    def __init__(self, path: str, schema: str):
+        self.__path = path
+        self.__local = threading.local()
+        self.__writes = 0
+        self.__lock = threading.Lock()
+        self.logger = logging.getLogger(type(self).__module__)
+        self._conn().executescript(schema)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self.__local, 'conn', None)
+        if conn is None or getattr(self.__local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.__path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.__local.conn = conn
+            self.__local.pid = os.getpid()
+        return conn
+
+    def _maybe_cleanup(self) -> None:
+        with self.__lock:
+            self.__writes += 1
+            if self.__writes % self.CLEANUP_EVERY:
+                return
+        try:
+            self._cleanup(self._conn())
+        except sqlite3.Error as e:
+            self.logger.error(f"Erro na limpeza de {self.__path}: {e}")
+
+    def _cleanup(self, conn: sqlite3.Connection) -> None:
+        """Remove o que expirou (cada store define o seu)."""
@@ -2,6 +2,8 @@ import os
 import requests
 import logging
 
+from services.metrics import metricas
+
 class Waha:
     def __init__(self):
         # Pega a URL ou usa o nome do container como default
@@ -28,13 +30,20 @@ class Waha:
             self.logger.error(f"Erro Waha POST {endpoint}: {e}")
             return None
 
-    def send_message(self, chat_id: str, message: str) -> None:
+    def send_message(self, chat_id: str, message: str) -> bool:
         payload = {
             'session': 'default',
             'chatId': chat_id,
             'text': message,
         }
-        self._post('/api/sendText', payload)
+        # Uma observação por chamada ao WAHA (direto, em lote ou pelo agendador)
+        with metricas.timer(etapa='waha_envio'):
+            return self._post('/api/sendText', payload) is not None
+
+    def send_messages(self, messages) -> None:
+        """Envia uma lista de (chat_id, texto) em sequência (o cliente async envia em paralelo)."""
+        for chat_id, message in messages:
+            self.send_message(chat_id, message)
 
     def get_history_messages(self, chat_id: str, limit: int = 10) -> list:
         url = f'{self.__api_url}/api/default/chats/{chat_id}/messages'
@@ -49,8 +58,8 @@ class Waha:
         
         return []
 
-    def start_typing(self, chat_id: str) -> None:
-        self._post('/api/startTyping', {'session': 'default', 'chatId': chat_id})
+    def start_typing(self, chat_id: str) -> bool:
+        return self._post('/api/startTyping', {'session': 'default', 'chatId': chat_id}) is not None
 
-    def stop_typing(self, chat_id: str) -> None:
-        self._post('/api/stopTyping', {'session': 'default', 'chatId': chat_id})
\ No newline at end of file
+    def stop_typing(self, chat_id: str) -> bool:
+        return self._post('/api/stopTyping', {'session': 'default', 'chatId': chat_id}) is not None
\ No newline at end of file
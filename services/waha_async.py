@@ -0,0 +1,147 @@
+import os
+import random
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+
+from services.metrics import metricas
+
+# Erros que valem nova tentativa: timeout, conexão e 5xx
+RETRY_STATUS = {500, 502, 503, 504}
+
+
+class AsyncWaha:
+    """Cliente asyncio do WAHA: pool de conexões, retries com backoff e envios concorrentes."""
+
+    def __init__(self, api_url: Optional[str] = None, api_key: Optional[str] = None):
+        self.__api_url = api_url or os.getenv('WAHA_API_URL', 'http://waha:3000')
+        self.__api_key = api_key or os.getenv('WAHA_API_KEY')
+        self.__session_name = os.getenv('WAHA_SESSION', 'default')
+        self.__pool_size = int(os.getenv('WAHA_POOL', 20))
+        self.__session_limit = int(os.getenv('WAHA_CONCORRENCIA_SESSAO', 8))
+        self.__retries = int(os.getenv('WAHA_RETRIES', 3))
+        self.__backoff = float(os.getenv('WAHA_BACKOFF', 0.2))
+        self.__timeout = aiohttp.ClientTimeout(total=float(os.getenv('WAHA_TIMEOUT', 10)), connect=3)
+
+        self.__http: Optional[aiohttp.ClientSession] = None
+        # Um semáforo por sessão do WAHA limita a concorrência no mesmo número
+        self.__limits: Dict[str, asyncio.Semaphore] = {}
+
+        self.logger = logging.getLogger(__name__)
+
+    async def _client(self) -> aiohttp.ClientSession:
+        # Criada dentro do loop em execução (exigência do aiohttp)
+        if self.__http is None or self.__http.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.__pool_size,
+                limit_per_host=self.__pool_size,
+                ttl_dns_cache=300,
+                keepalive_timeout=30,
+            )
+            self.__http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.__timeout,
+                headers={'Content-Type': 'application/json', 'X-Api-Key': self.__api_key or ''},
+            )
+        return self.__http
+
+    def _limit(self) -> asyncio.Semaphore:
+        if self.__session_name not in self.__limits:
+            self.__limits[self.__session_name] = asyncio.Semaphore(self.__session_limit)
+        return self.__limits[self.__session_name]
+
+    async def _request(self, method: str, endpoint: str, **kwargs):
+        """Requisição com retry em 5xx/timeout e backoff exponencial com jitter. Retorna o JSON ou None."""
+        url = f'{self.__api_url}{endpoint}'
+        http = await self._client()
+
+        for attempt in range(self.__retries + 1):
+            try:
+                async with self._limit():
+                    async with http.request(method, url, **kwargs) as response:
+                        if response.status in RETRY_STATUS:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history, status=response.status,
+                            )
+                        response.raise_for_status()
+                        if response.content_type == 'application/json':
+                            return await response.json()
+                        return {}
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, aiohttp.ClientResponseError) as e:
+                retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUS
+                if not retryable or attempt == self.__retries:
+                    self.logger.error(f"Erro Waha {method} {endpoint}: {e!r}")
+                    return None
+                # Full jitter: espera aleatória até base * 2^tentativa
+                await asyncio.sleep(random.uniform(0, self.__backoff * 2 ** attempt))
+
+    async def _post(self, endpoint: str, payload: dict):
+        return await self._request('POST', endpoint, json=payload)
+
+    async def send_message(self, chat_id: str, message: str) -> bool:
+        payload = {
+            'session': self.__session_name,
+            'chatId': chat_id,
+            'text': message,
+        }
+        # Uma observação por chamada (inclui os retries), mesmo nos envios em paralelo
+        with metricas.timer(etapa='waha_envio'):
+            return await self._post('/api/sendText', payload) is not None
+
+    async def send_messages(self, messages: Iterable[Tuple[str, str]]) -> None:
+        """Envia mensagens independentes (ex.: cliente e suporte) em paralelo."""
+        await asyncio.gather(*(self.send_message(chat_id, text) for chat_id, text in messages))
+
+    async def get_history_messages(self, chat_id: str, limit: int = 10) -> List[dict]:
+        endpoint = f'/api/{self.__session_name}/chats/{chat_id}/messages'
+        params = {'limit': limit, 'downloadMedia': 'false'}
+        data = await self._request('GET', endpoint, params=params)
+        return data if isinstance(data, list) else []
+
+    async def start_typing(self, chat_id: str) -> bool:
+        return await self._post('/api/startTyping', {'session': self.__session_name, 'chatId': chat_id}) is not None
+
+    async def stop_typing(self, chat_id: str) -> bool:
+        return await self._post('/api/stopTyping', {'session': self.__session_name, 'chatId': chat_id}) is not None
+
+    async def close(self) -> None:
+        if self.__http is not None:
+            await self.__http.close()
+
+
+class WahaAsyncBridge:
+    """
+    Mesma interface síncrona do Waha, executando o AsyncWaha num event loop
+    em thread própria. Permite usar o cliente async a partir do Flask/gunicorn.
+    """
+
+    def __init__(self, client: Optional[AsyncWaha] = None):
+        self.__client = client or AsyncWaha()
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__lock = threading.Lock()
+
+    def _run(self, coro):
+        # Loop criado no primeiro uso
+        with self.__lock:
+            if self.__loop is None:
+                self.__loop = asyncio.new_event_loop()
+                threading.Thread(target=self.__loop.run_forever, name='waha-async', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self.__loop).result()
+
+    def send_message(self, chat_id: str, message: str) -> bool:
+        return self._run(self.__client.send_message(chat_id, message))
+
+    def send_messages(self, messages: Iterable[Tuple[str, str]]) -> None:
+        self._run(self.__client.send_messages(list(messages)))
+
+    def get_history_messages(self, chat_id: str, limit: int = 10) -> list:
+        return self._run(self.__client.get_history_messages(chat_id, limit))
+
+    def start_typing(self, chat_id: str) -> bool:
+        return self._run(self.__client.start_typing(chat_id))
+
+    def stop_typing(self, chat_id: str) -> bool:
+        return self._run(self.__client.stop_typing(chat_id))